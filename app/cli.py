@@ -1,14 +1,23 @@
+import argparse
+import dataclasses
+import json
+import sys
 from pathlib import Path
 
-from app.rules.engine import DiagnosticEngine
-from app.rules.knowledge_base import DIAGNOSTIC_RULES
-from app.data.db import init_db, save_session, save_results
+from app.rules.engine import DEFAULT_ENGINE, CompiledRuleSet
+from app.rules.store import get_rule_store
+from app.data.db import init_db, save_diagnosis, replace_results
 from app.data.queries import (
     get_session,
     get_results_for_session,
-    list_recent_sessions,
+    list_sessions_page,
+    iter_session_answers,
+    search_sessions,
 )
-from app.reports.pdf_report import generate_pdf_report
+
+# Report generation (ReportLab, the render process pool) and asyncio are
+# imported where they are used, so commands that don't build a PDF start
+# without loading them.
 
 
 def ask_yes_no(prompt: str) -> bool:
@@ -32,64 +41,244 @@ def run_new_diagnostic() -> int:
     user_notes = input("Optional: add a short note (build specs / what happened): ").strip()
     answers = {}
 
+    # One snapshot for the whole session, so the questions asked and the
+    # rules that judge the answers always come from the same rule set.
+    rule_set = get_rule_store().snapshot
+
     print("\nAnswer the symptom questions:\n")
-    for rule in DIAGNOSTIC_RULES:
-        answers[rule["symptom"]] = ask_yes_no(f"{rule['question']} (y/n): ")
+    for rule in rule_set.questions:
+        answers[rule.symptom] = ask_yes_no(f"{rule.question} (y/n): ")
+
+    results = DEFAULT_ENGINE.run(answers, rule_set)
+
+    session_id = save_diagnosis(
+        user_notes=user_notes,
+        answers=answers,
+        results=results,
+        rule_set_version=rule_set.version,
+    )
+
+    print_results(session_id, results)
 
-    engine = DiagnosticEngine()
-    results = engine.run(answers)
+    if ask_yes_no("Generate a PDF report now? (y/n): "):
+        generate_pdf_for_session(session_id)
+
+    return session_id
 
-    session_id = save_session(user_notes=user_notes, answers=answers)
-    save_results(session_id=session_id, results=results)
 
+def print_results(session_id: int, results) -> None:
     print("\n--- Diagnostic Results ---\n")
 
     if not results:
         print(f"No matching issues detected. (Saved session #{session_id})")
     else:
         print(f"Saved session #{session_id}\n")
+        print("Most Likely Causes:")
+        for ranked in CompiledRuleSet.rank_causes(results):
+            print(f" {ranked['confidence']:4.0%}  {ranked['cause']}")
+        print()
         for result in results:
-            print(f"Symptom: {result['symptom'].replace('_', ' ').title()}")
+            print(f"Symptom: {result.symptom.replace('_', ' ').title()}")
             print("Probable Causes:")
-            for cause in result["probable_causes"]:
+            for cause in result.probable_causes:
                 print(f" - {cause}")
             print("Next Tests:")
-            for test in result["next_tests"]:
+            for test in result.next_tests:
                 print(f" - {test}")
             print()
 
-    if ask_yes_no("Generate a PDF report now? (y/n): "):
-        generate_pdf_for_session(session_id)
 
+def parse_answers(pairs: list[str], questions) -> dict:
+    # "symptom=y" / "symptom=n" pairs; questions not mentioned are "n".
+    answers = {rule.symptom: False for rule in questions}
+    for pair in pairs:
+        symptom, sep, value = pair.partition("=")
+        if not sep or value.lower() not in ("y", "n"):
+            raise ValueError(f"Expected SYMPTOM=y or SYMPTOM=n, got '{pair}'")
+        if symptom not in answers:
+            raise ValueError(f"Unknown symptom '{symptom}'. Known symptoms: {', '.join(answers)}")
+        answers[symptom] = value.lower() == "y"
+    return answers
+
+
+def run_diagnostic(answer_pairs: list[str], user_notes: str, as_json: bool, pdf: bool) -> int:
+    # Non-interactive form of run_new_diagnostic(), for scripts.
+    rule_set = get_rule_store().snapshot
+    answers = parse_answers(answer_pairs, rule_set.questions)
+
+    results = DEFAULT_ENGINE.run(answers, rule_set)
+    session_id = save_diagnosis(
+        user_notes=user_notes,
+        answers=answers,
+        results=results,
+        rule_set_version=rule_set.version,
+    )
+
+    if as_json:
+        print(json.dumps({
+            "session_id": session_id,
+            "rule_set_version": rule_set.version,
+            "ranked_causes": rule_set.rank_causes(results),
+            "results": [
+                {
+                    "rule_id": r.rule_id,
+                    "symptom": r.symptom,
+                    "probable_causes": r.probable_causes,
+                    "next_tests": r.next_tests,
+                }
+                for r in results
+            ],
+        }, indent=2))
+    else:
+        print_results(session_id, results)
+
+    if pdf:
+        generate_pdf_for_session(session_id)
     return session_id
 
 
-def show_recent_sessions():
-    sessions = list_recent_sessions(limit=10)
+def show_recent_sessions(limit: int = 10, as_json: bool = False, **filters):
+    # `filters` are list_sessions_page()'s cursor / since / until / symptom.
+    sessions, next_cursor = list_sessions_page(limit=limit, **filters)
 
-    print("\n=== Recent Sessions (last 10) ===\n")
+    if as_json:
+        print(json.dumps({
+            "sessions": [dataclasses.asdict(s) for s in sessions],
+            "next_cursor": next_cursor,
+        }, indent=2))
+        return
+
+    print(f"\n=== Recent Sessions ({len(sessions)}) ===\n")
     if not sessions:
-        print("No sessions found yet.\n")
+        print("No sessions found.\n")
         return
 
     for s in sessions:
-        note_preview = (s["user_notes"][:50] + "...") if len(s["user_notes"]) > 50 else s["user_notes"]
+        note_preview = (s.user_notes[:50] + "...") if len(s.user_notes) > 50 else s.user_notes
         note_preview = note_preview if note_preview else "(no notes)"
-        print(f"#{s['id']} | {s['created_at']} | {note_preview}")
+        print(f"#{s.id} | {s.created_at} | {note_preview}")
+    if next_cursor is not None:
+        print(f"\nMore: --cursor {next_cursor}")
     print()
 
 
-def generate_pdf_for_session(session_id: int):
+def show_search_results(query: str, limit: int = 20, as_json: bool = False, order: str = "rank") -> None:
+    hits = search_sessions(query, limit=limit, order=order)
+
+    if as_json:
+        print(json.dumps({
+            "query": query,
+            "results": [
+                {"session": dataclasses.asdict(hit.session), "rank": hit.rank, "snippet": hit.snippet_text()}
+                for hit in hits
+            ],
+        }, indent=2))
+        return
+
+    print(f"\n=== Sessions matching '{query}' ({len(hits)}) ===\n")
+    if not hits:
+        print("No sessions found.\n")
+        return
+
+    for hit in hits:
+        print(f"#{hit.session.id} | {hit.session.created_at} | {hit.snippet_text()}")
+    print()
+
+
+def generate_pdf_for_session(session_id: int) -> Path | None:
     session = get_session(session_id)
     if not session:
         print(f"\nNo session found with id {session_id}\n")
-        return
+        return None
+
+    import asyncio
+    from app.reports.render_service import get_render_service
 
     results = get_results_for_session(session_id)
     output_dir = Path("reports_out")
-    pdf_path = generate_pdf_report(session, results, output_dir)
+    pdf_path = asyncio.run(get_render_service().render(session, results, output_dir=output_dir))
 
     print(f"\nPDF generated: {pdf_path.resolve()}\n")
+    return pdf_path
+
+
+def close_report_renderer() -> None:
+    # Nothing to close unless a report was generated; importing the render
+    # service just to close it would defeat the lazy import.
+    render_service = sys.modules.get("app.reports.render_service")
+    if render_service is not None:
+        render_service.close_render_service()
+
+
+def rediagnose_sessions(chunk_size: int) -> int:
+    # Re-run every saved session against the current rules, a chunk at a
+    # time, and replace its stored results.
+    rule_set = get_rule_store().snapshot
+    total = 0
+
+    for chunk in iter_session_answers(chunk_size=chunk_size):
+        batch_results = DEFAULT_ENGINE.run_batch([answers for _, answers in chunk], rule_set)
+        replace_results(
+            [(session_id, results) for (session_id, _), results in zip(chunk, batch_results)],
+            rule_set_version=rule_set.version,
+        )
+
+        total += len(chunk)
+        print(f"Re-diagnosed {total} sessions (up to #{chunk[-1][0]})")
+
+    print(f"\nDone. {total} sessions re-diagnosed with rule set {rule_set.version}.\n")
+    return total
+
+
+def export_reports(start_id: int, end_id: int, output: Path, workers: int) -> None:
+    # Lazy import: only this command needs the bulk exporter's process pool.
+    from concurrent.futures import ProcessPoolExecutor
+    from app.reports.bulk_export import iter_reports_zip
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=workers) as executor, output.open("wb") as f:
+        for chunk in iter_reports_zip(start_id, end_id, executor):
+            f.write(chunk)
+
+    print(f"\nReports for sessions #{start_id}-#{end_id} written to {output.resolve()}\n")
+
+
+def backfill_analytics(chunk_size: int) -> int:
+    from app.data.analytics import backfill_rollups, backfill_status
+
+    total = backfill_rollups(chunk_size=chunk_size)
+    status = backfill_status()
+    print(f"\n{total} sessions counted; rollups cover every session up to #{status['end_id']}.\n")
+    return total
+
+
+def export_sessions(output: Path | None, format: str, chunk_size: int) -> int:
+    from app.data.transfer import export_sessions as export
+
+    output = output or Path("exports") / ("sessions.jsonl.gz" if format == "jsonl" else "sessions.pcbtcol")
+    total = export(output, format=format, chunk_size=chunk_size)
+    print(f"\n{total} sessions exported to {output.resolve()}\n")
+    return total
+
+
+def import_sessions(path: Path, batch_size: int) -> int:
+    from app.data.transfer import import_sessions as load
+
+    total = load(path, batch_size=batch_size)
+    print(f"\n{total} sessions imported from {path.resolve()}\n")
+    return total
+
+
+def dump_rules(directory: Path) -> Path:
+    # Seed a PCBT_RULES_DIR with the built-in rules, to edit from there.
+    from app.rules.knowledge_base import DIAGNOSTIC_RULES
+
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / "10-builtin.json"
+    path.write_text(json.dumps(DIAGNOSTIC_RULES, indent=2) + "\n", encoding="utf-8")
+
+    print(f"\n{len(DIAGNOSTIC_RULES)} rules written to {path.resolve()}\n")
+    return path
 
 
 def menu_loop():
@@ -121,5 +310,129 @@ def menu_loop():
             print("\nInvalid option. Choose 1-4.\n")
 
 
+def main(argv: list[str] | None = None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli", description="PC Builder Troubleshooter")
+    subparsers = parser.add_subparsers(dest="command")
+
+    rediagnose = subparsers.add_parser(
+        "rediagnose",
+        help="re-run all saved sessions against the current rules and rewrite their results",
+    )
+    rediagnose.add_argument("--chunk-size", type=int, default=5000, help="sessions per batch (default: 5000)")
+
+    export = subparsers.add_parser("export-reports", help="write PDF reports for a range of sessions into one ZIP")
+    export.add_argument("--start-id", type=int, required=True)
+    export.add_argument("--end-id", type=int, required=True)
+    export.add_argument("--output", type=Path, default=Path("reports_out/reports.zip"))
+    export.add_argument("--workers", type=int, default=None, help="render processes (default: one per CPU)")
+
+    backfill = subparsers.add_parser(
+        "backfill-analytics",
+        help="count sessions saved before the analytics rollups existed (the web app also does this on startup)",
+    )
+    backfill.add_argument("--chunk-size", type=int, default=10_000, help="sessions per transaction (default: 10000)")
+
+    export_data = subparsers.add_parser(
+        "export-sessions", help="write all sessions, their results and rules to a compressed file",
+    )
+    export_data.add_argument("--format", choices=("jsonl", "columnar"), default="jsonl")
+    export_data.add_argument(
+        "--output", type=Path, default=None,
+        help="default: exports/sessions.jsonl.gz or exports/sessions.pcbtcol",
+    )
+    export_data.add_argument(
+        "--chunk-size", type=int, default=10_000, help="sessions read per chunk / row group (default: 10000)",
+    )
+
+    import_data = subparsers.add_parser(
+        "import-sessions", help="load an export-sessions file into a database without sessions",
+    )
+    import_data.add_argument("path", type=Path)
+    import_data.add_argument("--batch-size", type=int, default=100_000, help="sessions per transaction (default: 100000)")
+
+    dump = subparsers.add_parser("dump-rules", help="write the built-in rules as JSON, to seed a rules directory")
+    dump.add_argument("directory", type=Path)
+
+    diagnose = subparsers.add_parser("diagnose", help="run and save a diagnosis without prompts")
+    diagnose.add_argument(
+        "--answers", nargs="*", default=[], metavar="SYMPTOM=y|n",
+        help="answers to the symptom questions; unanswered questions count as 'n'",
+    )
+    diagnose.add_argument("--notes", default="", help="optional note saved with the session")
+    diagnose.add_argument("--json", action="store_true", help="print the session id and results as JSON")
+    diagnose.add_argument("--pdf", action="store_true", help="also generate the PDF report")
+
+    list_sessions = subparsers.add_parser("list", help="list recent sessions")
+    list_sessions.add_argument("--limit", type=int, default=10)
+    list_sessions.add_argument("--cursor", help="continue from the cursor printed by the previous page")
+    list_sessions.add_argument("--since", help="only sessions created at or after this date/time (ISO 8601)")
+    list_sessions.add_argument("--until", help="only sessions created before this date/time (ISO 8601)")
+    list_sessions.add_argument("--symptom", help="only sessions that answered this symptom 'yes'")
+    list_sessions.add_argument("--json", action="store_true")
+
+    search = subparsers.add_parser("search", help="full-text search over session notes, best match first")
+    search.add_argument("query", nargs="+", help='words that must all appear; "quote" phrases, end a word with * for a prefix')
+    search.add_argument("--limit", type=int, default=20)
+    search.add_argument("--newest", action="store_true", help="most recent sessions first instead of best matches")
+    search.add_argument("--json", action="store_true")
+
+    report = subparsers.add_parser("report", help="generate the PDF report for a session")
+    report.add_argument("session_id", type=int)
+
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "diagnose":
+            init_db()
+            try:
+                run_diagnostic(args.answers, args.notes.strip(), args.json, args.pdf)
+            except ValueError as exc:
+                diagnose.error(str(exc))
+        elif args.command == "list":
+            init_db()
+            try:
+                show_recent_sessions(
+                    args.limit, args.json,
+                    cursor=args.cursor, since=args.since, until=args.until, symptom=args.symptom,
+                )
+            except ValueError as exc:
+                list_sessions.error(str(exc))
+        elif args.command == "search":
+            init_db()
+            try:
+                show_search_results(" ".join(args.query), args.limit, args.json, "newest" if args.newest else "rank")
+            except ValueError as exc:
+                search.error(str(exc))
+        elif args.command == "report":
+            init_db()
+            if generate_pdf_for_session(args.session_id) is None:
+                return 1
+        elif args.command == "rediagnose":
+            init_db()
+            rediagnose_sessions(args.chunk_size)
+        elif args.command == "export-reports":
+            init_db()
+            export_reports(args.start_id, args.end_id, args.output, args.workers)
+        elif args.command == "backfill-analytics":
+            init_db()
+            backfill_analytics(args.chunk_size)
+        elif args.command == "export-sessions":
+            init_db()
+            export_sessions(args.output, args.format, args.chunk_size)
+        elif args.command == "import-sessions":
+            init_db()
+            try:
+                import_sessions(args.path, args.batch_size)
+            except ValueError as exc:
+                import_data.error(str(exc))
+        elif args.command == "dump-rules":
+            dump_rules(args.directory)
+        else:
+            menu_loop()
+    finally:
+        close_report_renderer()
+    return 0
+
+
 if __name__ == "__main__":
-    menu_loop()
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import csv
+import io
+import logging
+import threading
+
+from app.data.db import MIGRATION_CHUNK_SIZE, get_connection, update_rollups
+
+logger = logging.getLogger(__name__)
+
+# Per-day symptom / cause counts, read from the rollup tables that
+# db.update_rollups() keeps current on every write. Sessions saved before the
+# rollups existed are counted by backfill_rollups(), a chunk at a time.
+
+# Rollup name -> (table, key columns). Every table also has a `sessions`
+# count column.
+ROLLUPS = {
+    "sessions": ("daily_sessions", ("day",)),
+    "symptoms": ("daily_symptoms", ("day", "symptom")),
+    "symptom-pairs": ("daily_symptom_pairs", ("day", "symptom_a", "symptom_b")),
+    "causes": ("daily_causes", ("day", "cause")),
+}
+
+
+def backfill_status() -> dict:
+    with get_connection() as conn:
+        watermark, end_id = conn.execute("SELECT watermark, end_id FROM rollup_backfill").fetchone()
+    return {"watermark": watermark, "end_id": end_id, "complete": watermark >= end_id}
+
+
+def backfill_rollups(chunk_size: int = MIGRATION_CHUNK_SIZE, stop: threading.Event | None = None) -> int:
+    # Count the sessions saved before the rollups existed, in id order, one
+    # chunk per transaction. Moving the watermark and counting its chunk
+    # commit together, so an interrupted backfill resumes where it stopped
+    # and concurrent runs never count a session twice. Returns the number of
+    # sessions counted by this call.
+    total = 0
+    while stop is None or not stop.is_set():
+        with get_connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            watermark, end_id = conn.execute("SELECT watermark, end_id FROM rollup_backfill").fetchone()
+            if watermark >= end_id:
+                return total
+
+            session_ids = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT id FROM sessions WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                    (watermark, end_id, chunk_size),
+                )
+            ]
+            # Past the last session, jump to end_id to finish.
+            new_watermark = session_ids[-1] if len(session_ids) == chunk_size else end_id
+            conn.execute("UPDATE rollup_backfill SET watermark = ?", (new_watermark,))
+            update_rollups(conn.cursor(), session_ids)
+
+        total += len(session_ids)
+        logger.info("Analytics backfill: %d sessions counted (up to #%d of #%d)", total, new_watermark, end_id)
+    return total
+
+
+_backfill_thread: threading.Thread | None = None
+_backfill_stop = threading.Event()
+_backfill_lock = threading.Lock()
+
+
+def _run_backfill() -> None:
+    try:
+        backfill_rollups(stop=_backfill_stop)
+    except Exception:
+        logger.exception("Analytics backfill failed; it resumes on the next start")
+
+
+def start_backfill() -> None:
+    # Run the backfill on a background thread, e.g. at web app startup.
+    # Returns at once; with nothing left to count the thread exits after
+    # one query.
+    global _backfill_thread
+    with _backfill_lock:
+        if _backfill_thread is None:
+            _backfill_stop.clear()
+            _backfill_thread = threading.Thread(target=_run_backfill, name="analytics-backfill", daemon=True)
+            _backfill_thread.start()
+
+
+def stop_backfill() -> None:
+    # Stops after the chunk in progress, which is committed.
+    global _backfill_thread
+    with _backfill_lock:
+        if _backfill_thread is not None:
+            _backfill_stop.set()
+            _backfill_thread.join()
+            _backfill_thread = None
+
+
+def daily_counts(rollup: str, since: str | None = None, until: str | None = None) -> tuple[tuple[str, ...], list[tuple]]:
+    # (columns, rows) of one rollup by day, then key. `since` is inclusive
+    # and `until` exclusive, as YYYY-MM-DD days. Raises ValueError for an
+    # unknown rollup.
+    try:
+        table, keys = ROLLUPS[rollup]
+    except KeyError:
+        raise ValueError(f"Unknown rollup {rollup!r}; expected one of {', '.join(ROLLUPS)}") from None
+
+    # Counts that dropped to zero (causes after a re-diagnosis) stay as rows.
+    where, params = ["sessions > 0"], []
+    if since is not None:
+        where.append("day >= ?")
+        params.append(since)
+    if until is not None:
+        where.append("day < ?")
+        params.append(until)
+
+    columns = (*keys, "sessions")
+    with get_connection() as conn:
+        rows = conn.execute(
+            f"""
+            SELECT {", ".join(columns)}
+            FROM {table}
+            WHERE {" AND ".join(where)}
+            ORDER BY {", ".join(keys)}
+            """,
+            params,
+        ).fetchall()
+    return columns, rows
+
+
+def to_csv(columns: tuple[str, ...], rows: list[tuple]) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    writer.writerows(rows)
+    return buffer.getvalue()
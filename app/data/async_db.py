@@ -0,0 +1,113 @@
+import asyncio
+import contextvars
+import threading
+from collections.abc import Sequence
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from app import settings
+from app.data import analytics, db, queries
+from app.data.models import DiagnosisResult, Rule, SearchHit, Session
+from app.data.writer import get_writer
+from app.metrics import timed
+
+# Awaitable wrappers around db.py / queries.py for the web app. Reads run on
+# a thread pool sized like the connection pool; writes go to a single writer
+# thread (the group-commit writer, or a one-thread executor when group commit
+# is off), so the event loop never waits on SQLite.
+
+_executors: dict[str, ThreadPoolExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(name: str, max_workers: int) -> ThreadPoolExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        with _executors_lock:
+            executor = _executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"db-{name}")
+                _executors[name] = executor
+    return executor
+
+
+async def _read(fn, *args, **kwargs):
+    # Run in a copy of the caller's context, so timings taken on the thread
+    # count towards the request's Server-Timing (see app.metrics).
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor("read", settings.DB_POOL_SIZE), partial(contextvars.copy_context().run, fn, *args, **kwargs),
+    )
+
+
+async def get_session(session_id: int) -> Session | None:
+    return await _read(queries.get_session, session_id)
+
+
+async def get_results_for_session(session_id: int) -> list[DiagnosisResult]:
+    return await _read(queries.get_results_for_session, session_id)
+
+
+async def get_session_with_results(session_id: int) -> tuple[Session | None, list[DiagnosisResult]]:
+    # One executor hop for the common "load a session page" case.
+    def load():
+        session = queries.get_session(session_id)
+        if not session:
+            return None, []
+        return session, queries.get_results_for_session(session_id)
+
+    return await _read(load)
+
+
+async def list_sessions_page(**filters) -> tuple[list[Session], str | None]:
+    return await _read(queries.list_sessions_page, **filters)
+
+
+async def search_sessions(query: str, limit: int = 20, offset: int = 0, order: str = "rank") -> list[SearchHit]:
+    return await _read(queries.search_sessions, query, limit, offset, order)
+
+
+async def daily_counts(rollup: str, since: str | None = None, until: str | None = None) -> tuple[tuple, list[tuple], dict]:
+    # (columns, rows, backfill status) in one executor hop.
+    def load():
+        columns, rows = analytics.daily_counts(rollup, since, until)
+        return columns, rows, analytics.backfill_status()
+
+    return await _read(load)
+
+
+async def save_diagnosis(user_notes: str, answers: dict, results: Sequence[Rule], rule_set_version: str | None = None) -> int:
+    if settings.DB_GROUP_COMMIT:
+        # The writer thread times the batch write; this is the request's
+        # wait for it, flush interval included.
+        with timed("db.group_commit"):
+            return await asyncio.wrap_future(get_writer().submit(user_notes, answers, results, rule_set_version))
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor("write", 1),
+        partial(
+            contextvars.copy_context().run,
+            db.save_diagnosis,
+            user_notes=user_notes,
+            answers=answers,
+            results=results,
+            rule_set_version=rule_set_version,
+        ),
+    )
+
+
+async def save_diagnoses(diagnoses: list[tuple[str, dict, Sequence[Rule], str | None]]) -> list[int]:
+    # Already a batch, so it skips the group-commit writer and is written as
+    # one transaction on the write executor.
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _executor("write", 1), contextvars.copy_context().run, db.save_diagnoses, diagnoses,
+    )
+
+
+def close_executors() -> None:
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=True)
+        _executors.clear()
@@ -1,74 +1,663 @@
+import hashlib
 import json
+import queue
 import sqlite3
-from pathlib import Path
+import threading
+from collections.abc import Sequence
+from contextlib import contextmanager
 from datetime import datetime
 
-# Project root = two levels up from app/data/
-PROJECT_ROOT = Path(__file__).resolve().parents[2]
-DB_PATH = PROJECT_ROOT / "app_db.sqlite3"
+from app import settings
+from app.data.models import Rule
+from app.metrics import timed
 
+PROJECT_ROOT = settings.PROJECT_ROOT
+DB_PATH = settings.DB_PATH
 
+
+class ConnectionPool:
+    # Keeps up to `size` SQLite connections open and hands them out to one
+    # caller at a time. Reusing connections also reuses their page cache and
+    # prepared statements, which a fresh sqlite3.connect() throws away.
+
+    def __init__(self, path, size: int = settings.DB_POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        # (rule_set_version, rule_id) pairs known to be stored in this database.
+        self.known_rules = set()
+
+    def _connect(self) -> sqlite3.Connection:
+        # check_same_thread is off because a connection may be returned to
+        # the pool and picked up by another thread; the pool guarantees only
+        # one thread uses it at a time.
+        conn = sqlite3.connect(
+            self.path,
+            timeout=settings.DB_BUSY_TIMEOUT,
+            check_same_thread=False,
+            cached_statements=settings.DB_STATEMENT_CACHE_SIZE,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(f"PRAGMA synchronous={settings.DB_SYNCHRONOUS}")
+        conn.execute(f"PRAGMA cache_size=-{settings.DB_CACHE_SIZE_KIB}")
+        conn.execute(f"PRAGMA mmap_size={settings.DB_MMAP_SIZE}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        # Blocks while all `size` connections are in use.
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        try:
+            return self._connect()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        self._idle.put(conn)
+        self._slots.release()
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+@contextmanager
 def get_connection():
-    return sqlite3.connect(DB_PATH)
+    # Borrow a pooled connection for one transaction: committed when the
+    # block exits normally, rolled back if it raises.
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        with conn:
+            yield conn
+    finally:
+        pool.release(conn)
 
 
-def init_db():
-    with get_connection() as conn:
-        cur = conn.cursor()
+# Results written before rule references existed are migrated into this
+# rule set, one rule per distinct (symptom, causes, tests) combination.
+LEGACY_RULE_SET_VERSION = "legacy"
+
+MIGRATION_CHUNK_SIZE = 10_000
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> list[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _migration_1_base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        user_notes TEXT,
+        answers_json TEXT NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        symptom TEXT NOT NULL,
+        probable_causes_json TEXT NOT NULL,
+        next_tests_json TEXT NOT NULL,
+        FOREIGN KEY (session_id) REFERENCES sessions (id)
+    )
+    """)
+
 
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS sessions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            created_at TEXT NOT NULL,
-            user_notes TEXT,
-            answers_json TEXT NOT NULL
+def _migration_2_results_session_index(conn: sqlite3.Connection) -> None:
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_results_session_id ON results (session_id)")
+
+
+def _migration_3_rule_references(conn: sqlite3.Connection) -> None:
+    # Store rule text once per rule set and make results reference it,
+    # instead of copying causes and tests into every result row.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rule_sets (
+        version TEXT PRIMARY KEY,
+        created_at TEXT NOT NULL
+    )
+    """)
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rules (
+        rule_set_version TEXT NOT NULL,
+        rule_id TEXT NOT NULL,
+        symptom TEXT NOT NULL,
+        probable_causes_json TEXT NOT NULL,
+        next_tests_json TEXT NOT NULL,
+        PRIMARY KEY (rule_set_version, rule_id),
+        FOREIGN KEY (rule_set_version) REFERENCES rule_sets (version)
+    )
+    """)
+
+    # On a rerun after an interrupted migration the old table has already
+    # been moved aside, so only move it if it still has the old shape.
+    if "probable_causes_json" in _table_columns(conn, "results"):
+        conn.execute("DROP INDEX IF EXISTS idx_results_session_id")
+        conn.execute("ALTER TABLE results RENAME TO results_legacy")
+
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id INTEGER NOT NULL,
+        rule_set_version TEXT NOT NULL,
+        rule_id TEXT NOT NULL,
+        FOREIGN KEY (session_id) REFERENCES sessions (id),
+        FOREIGN KEY (rule_set_version, rule_id) REFERENCES rules (rule_set_version, rule_id)
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_results_session_id ON results (session_id)")
+
+    if not _table_columns(conn, "results_legacy"):
+        return
+
+    conn.execute(
+        "INSERT OR IGNORE INTO rule_sets (version, created_at) VALUES (?, ?)",
+        (LEGACY_RULE_SET_VERSION, datetime.utcnow().isoformat()),
+    )
+    conn.commit()
+
+    # Copy in chunks, one transaction each, keeping result ids so an
+    # interrupted copy resumes after the last id already moved. Another
+    # worker may finish the copy while the lock is released between chunks.
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        if not _table_columns(conn, "results_legacy"):
+            conn.commit()
+            break
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM results").fetchone()[0]
+        rows = conn.execute(
+            """
+            SELECT id, session_id, symptom, probable_causes_json, next_tests_json
+            FROM results_legacy
+            WHERE id > ?
+            ORDER BY id
+            LIMIT ?
+            """,
+            (last_id, MIGRATION_CHUNK_SIZE),
+        ).fetchall()
+
+        if not rows:
+            conn.execute("DROP TABLE results_legacy")
+            conn.commit()
+            break
+
+        rule_rows = {}
+        result_rows = []
+        for result_id, session_id, symptom, causes_json, tests_json in rows:
+            digest = hashlib.sha256(f"{symptom}\0{causes_json}\0{tests_json}".encode()).hexdigest()
+            rule_id = f"{symptom}:{digest[:8]}"
+            rule_rows[rule_id] = (LEGACY_RULE_SET_VERSION, rule_id, symptom, causes_json, tests_json)
+            result_rows.append((result_id, session_id, LEGACY_RULE_SET_VERSION, rule_id))
+
+        conn.executemany(
+            """
+            INSERT OR IGNORE INTO rules
+                (rule_set_version, rule_id, symptom, probable_causes_json, next_tests_json)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            rule_rows.values(),
         )
-        """)
-
-        cur.execute("""
-        CREATE TABLE IF NOT EXISTS results (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            session_id INTEGER NOT NULL,
-            symptom TEXT NOT NULL,
-            probable_causes_json TEXT NOT NULL,
-            next_tests_json TEXT NOT NULL,
-            FOREIGN KEY (session_id) REFERENCES sessions (id)
+        conn.executemany(
+            "INSERT INTO results (id, session_id, rule_set_version, rule_id) VALUES (?, ?, ?, ?)",
+            result_rows,
         )
-        """)
+        conn.commit()
+
 
+def _migration_4_session_rule_set_version(conn: sqlite3.Connection) -> None:
+    # Record which rule set diagnosed each session, including sessions that
+    # matched no rules. NULL for sessions saved before this column existed.
+    if "rule_set_version" not in _table_columns(conn, "sessions"):
+        conn.execute("ALTER TABLE sessions ADD COLUMN rule_set_version TEXT")
+
+
+def _migration_5_session_history_indexes(conn: sqlite3.Connection) -> None:
+    # Indexes for keyset-paginated history, newest first: sessions by
+    # (created_at, id), and one session_symptoms row per "yes" answer so a
+    # symptom filter is an index range too.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_created_at ON sessions (created_at, id)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS session_symptoms (
+        symptom TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        session_id INTEGER NOT NULL,
+        PRIMARY KEY (symptom, created_at, session_id),
+        FOREIGN KEY (session_id) REFERENCES sessions (id)
+    ) WITHOUT ROWID
+    """)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    conn.commit()
+
+    # Backfill in chunks, resuming after the last session already indexed.
+    # Stop if another worker finished the backfill while the lock was
+    # released between chunks.
+    last_id = conn.execute("SELECT COALESCE(MAX(session_id), 0) FROM session_symptoms").fetchone()[0]
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+            conn.commit()
+            break
+        end_id = conn.execute(
+            "SELECT MAX(id) FROM (SELECT id FROM sessions WHERE id > ? ORDER BY id LIMIT ?)",
+            (last_id, MIGRATION_CHUNK_SIZE),
+        ).fetchone()[0]
+        if end_id is None:
+            conn.commit()
+            break
+
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO session_symptoms (symptom, created_at, session_id)
+            SELECT answer.key, s.created_at, s.id
+            FROM sessions s, json_each(s.answers_json) answer
+            WHERE s.id > ? AND s.id <= ? AND answer.value = 1
+            """,
+            (last_id, end_id),
+        )
         conn.commit()
+        last_id = end_id
+
+
+def _migration_6_session_notes_search(conn: sqlite3.Connection) -> None:
+    # Full-text index over sessions.user_notes. It is an external-content
+    # FTS5 table: it holds only the index, reads the text from sessions, and
+    # the triggers keep it in step with every insert, update and delete.
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS sessions_fts USING fts5(
+        user_notes,
+        content='sessions',
+        content_rowid='id'
+    )
+    """)
+
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_insert AFTER INSERT ON sessions BEGIN
+        INSERT INTO sessions_fts (rowid, user_notes) VALUES (new.id, new.user_notes);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_delete AFTER DELETE ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, user_notes) VALUES ('delete', old.id, old.user_notes);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS sessions_fts_update AFTER UPDATE OF user_notes ON sessions BEGIN
+        INSERT INTO sessions_fts (sessions_fts, rowid, user_notes) VALUES ('delete', old.id, old.user_notes);
+        INSERT INTO sessions_fts (rowid, user_notes) VALUES (new.id, new.user_notes);
+    END
+    """)
+
+    # Index the existing notes. One statement, inside the migration's write
+    # lock, so no session can be indexed twice by a trigger and the rebuild.
+    conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
+
+
+def _migration_7_analytics_rollups(conn: sqlite3.Connection) -> None:
+    # Per-day counts kept up to date by every write (see update_rollups),
+    # so dashboards never have to parse answers_json or the rules' causes.
+    # Each counts sessions: per day, per "yes" symptom, per pair of "yes"
+    # symptoms (symptom_a < symptom_b) and per cause suggested by any of
+    # the session's results.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_sessions (
+        day TEXT PRIMARY KEY,
+        sessions INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_symptoms (
+        day TEXT NOT NULL,
+        symptom TEXT NOT NULL,
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (day, symptom)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_symptom_pairs (
+        day TEXT NOT NULL,
+        symptom_a TEXT NOT NULL,
+        symptom_b TEXT NOT NULL,
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (day, symptom_a, symptom_b)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS daily_causes (
+        day TEXT NOT NULL,
+        cause TEXT NOT NULL,
+        sessions INTEGER NOT NULL,
+        PRIMARY KEY (day, cause)
+    ) WITHOUT ROWID
+    """)
+
+    # Sessions saved from now on are counted as they are written. The ones
+    # already here (ids up to end_id) are counted by the backfill job in
+    # app/data/analytics.py, which moves the watermark as it goes.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_backfill (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        watermark INTEGER NOT NULL,
+        end_id INTEGER NOT NULL
+    )
+    """)
+    conn.execute(
+        "INSERT OR IGNORE INTO rollup_backfill (id, watermark, end_id) "
+        "SELECT 1, 0, COALESCE(MAX(id), 0) FROM sessions"
+    )
+
 
+# Applied in order; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    _migration_1_base_tables,
+    _migration_2_results_session_index,
+    _migration_3_rule_references,
+    _migration_4_session_rule_set_version,
+    _migration_5_session_history_indexes,
+    _migration_6_session_notes_search,
+    _migration_7_analytics_rollups,
+]
 
-def save_session(user_notes: str, answers: dict) -> int:
+
+def init_db():
+    # Bring the schema up to date. Each migration runs under a write lock
+    # and bumps user_version, so concurrent workers apply it only once.
+    with get_connection() as conn:
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                return
+
+            MIGRATIONS[version](conn)
+            if not conn.in_transaction:
+                # Chunked migrations commit as they go, releasing the lock;
+                # only bump the version if no other worker has moved it on.
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("PRAGMA user_version").fetchone()[0] != version:
+                    conn.commit()
+                    continue
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+
+
+INSERT_SESSION_SQL = """
+    INSERT INTO sessions (created_at, user_notes, answers_json, rule_set_version)
+    VALUES (?, ?, ?, ?)
+"""
+
+INSERT_SESSION_SYMPTOM_SQL = "INSERT INTO session_symptoms (symptom, created_at, session_id) VALUES (?, ?, ?)"
+
+INSERT_RULE_SET_SQL = "INSERT OR IGNORE INTO rule_sets (version, created_at) VALUES (?, ?)"
+
+INSERT_RULE_SQL = """
+    INSERT OR IGNORE INTO rules
+        (rule_set_version, rule_id, symptom, probable_causes_json, next_tests_json)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+INSERT_RESULT_SQL = "INSERT INTO results (session_id, rule_set_version, rule_id) VALUES (?, ?, ?)"
+
+# Rollup updates. Each adds `sign` (1 or -1) times the counts of the
+# sessions whose ids are in the JSON array parameter, in one statement, so
+# a whole batch is aggregated inside SQLite.
+_SESSION_IDS = "SELECT value FROM json_each(:ids)"
+
+ROLLUP_SESSIONS_SQL = f"""
+    INSERT INTO daily_sessions (day, sessions)
+    SELECT substr(s.created_at, 1, 10), :sign * COUNT(*)
+    FROM sessions s
+    WHERE s.id IN ({_SESSION_IDS})
+    GROUP BY 1
+    ON CONFLICT (day) DO UPDATE SET sessions = sessions + excluded.sessions
+"""
+
+ROLLUP_SYMPTOMS_SQL = f"""
+    INSERT INTO daily_symptoms (day, symptom, sessions)
+    SELECT substr(s.created_at, 1, 10), answer.key, :sign * COUNT(*)
+    FROM sessions s, json_each(s.answers_json) answer
+    WHERE s.id IN ({_SESSION_IDS}) AND answer.value = 1
+    GROUP BY 1, 2
+    ON CONFLICT (day, symptom) DO UPDATE SET sessions = sessions + excluded.sessions
+"""
+
+ROLLUP_SYMPTOM_PAIRS_SQL = f"""
+    INSERT INTO daily_symptom_pairs (day, symptom_a, symptom_b, sessions)
+    SELECT substr(s.created_at, 1, 10), a.key, b.key, :sign * COUNT(*)
+    FROM sessions s, json_each(s.answers_json) a, json_each(s.answers_json) b
+    WHERE s.id IN ({_SESSION_IDS}) AND a.value = 1 AND b.value = 1 AND a.key < b.key
+    GROUP BY 1, 2, 3
+    ON CONFLICT (day, symptom_a, symptom_b) DO UPDATE SET sessions = sessions + excluded.sessions
+"""
+
+# A cause suggested by several of a session's results counts once.
+ROLLUP_CAUSES_SQL = f"""
+    INSERT INTO daily_causes (day, cause, sessions)
+    SELECT day, cause, :sign * COUNT(*)
+    FROM (
+        SELECT DISTINCT s.id, substr(s.created_at, 1, 10) AS day, cause.value AS cause
+        FROM results r
+        JOIN sessions s ON s.id = r.session_id
+        JOIN rules ru ON ru.rule_set_version = r.rule_set_version AND ru.rule_id = r.rule_id,
+        json_each(ru.probable_causes_json) cause
+        WHERE r.session_id IN ({_SESSION_IDS})
+    )
+    WHERE true
+    GROUP BY day, cause
+    ON CONFLICT (day, cause) DO UPDATE SET sessions = sessions + excluded.sessions
+"""
+
+
+def _counted_session_ids(cur: sqlite3.Cursor, session_ids: list[int]) -> list[int]:
+    # Sessions the rollups already cover: new ones, and old ones the
+    # backfill has reached. The rest are left for the backfill to count.
+    # (Newly inserted sessions always count: AUTOINCREMENT ids only grow,
+    # so they are past end_id.)
+    watermark, end_id = cur.execute("SELECT watermark, end_id FROM rollup_backfill").fetchone()
+    if watermark >= end_id:
+        return session_ids
+    return [session_id for session_id in session_ids if session_id <= watermark or session_id > end_id]
+
+
+def update_rollups(
+    cur: sqlite3.Cursor,
+    session_ids: list[int],
+    sessions: bool = True,
+    causes: bool = True,
+    sign: int = 1,
+) -> None:
+    # Add (sign=1) or remove (sign=-1) sessions from the rollups, as they
+    # are stored right now: `sessions` for the per-day, symptom and pair
+    # counts, `causes` for the cause counts of their current results.
+    if not session_ids:
+        return
+    params = {"ids": json.dumps(session_ids), "sign": sign}
+    if sessions:
+        cur.execute(ROLLUP_SESSIONS_SQL, params)
+        cur.execute(ROLLUP_SYMPTOMS_SQL, params)
+        cur.execute(ROLLUP_SYMPTOM_PAIRS_SQL, params)
+    if causes:
+        cur.execute(ROLLUP_CAUSES_SQL, params)
+
+
+def _insert_session(cur: sqlite3.Cursor, user_notes: str, answers: dict, rule_set_version: str | None = None) -> int:
     created_at = datetime.utcnow().isoformat()
+    cur.execute(INSERT_SESSION_SQL, (created_at, user_notes, json.dumps(answers), rule_set_version))
+    session_id = cur.lastrowid
+    cur.executemany(
+        INSERT_SESSION_SYMPTOM_SQL,
+        [(symptom, created_at, session_id) for symptom, value in answers.items() if value],
+    )
+    return session_id
+
+
+def _insert_rules(cur: sqlite3.Cursor, results, known_rules: set) -> set:
+    # Store the text of any rule this database hasn't seen yet. Returns the
+    # new (rule_set_version, rule_id) keys, to be marked known after commit.
+    new_rules = {}
+    for r in results:
+        key = (r.rule_set_version, r.rule_id)
+        if key not in known_rules and key not in new_rules:
+            new_rules[key] = r
+
+    if new_rules:
+        created_at = datetime.utcnow().isoformat()
+        cur.executemany(
+            INSERT_RULE_SET_SQL,
+            [(version, created_at) for version in {version for version, _ in new_rules}],
+        )
+        cur.executemany(
+            INSERT_RULE_SQL,
+            [
+                (
+                    r.rule_set_version,
+                    r.rule_id,
+                    r.symptom,
+                    json.dumps(r.probable_causes),
+                    json.dumps(r.next_tests),
+                )
+                for r in new_rules.values()
+            ],
+        )
+    return set(new_rules)
+
+
+def _result_rows(session_id: int, results):
+    for r in results:
+        yield (session_id, r.rule_set_version, r.rule_id)
+
 
+@timed("db.save_session")
+def save_session(user_notes: str, answers: dict, rule_set_version: str | None = None) -> int:
     with get_connection() as conn:
         cur = conn.cursor()
-        cur.execute(
-            "INSERT INTO sessions (created_at, user_notes, answers_json) VALUES (?, ?, ?)",
-            (created_at, user_notes, json.dumps(answers)),
-        )
-        session_id = cur.lastrowid
-        conn.commit()
+        session_id = _insert_session(cur, user_notes, answers, rule_set_version)
+        update_rollups(cur, [session_id], causes=False)
         return session_id
 
 
-def save_results(session_id: int, results: list[dict]) -> None:
+@timed("db.save_results")
+def save_results(session_id: int, results: Sequence[Rule]) -> None:
+    save_many_results([(session_id, results)], replace=False)
+
+
+def save_diagnosis(user_notes: str, answers: dict, results: Sequence[Rule], rule_set_version: str | None = None) -> int:
+    # Session and its results are written in one transaction, so a session
+    # is never saved without its results.
+    return save_diagnoses([(user_notes, answers, results, rule_set_version)])[0]
+
+
+@timed("db.save_diagnoses")
+def save_diagnoses(diagnoses: list[tuple[str, dict, Sequence[Rule], str | None]]) -> list[int]:
+    # Write many (user_notes, answers, results, rule_set_version) diagnoses
+    # in a single commit.
+    pool = get_pool()
     with get_connection() as conn:
         cur = conn.cursor()
+        new_rules = _insert_rules(
+            cur,
+            (r for _, _, results, _ in diagnoses for r in results),
+            pool.known_rules,
+        )
 
-        for r in results:
-            cur.execute(
-                """
-                INSERT INTO results (session_id, symptom, probable_causes_json, next_tests_json)
-                VALUES (?, ?, ?, ?)
-                """,
-                (
-                    session_id,
-                    r["symptom"],
-                    json.dumps(r["probable_causes"]),
-                    json.dumps(r["next_tests"]),
-                ),
+        session_ids = []
+        result_rows = []
+        for user_notes, answers, results, rule_set_version in diagnoses:
+            session_id = _insert_session(cur, user_notes, answers, rule_set_version)
+            session_ids.append(session_id)
+            result_rows.extend(_result_rows(session_id, results))
+
+        cur.executemany(INSERT_RESULT_SQL, result_rows)
+        update_rollups(cur, session_ids)
+
+    pool.known_rules.update(new_rules)
+    return session_ids
+
+
+@timed("db.save_many_results")
+def save_many_results(
+    session_results: list[tuple[int, Sequence[Rule]]],
+    replace: bool = False,
+    rule_set_version: str | None = None,
+) -> None:
+    # Store results for many sessions in one transaction. With replace=True
+    # any results the sessions already had are deleted first. A
+    # rule_set_version is recorded on the sessions as the one that
+    # produced these results.
+    pool = get_pool()
+    with get_connection() as conn:
+        # Take the write lock before reading the backfill watermark, so a
+        # backfill chunk can't commit between the read and the rollup delta.
+        conn.execute("BEGIN IMMEDIATE")
+        cur = conn.cursor()
+        new_rules = _insert_rules(
+            cur,
+            (r for _, results in session_results for r in results),
+            pool.known_rules,
+        )
+
+        # Cause counts follow each session's full set of results, so take
+        # the sessions out before their results change and add them back after.
+        counted_ids = _counted_session_ids(cur, [session_id for session_id, _ in session_results])
+        update_rollups(cur, counted_ids, sessions=False, sign=-1)
+
+        if replace:
+            cur.executemany(
+                "DELETE FROM results WHERE session_id = ?",
+                [(session_id,) for session_id, _ in session_results],
+            )
+        cur.executemany(
+            INSERT_RESULT_SQL,
+            [
+                row
+                for session_id, results in session_results
+                for row in _result_rows(session_id, results)
+            ],
+        )
+        if rule_set_version is not None:
+            cur.executemany(
+                "UPDATE sessions SET rule_set_version = ? WHERE id = ?",
+                [(rule_set_version, session_id) for session_id, _ in session_results],
             )
+        update_rollups(cur, counted_ids, sessions=False)
 
-        conn.commit()
+    pool.known_rules.update(new_rules)
+
+
+def replace_results(session_results: list[tuple[int, Sequence[Rule]]], rule_set_version: str | None = None) -> None:
+    # Swap the stored results of many sessions at once, in one transaction.
+    save_many_results(session_results, replace=True, rule_set_version=rule_set_version)
@@ -0,0 +1,110 @@
+import html
+import json
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+
+# Typed, slotted records for what used to travel through the app as dicts.
+# All of them are frozen: rules and results are shared between sessions,
+# threads and cached diagnoses, so nothing may change them in place.
+# Symptom and rule-id strings are interned, so the many records that name
+# the same symptom share one string.
+
+
+@dataclass(frozen=True, slots=True)
+class Session:
+    id: int
+    created_at: str
+    user_notes: str
+    answers: dict[str, bool]
+    rule_set_version: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    # A compiled rule, as matched by the engine. `condition` is the frozen
+    # condition tree (see validator.py), or None for a single-symptom rule.
+    rule_set_version: str
+    rule_id: str
+    symptom: str
+    probable_causes: tuple[str, ...]
+    next_tests: tuple[str, ...]
+    question: str | None = None
+    condition: object = None
+    weight: float = 1.0
+    cause_weights: tuple[float, ...] | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class DiagnosisResult:
+    # A stored result: the text of the rule a session matched, as saved in
+    # the rules table.
+    rule_set_version: str
+    rule_id: str
+    symptom: str
+    probable_causes: tuple[str, ...]
+    next_tests: tuple[str, ...]
+
+
+# Markers snippet() puts around matched terms in SearchHit.snippet. Control
+# characters, so they can't be confused with the notes' own text.
+HIGHLIGHT_START = "\x02"
+HIGHLIGHT_END = "\x03"
+
+
+@dataclass(frozen=True, slots=True)
+class SearchHit:
+    # A session whose notes matched a full-text search. `rank` is the bm25
+    # score (lower is better), None when results were not ranked; `snippet`
+    # is the best-matching stretch of the notes with matched terms between
+    # HIGHLIGHT_START and HIGHLIGHT_END.
+    session: Session
+    rank: float | None
+    snippet: str
+
+    def snippet_html(self) -> str:
+        # Escaped, so it is safe to render, with matches in <mark>.
+        return html.escape(self.snippet).replace(HIGHLIGHT_START, "<mark>").replace(HIGHLIGHT_END, "</mark>")
+
+    def snippet_text(self, start: str = "[", end: str = "]") -> str:
+        return self.snippet.replace(HIGHLIGHT_START, start).replace(HIGHLIGHT_END, end)
+
+
+def _answers_from_json(answers_json: str) -> dict[str, bool]:
+    return {sys.intern(symptom): value for symptom, value in json.loads(answers_json).items()}
+
+
+def session_row_factory(cursor, row) -> Session:
+    # For SELECT id, created_at, user_notes, answers_json, rule_set_version.
+    session_id, created_at, user_notes, answers_json, rule_set_version = row
+    return Session(session_id, created_at, user_notes or "", _answers_from_json(answers_json), rule_set_version)
+
+
+def search_hit_row_factory(cursor, row) -> SearchHit:
+    # As session_row_factory, followed by the rank and snippet.
+    return SearchHit(session_row_factory(cursor, row[:5]), row[5], row[6] or "")
+
+
+@lru_cache(maxsize=65536)
+def _diagnosis_result(rule_set_version, rule_id, symptom, causes_json, tests_json) -> DiagnosisResult:
+    # A rule's stored text never changes, so every result row naming the
+    # same (rule_set_version, rule_id) shares one DiagnosisResult instead of
+    # decoding the JSON again.
+    return DiagnosisResult(
+        rule_set_version,
+        sys.intern(rule_id),
+        sys.intern(symptom),
+        tuple(json.loads(causes_json)),
+        tuple(json.loads(tests_json)),
+    )
+
+
+def result_row_factory(cursor, row) -> DiagnosisResult:
+    # For SELECT rule_set_version, rule_id, symptom, probable_causes_json,
+    # next_tests_json.
+    return _diagnosis_result(*row)
+
+
+def session_result_row_factory(cursor, row) -> tuple[int, DiagnosisResult]:
+    # As result_row_factory, with the session id selected first.
+    return row[0], _diagnosis_result(*row[1:])
@@ -1,67 +1,275 @@
+import base64
 import json
+import re
+from app import settings
 from app.data.db import get_connection
+from app.data.models import (
+    HIGHLIGHT_END,
+    HIGHLIGHT_START,
+    DiagnosisResult,
+    SearchHit,
+    Session,
+    result_row_factory,
+    search_hit_row_factory,
+    session_result_row_factory,
+    session_row_factory,
+)
+from app.metrics import timed
 
 
-def get_session(session_id: int) -> dict | None:
+# SQLite's default limit on host parameters is 999; stay well below it.
+MAX_IDS_PER_QUERY = 500
+
+
+@timed("db.get_session")
+def get_session(session_id: int) -> Session | None:
     with get_connection() as conn:
         cur = conn.cursor()
+        cur.row_factory = session_row_factory
         cur.execute(
-            "SELECT id, created_at, user_notes, answers_json FROM sessions WHERE id = ?",
+            "SELECT id, created_at, user_notes, answers_json, rule_set_version FROM sessions WHERE id = ?",
             (session_id,),
         )
-        row = cur.fetchone()
-
-        if not row:
-            return None
+        return cur.fetchone()
 
-        return {
-            "id": row[0],
-            "created_at": row[1],
-            "user_notes": row[2] or "",
-            "answers": json.loads(row[3]),
-        }
 
-
-def get_results_for_session(session_id: int) -> list[dict]:
+@timed("db.get_results_for_session")
+def get_results_for_session(session_id: int) -> list[DiagnosisResult]:
+    # Results only store (rule_set_version, rule_id); the rule text is
+    # rehydrated from the rules table.
     with get_connection() as conn:
         cur = conn.cursor()
+        cur.row_factory = result_row_factory
         cur.execute(
             """
-            SELECT symptom, probable_causes_json, next_tests_json
-            FROM results
-            WHERE session_id = ?
+            SELECT ru.rule_set_version, ru.rule_id, ru.symptom,
+                   ru.probable_causes_json, ru.next_tests_json
+            FROM results r
+            JOIN rules ru
+              ON ru.rule_set_version = r.rule_set_version AND ru.rule_id = r.rule_id
+            WHERE r.session_id = ?
+            ORDER BY r.id
             """,
             (session_id,),
         )
-        rows = cur.fetchall()
-
-        results = []
-        for symptom, causes_json, tests_json in rows:
-            results.append(
-                {
-                    "symptom": symptom,
-                    "probable_causes": json.loads(causes_json),
-                    "next_tests": json.loads(tests_json),
-                }
+        return cur.fetchall()
+
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(session: Session) -> str:
+    # Opaque keyset cursor: the (created_at, id) of the last row on a page.
+    return base64.urlsafe_b64encode(f"{session.created_at}|{session.id}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    # Raises ValueError for a cursor this module didn't produce.
+    try:
+        created_at, _, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().rpartition("|")
+        return created_at, int(session_id)
+    except (ValueError, UnicodeError) as exc:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from exc
+
+
+@timed("db.list_sessions_page")
+def list_sessions_page(
+    limit: int = 50,
+    cursor: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    symptom: str | None = None,
+) -> tuple[list[Session], str | None]:
+    # One page of sessions, newest first, and the cursor for the next page
+    # (None on the last page). `since` is inclusive and `until` exclusive,
+    # compared against created_at (ISO 8601, so a date like "2025-01-31"
+    # works too). `symptom` keeps sessions that answered it "yes".
+    #
+    # Pages continue from the cursor's (created_at, id) instead of using
+    # OFFSET, so every page is one index range scan, however deep.
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    if symptom is None:
+        table, id_column, where, params = "sessions s", "s.id", [], []
+    else:
+        table = "session_symptoms ss JOIN sessions s ON s.id = ss.session_id"
+        id_column, where, params = "ss.session_id", ["ss.symptom = ?"], [symptom]
+    created_column = "ss.created_at" if symptom is not None else "s.created_at"
+
+    if cursor is not None:
+        where.append(f"({created_column}, {id_column}) < (?, ?)")
+        params.extend(decode_cursor(cursor))
+    if since is not None:
+        where.append(f"{created_column} >= ?")
+        params.append(since)
+    if until is not None:
+        where.append(f"{created_column} < ?")
+        params.append(until)
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = session_row_factory
+        cur.execute(
+            f"""
+            SELECT s.id, s.created_at, s.user_notes, s.answers_json, s.rule_set_version
+            FROM {table}
+            {"WHERE " + " AND ".join(where) if where else ""}
+            ORDER BY {created_column} DESC, {id_column} DESC
+            LIMIT ?
+            """,
+            (*params, limit + 1),
+        )
+        sessions = cur.fetchall()
+
+    # One extra row tells whether there is a next page without a COUNT.
+    if len(sessions) <= limit:
+        return sessions, None
+    sessions = sessions[:limit]
+    return sessions, encode_cursor(sessions[-1])
+
+
+# Words either side of the match in a search snippet, in total.
+SNIPPET_TOKENS = 16
+
+_SEARCH_TERM = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def fts_query(text: str) -> str:
+    # Turn free text into an FTS5 query matching notes that contain every
+    # word. Each word (or "quoted phrase") is passed as an FTS5 string, so
+    # operators and punctuation in the input are searched for, not parsed;
+    # a trailing * still makes a word a prefix search ("RTX 40*").
+    # Raises ValueError if there is nothing to search for.
+    terms = []
+    for phrase, word in _SEARCH_TERM.findall(text):
+        prefix = not phrase and word.endswith("*")
+        term = phrase or (word.rstrip("*") if prefix else word)
+        if not re.search(r"\w", term):
+            continue
+        terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+
+    if not terms:
+        raise ValueError(f"Nothing to search for in {text!r}")
+    return " ".join(terms)
+
+
+SEARCH_ORDERS = ("rank", "newest")
+
+
+@timed("db.search_sessions")
+def search_sessions(query: str, limit: int = 20, offset: int = 0, order: str = "rank") -> list[SearchHit]:
+    # Sessions whose notes match `query` (see fts_query), each with a
+    # snippet of its notes around the match. order="rank" puts the best
+    # match first by bm25, order="newest" the most recent session.
+    #
+    # bm25 has to score every match before it can pick the best, which
+    # takes most of a second for a word found in a large share of millions
+    # of notes. So only the newest SEARCH_RANK_WINDOW matches are ranked:
+    # the window's oldest rowid comes from walking the match list backwards,
+    # and the ranked query only reads matches from there on. Newest first
+    # skips scoring (the hits' rank is None) and stops after `limit` matches.
+    if order not in SEARCH_ORDERS:
+        raise ValueError(f"Unknown search order {order!r}; expected one of {', '.join(SEARCH_ORDERS)}")
+    match = fts_query(query)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    with get_connection() as conn:
+        min_id = 0
+        if order == "rank" and settings.SEARCH_RANK_WINDOW > 0:
+            row = conn.execute(
+                """
+                SELECT rowid FROM sessions_fts
+                WHERE sessions_fts MATCH ?
+                ORDER BY rowid DESC
+                LIMIT 1 OFFSET ?
+                """,
+                (match, settings.SEARCH_RANK_WINDOW - 1),
+            ).fetchone()
+            if row is not None:
+                min_id = row[0]
+
+        cur = conn.cursor()
+        cur.row_factory = search_hit_row_factory
+        cur.execute(
+            f"""
+            SELECT s.id, s.created_at, s.user_notes, s.answers_json, s.rule_set_version,
+                   {"sessions_fts.rank" if order == "rank" else "NULL"},
+                   snippet(sessions_fts, 0, ?, ?, '…', ?)
+            FROM sessions_fts
+            JOIN sessions s ON s.id = sessions_fts.rowid
+            WHERE sessions_fts MATCH ? AND sessions_fts.rowid >= ?
+            ORDER BY {"sessions_fts.rank" if order == "rank" else "sessions_fts.rowid DESC"}
+            LIMIT ? OFFSET ?
+            """,
+            (HIGHLIGHT_START, HIGHLIGHT_END, SNIPPET_TOKENS, match, min_id, limit, max(0, offset)),
+        )
+        return cur.fetchall()
+
+
+def iter_session_answers(chunk_size: int = 5000):
+    # Stream (session_id, answers) pairs in id order, one chunk per query,
+    # so the whole table never has to fit in memory.
+    last_id = 0
+    while True:
+        with get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                """
+                SELECT id, answers_json
+                FROM sessions
+                WHERE id > ?
+                ORDER BY id
+                LIMIT ?
+                """,
+                (last_id, chunk_size),
             )
-        return results
+            rows = cur.fetchall()
+
+        if not rows:
+            return
 
+        yield [(session_id, json.loads(answers_json)) for session_id, answers_json in rows]
+        last_id = rows[-1][0]
 
-def list_recent_sessions(limit: int = 10) -> list[dict]:
+
+def get_sessions_in_range(start_id: int, end_id: int, limit: int = 100) -> list[Session]:
+    # Up to `limit` sessions with start_id <= id <= end_id, in id order.
     with get_connection() as conn:
         cur = conn.cursor()
+        cur.row_factory = session_row_factory
         cur.execute(
             """
-            SELECT id, created_at, user_notes
+            SELECT id, created_at, user_notes, answers_json, rule_set_version
             FROM sessions
-            ORDER BY id DESC
+            WHERE id BETWEEN ? AND ?
+            ORDER BY id
             LIMIT ?
             """,
-            (limit,),
+            (start_id, end_id, limit),
         )
-        rows = cur.fetchall()
+        return cur.fetchall()
+
 
-        return [
-            {"id": row[0], "created_at": row[1], "user_notes": row[2] or ""}
-            for row in rows
-        ]
+@timed("db.get_results_for_sessions")
+def get_results_for_sessions(session_ids: list[int]) -> dict[int, list[DiagnosisResult]]:
+    # Batched get_results_for_session: one query per MAX_IDS_PER_QUERY ids.
+    results = {session_id: [] for session_id in session_ids}
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = session_result_row_factory
+        for start in range(0, len(session_ids), MAX_IDS_PER_QUERY):
+            chunk = session_ids[start:start + MAX_IDS_PER_QUERY]
+            placeholders = ",".join("?" * len(chunk))
+            cur.execute(
+                f"""
+                SELECT r.session_id, ru.rule_set_version, ru.rule_id, ru.symptom,
+                       ru.probable_causes_json, ru.next_tests_json
+                FROM results r
+                JOIN rules ru
+                  ON ru.rule_set_version = r.rule_set_version AND ru.rule_id = r.rule_id
+                WHERE r.session_id IN ({placeholders})
+                ORDER BY r.id
+                """,
+                chunk,
+            )
+            for session_id, result in cur.fetchall():
+                results[session_id].append(result)
+    return results
@@ -0,0 +1,384 @@
+import gzip
+import itertools
+import json
+import struct
+import sys
+import zlib
+from array import array
+from pathlib import Path
+
+from app.data.analytics import backfill_rollups
+from app.data.db import INSERT_RESULT_SQL, INSERT_RULE_SET_SQL, INSERT_RULE_SQL, get_connection
+
+# Bulk export / import of sessions with their results and the rules they
+# reference, for offline analysis and for seeding fresh instances.
+#
+# Two formats:
+#   jsonl     gzip-compressed JSON lines: a header, the rule sets, the rules,
+#             then one line per session with its answers and results.
+#   columnar  Parquet-style, stdlib only: row groups of up to `chunk_size`
+#             rows per table, each column stored as one zlib block (ints
+#             delta-encoded, strings as lengths + UTF-8), so a reader can
+#             load only the columns it needs. See read_columnar().
+#
+# Exports read through one snapshot, a chunk of sessions at a time
+# (fetchmany), so memory stays flat however large the tables are.
+
+FORMATS = ("jsonl", "columnar")
+FORMAT_VERSION = 1
+
+EXPORT_CHUNK_SIZE = 10_000
+IMPORT_BATCH_SIZE = 100_000
+
+COLUMNAR_MAGIC = b"PCBTCOL1"
+GZIP_MAGIC = b"\x1f\x8b"
+
+# Table -> (column, type) as exported; "int" columns are never NULL.
+TABLES = {
+    "rule_sets": (("version", "str"), ("created_at", "str")),
+    "rules": (
+        ("rule_set_version", "str"), ("rule_id", "str"), ("symptom", "str"),
+        ("probable_causes_json", "str"), ("next_tests_json", "str"),
+    ),
+    "sessions": (
+        ("id", "int"), ("created_at", "str"), ("user_notes", "str"),
+        ("answers_json", "str"), ("rule_set_version", "str"),
+    ),
+    "results": (("session_id", "int"), ("rule_set_version", "str"), ("rule_id", "str")),
+}
+
+_dumps = json.JSONEncoder(ensure_ascii=False, separators=(",", ":")).encode
+
+
+# --- Reading the database ---
+
+def _iter_table(conn, table: str, order_by: str, chunk_size: int):
+    # Lists of up to chunk_size rows, streamed from one cursor.
+    columns = ", ".join(name for name, _ in TABLES[table])
+    cur = conn.execute(f"SELECT {columns} FROM {table} ORDER BY {order_by}")
+    while rows := cur.fetchmany(chunk_size):
+        yield rows
+
+
+def _iter_session_chunks(conn, chunk_size: int):
+    # (sessions, results) per chunk of sessions in id order. Results are
+    # fetched for the chunk's id range with the session index, rather than
+    # joined, so each session is read once however many results it has.
+    for sessions in _iter_table(conn, "sessions", "id", chunk_size):
+        results = conn.execute(
+            """
+            SELECT session_id, rule_set_version, rule_id FROM results
+            WHERE session_id BETWEEN ? AND ?
+            ORDER BY session_id, id
+            """,
+            (sessions[0][0], sessions[-1][0]),
+        ).fetchall()
+        yield sessions, results
+
+
+# --- JSON lines ---
+
+def _write_jsonl(conn, f, chunk_size: int) -> int:
+    write = f.write
+    write(_dumps({"type": "header", "format": "pcbt-sessions", "version": FORMAT_VERSION}) + "\n")
+    for rows in _iter_table(conn, "rule_sets", "version", chunk_size):
+        for version, created_at in rows:
+            write(_dumps({"type": "rule_set", "version": version, "created_at": created_at}) + "\n")
+    for rows in _iter_table(conn, "rules", "rule_set_version, rule_id", chunk_size):
+        for version, rule_id, symptom, causes_json, tests_json in rows:
+            # Stored JSON is spliced in as is instead of parsed and re-encoded.
+            write(
+                f'{{"type":"rule","rule_set_version":{_dumps(version)},"rule_id":{_dumps(rule_id)},'
+                f'"symptom":{_dumps(symptom)},"probable_causes":{causes_json},"next_tests":{tests_json}}}\n'
+            )
+
+    total = 0
+    for sessions, results in _iter_session_chunks(conn, chunk_size):
+        results_by_session = {
+            session_id: [{"rule_set_version": version, "rule_id": rule_id} for _, version, rule_id in group]
+            for session_id, group in itertools.groupby(results, key=lambda row: row[0])
+        }
+        for session_id, created_at, user_notes, answers_json, version in sessions:
+            write(
+                f'{{"type":"session","id":{session_id},"created_at":{_dumps(created_at)},'
+                f'"user_notes":{_dumps(user_notes)},"rule_set_version":{_dumps(version)},'
+                f'"answers":{answers_json},"results":{_dumps(results_by_session.get(session_id, []))}}}\n'
+            )
+        total += len(sessions)
+    return total
+
+
+def _iter_jsonl_rows(f, batch_size: int):
+    # (table, rows) batches in insert order, rows as TABLES tuples.
+    header = json.loads(f.readline() or "{}")
+    if header.get("format") != "pcbt-sessions" or header.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Not a version {FORMAT_VERSION} session export")
+
+    batches = {table: [] for table in TABLES}
+    for line in f:
+        record = json.loads(line)
+        kind = record["type"]
+        if kind == "session":
+            session_id = record["id"]
+            batches["sessions"].append((
+                session_id, record["created_at"], record["user_notes"],
+                json.dumps(record["answers"]), record["rule_set_version"],
+            ))
+            batches["results"].extend(
+                (session_id, result["rule_set_version"], result["rule_id"]) for result in record["results"]
+            )
+            if len(batches["sessions"]) < batch_size:
+                continue
+        elif kind == "rule":
+            batches["rules"].append((
+                record["rule_set_version"], record["rule_id"], record["symptom"],
+                json.dumps(record["probable_causes"]), json.dumps(record["next_tests"]),
+            ))
+            continue
+        elif kind == "rule_set":
+            batches["rule_sets"].append((record["version"], record["created_at"]))
+            continue
+        else:
+            raise ValueError(f"Unknown record type {kind!r}")
+
+        yield from _drain(batches)
+    yield from _drain(batches)
+
+
+def _drain(batches: dict):
+    # Parents before children: rule sets, rules, sessions, results.
+    for table, rows in batches.items():
+        if rows:
+            yield table, rows
+            batches[table] = []
+
+
+# --- Columnar ---
+
+def _le(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def _encode_column(kind: str, values: list) -> bytes:
+    if kind == "int":
+        # Deltas: ids are ascending, so these are mostly small and repeat.
+        deltas = array("q", (value - previous for previous, value in zip(itertools.chain((0,), values), values)))
+        return zlib.compress(_le(deltas))
+
+    # Strings: int32 byte lengths (-1 for NULL), then the UTF-8 bytes.
+    encoded = [None if value is None else value.encode() for value in values]
+    lengths = array("i", (-1 if data is None else len(data) for data in encoded))
+    lengths_bytes = _le(lengths)
+    return zlib.compress(
+        struct.pack("<I", len(lengths_bytes)) + lengths_bytes + b"".join(data for data in encoded if data)
+    )
+
+
+def _decode_column(kind: str, blob: bytes) -> list:
+    data = zlib.decompress(blob)
+    if kind == "int":
+        return list(itertools.accumulate(_from_le("q", data)))
+
+    lengths_size, = struct.unpack_from("<I", data)
+    lengths = _from_le("i", data[4:4 + lengths_size])
+    values = []
+    position = 4 + lengths_size
+    for length in lengths:
+        if length < 0:
+            values.append(None)
+        else:
+            values.append(data[position:position + length].decode())
+            position += length
+    return values
+
+
+def _write_block(f, table: str, rows: list) -> None:
+    # One row group: a length-prefixed JSON header naming the table and the
+    # size of each column block, then the column blocks.
+    blobs = [_encode_column(kind, list(column)) for (_, kind), column in zip(TABLES[table], zip(*rows))]
+    header = json.dumps({"table": table, "rows": len(rows), "sizes": [len(blob) for blob in blobs]}).encode()
+    f.write(struct.pack("<I", len(header)) + header)
+    for blob in blobs:
+        f.write(blob)
+
+
+def _write_columnar(conn, f, chunk_size: int) -> int:
+    f.write(COLUMNAR_MAGIC + struct.pack("<I", FORMAT_VERSION))
+    for rows in _iter_table(conn, "rule_sets", "version", chunk_size):
+        _write_block(f, "rule_sets", rows)
+    for rows in _iter_table(conn, "rules", "rule_set_version, rule_id", chunk_size):
+        _write_block(f, "rules", rows)
+
+    total = 0
+    for sessions, results in _iter_session_chunks(conn, chunk_size):
+        _write_block(f, "sessions", sessions)
+        if results:
+            _write_block(f, "results", results)
+        total += len(sessions)
+    f.write(struct.pack("<I", 0))
+    return total
+
+
+def read_columnar(path: Path, columns: set[str] | None = None):
+    # (table, {column: values}) per row group of a columnar export. With
+    # `columns`, other columns are skipped without being decompressed, e.g.
+    # read_columnar(path, {"created_at", "answers_json"}) for symptom stats.
+    with open(path, "rb") as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC:
+            raise ValueError(f"{path} is not a columnar session export")
+        version, = struct.unpack("<I", f.read(4))
+        if version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar export version {version}")
+
+        while True:
+            header_size, = struct.unpack("<I", f.read(4))
+            if not header_size:
+                return
+            header = json.loads(f.read(header_size))
+            group = {}
+            for (name, kind), size in zip(TABLES[header["table"]], header["sizes"]):
+                if columns is None or name in columns:
+                    group[name] = _decode_column(kind, f.read(size))
+                else:
+                    f.seek(size, 1)
+            yield header["table"], group
+
+
+def _iter_columnar_rows(path: Path):
+    for table, group in read_columnar(path):
+        yield table, list(zip(*(group[name] for name, _ in TABLES[table])))
+
+
+# --- Export / import ---
+
+def export_sessions(path: Path, format: str = "jsonl", chunk_size: int = EXPORT_CHUNK_SIZE) -> int:
+    # Write every session, its results and the rules they reference to
+    # `path`. Returns the number of sessions written.
+    if format not in FORMATS:
+        raise ValueError(f"Unknown export format {format!r}; expected one of {', '.join(FORMATS)}")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with get_connection() as conn:
+        # One read transaction, so the export is a consistent snapshot while
+        # the app keeps writing.
+        conn.execute("BEGIN")
+        if format == "jsonl":
+            with gzip.open(path, "wt", encoding="utf-8", compresslevel=6) as f:
+                return _write_jsonl(conn, f, chunk_size)
+        with open(path, "wb") as f:
+            return _write_columnar(conn, f, chunk_size)
+
+
+INSERT_SQL = {
+    "rule_sets": INSERT_RULE_SET_SQL,
+    "rules": INSERT_RULE_SQL,
+    "sessions": """
+        INSERT INTO sessions (id, created_at, user_notes, answers_json, rule_set_version)
+        VALUES (?, ?, ?, ?, ?)
+    """,
+    "results": INSERT_RESULT_SQL,
+}
+
+# Indexes and triggers on these tables are dropped for the import and
+# recreated once at the end; building an index over sorted data in one go
+# is much cheaper than updating it row by row.
+DEFERRED_TABLES = ("sessions", "results", "session_symptoms")
+
+
+def _drop_deferred(conn) -> list[str]:
+    # Returns the SQL to recreate what was dropped.
+    objects = conn.execute(
+        f"""
+        SELECT type, name, sql FROM sqlite_master
+        WHERE type IN ('index', 'trigger') AND sql IS NOT NULL
+          AND tbl_name IN ({", ".join("?" * len(DEFERRED_TABLES))})
+        """,
+        DEFERRED_TABLES,
+    ).fetchall()
+    for kind, name, _ in objects:
+        conn.execute(f'DROP {kind.upper()} "{name}"')
+    return [sql for _, _, sql in objects]
+
+
+def _rebuild_derived(conn, deferred: list[str]) -> None:
+    # Recreate the indexes and triggers, then fill what they would have
+    # kept up to date: the symptom index and the notes search index.
+    for sql in deferred:
+        conn.execute(sql)
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO session_symptoms (symptom, created_at, session_id)
+        SELECT answer.key, s.created_at, s.id
+        FROM sessions s, json_each(s.answers_json) answer
+        WHERE answer.value = 1
+        """
+    )
+    conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('rebuild')")
+    # The imported sessions are counted into the rollups by the backfill.
+    for table in ("daily_sessions", "daily_symptoms", "daily_symptom_pairs", "daily_causes"):
+        conn.execute(f"DELETE FROM {table}")
+    conn.execute("UPDATE rollup_backfill SET watermark = 0, end_id = (SELECT COALESCE(MAX(id), 0) FROM sessions)")
+
+
+def import_sessions(path: Path, batch_size: int = IMPORT_BATCH_SIZE, defer_indexes: bool = True) -> int:
+    # Load an export (either format, detected from the file) into a database
+    # with no sessions yet, keeping session ids. Rows are inserted with
+    # executemany, one transaction per `batch_size` sessions. Returns the
+    # number of sessions imported. Raises ValueError if the database already
+    # has sessions or the file is not an export.
+    with open(path, "rb") as f:
+        magic = f.read(len(COLUMNAR_MAGIC))
+
+    if magic.startswith(GZIP_MAGIC):
+        f = gzip.open(path, "rt", encoding="utf-8")
+        batches = _iter_jsonl_rows(f, batch_size)
+    elif magic == COLUMNAR_MAGIC:
+        f = None
+        batches = _iter_columnar_rows(path)
+    else:
+        raise ValueError(f"{path} is not a session export")
+
+    total = 0
+    try:
+        with get_connection() as conn:
+            if conn.execute("SELECT EXISTS (SELECT 1 FROM sessions)").fetchone()[0]:
+                raise ValueError("Sessions can only be imported into a database without sessions")
+
+            conn.execute("BEGIN IMMEDIATE")
+            deferred = _drop_deferred(conn) if defer_indexes else []
+            conn.commit()
+            try:
+                pending = 0
+                for table, rows in batches:
+                    conn.executemany(INSERT_SQL[table], rows)
+                    if table == "sessions":
+                        total += len(rows)
+                        pending += len(rows)
+                    if pending >= batch_size:
+                        conn.commit()
+                        pending = 0
+                conn.commit()
+            finally:
+                # Runs after a failed import too, so the schema is whole again
+                # (sessions from batches already committed stay).
+                conn.rollback()
+                conn.execute("BEGIN IMMEDIATE")
+                _rebuild_derived(conn, deferred)
+                conn.commit()
+    finally:
+        if f is not None:
+            f.close()
+
+    backfill_rollups()
+    return total
@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from collections.abc import Sequence
+from concurrent.futures import Future
+
+from app import settings
+from app.data.db import save_diagnoses
+from app.data.models import Rule
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    # Write-behind buffer for save_diagnosis().
+    #
+    # Callers submit a diagnosis and get a Future for its session id. A single
+    # writer thread collects everything submitted within `flush_interval_ms`
+    # of the first queued item (up to `max_batch`) and writes it in one
+    # transaction, so N concurrent requests cost one commit instead of N.
+
+    def __init__(
+        self,
+        flush_interval_ms: float = settings.DB_GROUP_COMMIT_INTERVAL_MS,
+        max_batch: int = settings.DB_GROUP_COMMIT_MAX_BATCH,
+    ):
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="db-group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, user_notes: str, answers: dict, results: Sequence[Rule], rule_set_version: str | None = None) -> Future:
+        future = Future()
+        self._queue.put((future, (user_notes, answers, results, rule_set_version)))
+        return future
+
+    def close(self) -> None:
+        # Flushes everything already submitted, then stops the thread.
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                try:
+                    timeout = deadline - time.monotonic()
+                    item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._flush(batch)
+            if stopping:
+                return
+
+    @staticmethod
+    def _flush(batch: list) -> None:
+        # Skip requests whose caller gave up (e.g. the client disconnected).
+        batch = [(future, diagnosis) for future, diagnosis in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        try:
+            session_ids = save_diagnoses([diagnosis for _, diagnosis in batch])
+        except Exception as exc:
+            for future, _ in batch:
+                future.set_exception(exc)
+            return
+
+        for (future, _), session_id in zip(batch, session_ids):
+            future.set_result(session_id)
+
+
+_writer: GroupCommitWriter | None = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> GroupCommitWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
+
+
+def close_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
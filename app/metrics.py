@@ -0,0 +1,233 @@
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+from app import settings
+
+# In-process latency histograms for the hot paths, served in the Prometheus
+# text format at /metrics, plus a per-request Server-Timing header.
+#
+# Wrap a function with @timed("db.save_session") or a block with
+# `with timed("render.session_page"):`. Each timing is observed into the
+# pcbt_operation_duration_seconds histogram for that operation and, when it
+# runs on behalf of a web request, added to that request's Server-Timing.
+
+# Upper bounds in seconds, from an engine match (microseconds) to a large
+# PDF build or batch write (seconds).
+DEFAULT_BUCKETS = (
+    0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+OPERATION_METRIC = "pcbt_operation_duration_seconds"
+HTTP_METRIC = "pcbt_http_request_duration_seconds"
+METRIC_HELP = {
+    OPERATION_METRIC: "Time spent in instrumented hot paths.",
+    HTTP_METRIC: "Time to handle an HTTP request, until the response is sent.",
+}
+
+
+class Histogram:
+    # Cumulative-bucket histogram, as Prometheus expects. observe() is one
+    # bisect and a lock; buckets are only summed up when rendered.
+
+    __slots__ = ("buckets", "_counts", "_sum", "_lock")
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self._counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += seconds
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0.0
+
+    def snapshot(self) -> tuple[list[int], float]:
+        # (cumulative count per bucket including +Inf, sum)
+        with self._lock:
+            counts, total = list(self._counts), self._sum
+        cumulative, running = [], 0
+        for count in counts:
+            running += count
+            cumulative.append(running)
+        return cumulative, total
+
+
+# (metric, sorted label pairs) -> Histogram
+_histograms: dict[tuple[str, tuple], Histogram] = {}
+_histograms_lock = threading.Lock()
+
+
+def histogram(metric: str, **labels: str) -> Histogram:
+    key = (metric, tuple(sorted(labels.items())))
+    found = _histograms.get(key)
+    if found is None:
+        with _histograms_lock:
+            found = _histograms.setdefault(key, Histogram())
+    return found
+
+
+def reset() -> None:
+    # Forget every observation, e.g. between benchmark runs. Histograms are
+    # zeroed rather than dropped, as @timed functions hold on to theirs.
+    with _histograms_lock:
+        for found in _histograms.values():
+            found.clear()
+
+
+# Timings of the request being handled, as (operation, seconds); None
+# outside a request. Executor hops in async_db copy the context, so work a
+# request hands to a thread is still counted for it.
+_request_timings: contextvars.ContextVar[list | None] = contextvars.ContextVar("request_timings", default=None)
+
+
+def _record(operation: str, histogram: Histogram, seconds: float) -> None:
+    histogram.observe(seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((operation, seconds))
+
+
+class timed:
+    # A context manager, or a decorator timing every call. With
+    # PCBT_METRICS=0 the decorator returns the function unchanged and blocks
+    # are not recorded.
+
+    __slots__ = ("operation", "_histogram", "_start")
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._histogram = histogram(OPERATION_METRIC, operation=operation)
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if settings.METRICS:
+            _record(self.operation, self._histogram, time.perf_counter() - self._start)
+
+    def __call__(self, fn):
+        if not settings.METRICS:
+            return fn
+        operation, observe = self.operation, self._histogram.observe
+        perf_counter, get_timings = time.perf_counter, _request_timings.get
+
+        # _record() inlined: this wraps calls that only take microseconds
+        # (engine.run), so every call saved in the wrapper counts.
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds = perf_counter() - start
+                observe(seconds)
+                timings = get_timings()
+                if timings is not None:
+                    timings.append((operation, seconds))
+
+        return wrapper
+
+
+def _label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(pairs) -> str:
+    return ",".join(f'{name}="{_label_value(str(value))}"' for name, value in pairs)
+
+
+def render_histograms() -> str:
+    with _histograms_lock:
+        items = sorted(_histograms.items(), key=lambda item: item[0])
+
+    lines = []
+    metric = None
+    for (name, labels), found in items:
+        if name != metric:
+            metric = name
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+        cumulative, total = found.snapshot()
+        for bound, count in zip((*found.buckets, "+Inf"), cumulative):
+            le = bound if isinstance(bound, str) else repr(bound)
+            lines.append(f"{name}_bucket{{{_labels((*labels, ('le', le)))}}} {count}")
+        label_text = f"{{{_labels(labels)}}}" if labels else ""
+        lines.append(f"{name}_sum{label_text} {total!r}")
+        lines.append(f"{name}_count{label_text} {cumulative[-1]}")
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def render_value(name: str, kind: str, help: str, value: float) -> str:
+    # One gauge or counter, for stats kept elsewhere (e.g. the diagnosis cache).
+    return f"# HELP {name} {help}\n# TYPE {name} {kind}\n{name} {value}\n"
+
+
+def server_timing(timings: list, total: float) -> str:
+    # Server-Timing header value: time per operation (summed when it ran
+    # more than once) and the whole request, in milliseconds.
+    durations: dict[str, float] = {}
+    for operation, seconds in timings:
+        durations[operation] = durations.get(operation, 0.0) + seconds
+    entries = [f"{operation};dur={seconds * 1000:.3f}" for operation, seconds in durations.items()]
+    entries.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(entries)
+
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: times every HTTP request into
+    # pcbt_http_request_duration_seconds by route template (not raw path, so
+    # session ids don't each get a series), adds the Server-Timing header and
+    # hands requests to the slow-request profiler when one is enabled.
+
+    def __init__(self, app, server_timing_header: bool = settings.SERVER_TIMING):
+        self.app = app
+        self.server_timing_header = server_timing_header
+        self.profiler = None
+        if settings.PROFILE_SLOW_MS > 0:
+            from app.profiler import get_profiler
+
+            self.profiler = get_profiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing_header:
+                    header = server_timing(timings, time.perf_counter() - start)
+                    message = {**message, "headers": [*message.get("headers", ()), (b"server-timing", header.encode())]}
+            await send(message)
+
+        if self.profiler is not None:
+            self.profiler.begin()
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_timings.reset(token)
+            # FastAPI records the matched route in the scope.
+            route = getattr(scope.get("route"), "path", None) or "other"
+            histogram(HTTP_METRIC, method=scope["method"], route=route, status=str(status)).observe(elapsed)
+            if self.profiler is not None:
+                self.profiler.end(start, elapsed, f"{scope['method']} {route}")
@@ -0,0 +1,152 @@
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+from app import settings
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames of threads that are waiting for work rather than doing
+# it (idle pool workers, the event loop in select()); left out of profiles.
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+# Samples kept, in seconds; a request running longer loses its start.
+HISTORY_SECONDS = 60
+
+
+def _frame_name(code) -> str:
+    # "function (package/module.py:line)"; frozen modules keep their "<...>".
+    path = Path(code.co_filename)
+    location = code.co_filename if code.co_filename.startswith("<") else f"{path.parent.name}/{path.name}"
+    return f"{code.co_name} ({location}:{code.co_firstlineno})".replace(";", ":")
+
+
+class SamplingProfiler:
+    # Opt-in slow-request profiler (PCBT_PROFILE_SLOW_MS > 0).
+    #
+    # While any request is in flight, a thread samples the stack of every other
+    # thread each PROFILE_INTERVAL_MS. When a request takes longer than
+    # PROFILE_SLOW_MS, the samples taken while it ran are written to PROFILE_DIR
+    # as folded stacks ("thread;outer;...;inner count" per line), the input of
+    # flamegraph.pl, speedscope and inferno. Samples cover every thread, so the
+    # executor threads doing a request's database work show up, and so does any
+    # request running concurrently with it.
+
+    def __init__(
+        self,
+        slow_ms: float = settings.PROFILE_SLOW_MS,
+        interval_ms: float = settings.PROFILE_INTERVAL_MS,
+        directory: Path = settings.PROFILE_DIR,
+    ):
+        self.slow = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        # (perf_counter time, [folded stack, ...]) per sampling tick.
+        self._ticks = deque(maxlen=max(1, int(HISTORY_SECONDS / self.interval)))
+        self._pending: list[tuple[str, float, float]] = []
+        self._active = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def begin(self) -> None:
+        with self._lock:
+            self._active += 1
+            self._wake.set()
+
+    def end(self, started: float, elapsed: float, label: str) -> None:
+        # Called on the event loop; the profile is written by the sampler
+        # thread, so a slow request doesn't also wait on the disk.
+        with self._lock:
+            self._active -= 1
+            if elapsed >= self.slow:
+                self._pending.append((label, started, started + elapsed))
+                self._wake.set()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stopping = True
+            self._wake.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while True:
+            self._wake.wait()
+            if self._stopping:
+                return
+
+            now = time.perf_counter()
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                code = frame.f_code
+                if (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_name(frame.f_code))
+                    frame = frame.f_back
+                frames.append(names.get(ident, str(ident)))
+                stacks.append(";".join(reversed(frames)))
+
+            with self._lock:
+                self._ticks.append((now, stacks))
+                pending, self._pending = self._pending, []
+                if not self._active and not pending and not self._stopping:
+                    self._wake.clear()
+            for label, started, finished in pending:
+                self._write(label, started, finished)
+            time.sleep(self.interval)
+
+    def _write(self, label: str, started: float, finished: float) -> None:
+        with self._lock:
+            counts = Counter(stack for tick, stacks in self._ticks if started <= tick <= finished for stack in stacks)
+        if not counts:
+            return
+
+        name = re.sub(r"[^A-Za-z0-9]+", "_", label).strip("_")
+        path = self.directory / f"{datetime.now():%Y%m%d-%H%M%S-%f}-{name}-{(finished - started) * 1000:.0f}ms.folded"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text("".join(f"{stack} {count}\n" for stack, count in counts.items()), encoding="utf-8")
+        except OSError as exc:
+            logger.warning("Could not write profile %s: %s", path, exc)
+            return
+        logger.info("Slow request %s (%.0f ms) profiled to %s", label, (finished - started) * 1000, path)
+
+
+_profiler: SamplingProfiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler() -> SamplingProfiler:
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler()
+    return _profiler
+
+
+def close_profiler() -> None:
+    global _profiler
+    with _profiler_lock:
+        if _profiler is not None:
+            _profiler.close()
+            _profiler = None
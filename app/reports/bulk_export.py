@@ -0,0 +1,85 @@
+import io
+import zipfile
+from collections import deque
+from concurrent.futures import Executor
+
+from app.data.queries import get_results_for_sessions, get_sessions_in_range
+
+# Sessions (and their results) fetched per batch of queries.
+FETCH_CHUNK_SIZE = 100
+
+
+def iter_sessions_with_results(start_id: int, end_id: int, chunk_size: int = FETCH_CHUNK_SIZE):
+    # (session, results) for every session in the id range, fetched a chunk
+    # at a time with one query for the sessions and one for their results.
+    next_id = start_id
+    while next_id <= end_id:
+        sessions = get_sessions_in_range(next_id, end_id, limit=chunk_size)
+        if not sessions:
+            return
+
+        results = get_results_for_sessions([session.id for session in sessions])
+        for session in sessions:
+            yield session, results[session.id]
+        next_id = sessions[-1].id + 1
+
+
+def iter_rendered_reports(start_id: int, end_id: int, executor: Executor | None = None, window: int = 16):
+    # (session_id, pdf_bytes) in id order. With an executor, up to `window`
+    # reports are rendered in parallel; results are still yielded in order
+    # and at most `window` PDFs are held in memory at once.
+    from app.reports.pdf_report import render_pdf_bytes
+
+    if executor is None:
+        for session, results in iter_sessions_with_results(start_id, end_id):
+            yield session.id, render_pdf_bytes(session, results)
+        return
+
+    pending = deque()
+    for session, results in iter_sessions_with_results(start_id, end_id):
+        pending.append((session.id, executor.submit(render_pdf_bytes, session, results)))
+        if len(pending) >= window:
+            session_id, future = pending.popleft()
+            yield session_id, future.result()
+
+    while pending:
+        session_id, future = pending.popleft()
+        yield session_id, future.result()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, non-seekable target for ZipFile: collects written bytes
+    # until drained, so the archive can be streamed entry by entry.
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_reports_zip(start_id: int, end_id: int, executor: Executor | None = None):
+    # A ZIP archive with one PDF per session, yielded as byte chunks while
+    # it is being built.
+    from app.reports.pdf_report import report_filename
+
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for session_id, pdf_bytes in iter_rendered_reports(start_id, end_id, executor):
+            archive.writestr(report_filename(session_id), pdf_bytes)
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,111 @@
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import uuid
+from pathlib import Path
+
+from app import settings
+from app.data.models import DiagnosisResult, Session
+
+logger = logging.getLogger(__name__)
+
+
+class ReportCache:
+    # Content-addressed cache of rendered PDF reports.
+    #
+    # The key hashes everything a report is built from (session data, results
+    # and the rule-set versions they came from) plus the template version, so
+    # a cached file is valid for as long as its key matches and never needs
+    # invalidating. Files are written to a temp name and renamed into place,
+    # so concurrent renders of the same report never expose a partial file.
+
+    def __init__(self, directory: Path = settings.REPORT_CACHE_DIR, max_bytes: int = settings.REPORT_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(session: Session, results: list[DiagnosisResult]) -> str:
+        from app.reports.pdf_report import TEMPLATE_VERSION
+
+        payload = {
+            "session": dataclasses.asdict(session),
+            "results": [dataclasses.asdict(r) for r in results],
+            "rule_set_versions": sorted({str(r.rule_set_version) for r in results}),
+            "template_version": TEMPLATE_VERSION,
+        }
+        canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def path_for(self, session: Session, key: str) -> Path:
+        return self.directory / f"session_{session.id}_{key[:32]}.pdf"
+
+    def get(self, session: Session, key: str) -> Path | None:
+        path = self.path_for(session, key)
+        try:
+            # Refresh mtime, which is what eviction orders by.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_or_render(self, session: Session, results: list[DiagnosisResult]) -> tuple[Path, str]:
+        key = self.key(session, results)
+        path = self.get(session, key)
+        if path is not None:
+            return path, key
+
+        from app.reports.pdf_report import generate_pdf_report
+
+        path = self.path_for(session, key)
+        temp_name = f".{path.name}.{uuid.uuid4().hex}.tmp"
+        temp_path = generate_pdf_report(session, results, self.directory, filename=temp_name)
+        try:
+            os.replace(temp_path, path)
+        except BaseException:
+            temp_path.unlink(missing_ok=True)
+            raise
+
+        self.evict(keep=path)
+        return path, key
+
+    def put(self, session: Session, key: str, data: bytes) -> Path | None:
+        # Store a report that was built in memory (a streamed download), so
+        # the next request for it is served from disk. Best effort: returns
+        # None if it could not be written.
+        path = self.path_for(session, key)
+        temp_path = self.directory / f".{path.name}.{uuid.uuid4().hex}.tmp"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            temp_path.write_bytes(data)
+            os.replace(temp_path, path)
+        except OSError as exc:
+            temp_path.unlink(missing_ok=True)
+            logger.warning("Could not cache report %s: %s", path, exc)
+            return None
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path | None = None) -> None:
+        # Drop least recently used reports until the cache fits max_bytes,
+        # never removing `keep` (the report about to be served).
+        entries = []
+        total = 0
+        for path in self.directory.glob("*.pdf"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,173 @@
+import asyncio
+import multiprocessing
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
+
+from app import settings
+from app.data.models import DiagnosisResult, Session
+from app.metrics import timed
+from app.reports.cache import ReportCache
+
+
+class RenderQueueFull(Exception):
+    # Raised when REPORT_MAX_PENDING builds are already queued or running.
+    pass
+
+
+def _render_cached(cache_dir: str, max_bytes: int, session: Session, results: list[DiagnosisResult]) -> tuple[Path, str]:
+    # Runs in a worker process, so it gets a cache pointed at the same
+    # directory rather than the parent's instance.
+    return ReportCache(Path(cache_dir), max_bytes).get_or_render(session, results)
+
+
+def _render_to_dir(output_dir: str, session: Session, results: list[DiagnosisResult]) -> Path:
+    from app.reports.pdf_report import generate_pdf_report
+
+    return generate_pdf_report(session, results, Path(output_dir))
+
+
+def _render_bytes(session: Session, results: list[DiagnosisResult]) -> bytes:
+    from app.reports.pdf_report import render_pdf_bytes
+
+    return render_pdf_bytes(session, results)
+
+
+class _PendingSlotExecutor(Executor):
+    # The render pool as seen by the bulk export, which runs on a worker
+    # thread: each submit waits for one of the service's pending slots and
+    # holds it until the build is done, so an export counts against
+    # REPORT_MAX_PENDING like web downloads do. Without a pool the report is
+    # built in the calling thread, still inside a slot.
+
+    def __init__(self, service: "ReportRenderService"):
+        self._service = service
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        slots = self._service._slots
+        slots.acquire()
+        try:
+            executor = self._service.executor
+            if executor is not None:
+                future = executor.submit(fn, *args, **kwargs)
+            else:
+                future = Future()
+                try:
+                    future.set_result(fn(*args, **kwargs))
+                except Exception as exc:
+                    future.set_exception(exc)
+        except BaseException:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        return future
+
+
+class ReportRenderService:
+    # Builds PDF reports off the event loop.
+    #
+    # ReportLab work is CPU-bound, so builds go to a process pool. Concurrent
+    # requests for the same report share one build (single-flight), and at
+    # most `max_pending` builds may be in flight; beyond that render() raises
+    # RenderQueueFull instead of letting the backlog grow without bound. Bulk
+    # exports share the same limit through export_executor, waiting for a
+    # free slot instead.
+
+    def __init__(
+        self,
+        workers: int = settings.REPORT_WORKERS,
+        max_pending: int = settings.REPORT_MAX_PENDING,
+        cache: ReportCache | None = None,
+    ):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.cache = cache if cache is not None else ReportCache()
+        self._executor: ProcessPoolExecutor | None = None
+        self._in_flight: dict[tuple, asyncio.Future] = {}
+        # One slot per build queued or running, from either path.
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    @property
+    def executor(self) -> ProcessPoolExecutor | None:
+        if self._executor is None and self.workers > 0:
+            # "spawn" keeps workers from inheriting the parent's open database
+            # connections and threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    @property
+    def export_executor(self) -> Executor:
+        return _PendingSlotExecutor(self)
+
+    async def render_bytes(self, session: Session, results: list[DiagnosisResult]) -> bytes:
+        # Build the report in memory, without touching the disk cache.
+        key = ("bytes", self.cache.key(session, results))
+        return await self._single_flight(key, partial(_render_bytes, session, results))
+
+    async def render(self, session: Session, results: list[DiagnosisResult], output_dir: Path | None = None) -> Path:
+        # Without output_dir the report goes through the content-addressed
+        # cache; with it, it is written as a named file in that directory.
+        if output_dir is None:
+            key = ("cache", self.cache.key(session, results))
+            cached = self.cache.get(session, key[1])
+            if cached is not None:
+                return cached
+            job = partial(_render_cached, str(self.cache.directory), self.cache.max_bytes, session, results)
+        else:
+            key = ("dir", str(output_dir), session.id)
+            job = partial(_render_to_dir, str(output_dir), session, results)
+
+        result = await self._single_flight(key, job)
+        return result[0] if output_dir is None else result
+
+    async def _single_flight(self, key: tuple, job):
+        future = self._in_flight.get(key)
+        if future is None:
+            if not self._slots.acquire(blocking=False):
+                raise RenderQueueFull(f"{self.max_pending} reports already being rendered")
+
+            loop = asyncio.get_running_loop()
+            try:
+                future = asyncio.ensure_future(loop.run_in_executor(self.executor, job))
+            except BaseException:
+                self._slots.release()
+                raise
+            self._in_flight[key] = future
+
+            def done(_):
+                self._in_flight.pop(key, None)
+                self._slots.release()
+
+            future.add_done_callback(done)
+
+        # shield() so one caller giving up doesn't cancel the shared build.
+        # Timed here as well as in the worker, whose histograms stay in its
+        # own process; this includes the wait for a free worker.
+        with timed("report.build"):
+            return await asyncio.shield(future)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+_service: ReportRenderService | None = None
+
+
+def get_render_service() -> ReportRenderService:
+    global _service
+    if _service is None:
+        _service = ReportRenderService()
+    return _service
+
+
+def close_render_service() -> None:
+    global _service
+    if _service is not None:
+        _service.close()
+        _service = None
@@ -1,16 +1,294 @@
-from .knowledge_base import DIAGNOSTIC_RULES
+import hashlib
+import json
+import sys
+from types import MappingProxyType
+
+from app.data.models import Rule
+from app.metrics import timed
+
+# Decision DAG node kinds. Each node is (kind, argument):
+#   LEAF -> symptom key, NOT -> child node id, ALL / ANY -> tuple of child node ids
+LEAF = "leaf"
+NOT = "not"
+ALL = "all"
+ANY = "any"
+
+# Bump whenever CompiledRuleSet's attributes change, so compiled rule sets
+# cached on disk by an older version are rebuilt.
+COMPILED_FORMAT_VERSION = "3"
+
+
+def _freeze(value):
+    # Conditions are shared by every diagnosis, so hand out read-only views
+    # (with tuples instead of lists) that callers cannot mutate.
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def rule_set_version(rules: list[dict]) -> str:
+    # Content hash, so the same rules always get the same version and any
+    # edit produces a new one.
+    canonical = json.dumps(rules, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+def _freeze_rule(rule: dict, version: str) -> Rule:
+    probable_causes = rule["probable_causes"]
+
+    # Store causes strongest-first so every consumer sees them ranked.
+    cause_weights = rule.get("cause_weights")
+    if cause_weights:
+        ranked = sorted(
+            zip(probable_causes, cause_weights),
+            key=lambda pair: -pair[1],
+        )
+        probable_causes = [cause for cause, _ in ranked]
+        cause_weights = tuple(weight for _, weight in ranked)
+
+    return Rule(
+        rule_set_version=version,
+        rule_id=sys.intern(rule.get("id", rule["symptom"])),
+        symptom=sys.intern(rule["symptom"]),
+        probable_causes=tuple(probable_causes),
+        next_tests=tuple(rule["next_tests"]),
+        question=rule.get("question"),
+        condition=_freeze(rule.get("condition")),
+        weight=rule.get("weight", 1.0),
+        cause_weights=cause_weights or None,
+    )
+
+
+class CompiledRuleSet:
+    # Rules compiled once at load time.
+    #
+    # Rules whose condition is a single symptom go into an inverted index of
+    # symptom -> rule positions, so they only cost anything when that symptom
+    # was answered "yes". Compound conditions are compiled into a decision DAG
+    # where identical sub-conditions share one node, so each distinct
+    # sub-condition is evaluated at most once per answer set.
+
+    def __init__(self, rules: list[dict]):
+        self.version = rule_set_version(rules)
+        self.rules = tuple(_freeze_rule(rule, self.version) for rule in rules)
+        self.questions = tuple(rule for rule in self.rules if rule.question is not None)
+        self.rule_by_id = {rule.rule_id: rule for rule in self.rules}
+
+        self.nodes: list[tuple] = []
+        self._node_ids: dict[tuple, int] = {}
+
+        index: dict[str, list[int]] = {}
+        compound = []
+        for position, rule in enumerate(rules):
+            condition = rule.get("condition", rule["symptom"])
+            if isinstance(condition, str):
+                index.setdefault(condition, []).append(position)
+            else:
+                compound.append((position, self._compile_condition(condition)))
+
+        self.symptom_index = {symptom: tuple(positions) for symptom, positions in index.items()}
+        self.compound_rules = tuple(compound)
+
+        # Higher weight ranks first; ties keep knowledge base order.
+        ranked = sorted(
+            range(len(self.rules)),
+            key=lambda position: (-self.rules[position].weight, position),
+        )
+        self._ranked_positions = tuple(ranked)
+        self._rank_of = [0] * len(self.rules)
+        for rank, position in enumerate(ranked):
+            self._rank_of[position] = rank
+        self._compound_node = dict(compound)
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def _add_node(self, node: tuple) -> int:
+        node_id = self._node_ids.get(node)
+        if node_id is None:
+            node_id = len(self.nodes)
+            self.nodes.append(node)
+            self._node_ids[node] = node_id
+        return node_id
+
+    def _compile_condition(self, condition) -> int:
+        # Children are always added before their parent, so self.nodes is
+        # in topological order and can be evaluated front to back.
+        if isinstance(condition, str):
+            return self._add_node((LEAF, condition))
+
+        (operator, operand), = condition.items()
+        if operator == NOT:
+            return self._add_node((NOT, self._compile_condition(operand)))
+        if operator not in (ALL, ANY):
+            raise ValueError(f"Unknown condition operator: {operator!r}")
+
+        # Sorting the de-duplicated children makes "a AND b" and "b AND a"
+        # the same node.
+        children = tuple(sorted({self._compile_condition(child) for child in operand}))
+        if len(children) == 1:
+            return children[0]
+        return self._add_node((operator, children))
+
+    def _evaluate_nodes(self, yes: set) -> list[bool]:
+        values = []
+        append = values.append
+        for kind, argument in self.nodes:
+            if kind == LEAF:
+                append(argument in yes)
+            elif kind == NOT:
+                append(not values[argument])
+            elif kind == ALL:
+                append(all(values[child] for child in argument))
+            else:
+                append(any(values[child] for child in argument))
+        return values
+
+    def match(self, answers: dict) -> list:
+        yes = {symptom for symptom, value in answers.items() if value}
+
+        positions = []
+        for symptom in yes:
+            positions.extend(self.symptom_index.get(symptom, ()))
+
+        if self.compound_rules:
+            values = self._evaluate_nodes(yes)
+            positions.extend(position for position, node in self.compound_rules if values[node])
+
+        positions.sort(key=self._rank_of.__getitem__)
+        return [self.rules[position] for position in positions]
+
+    def match_batch(self, answer_sets: list[dict]) -> list[list]:
+        # Vectorized form of match(): every symptom and every DAG node becomes
+        # a Python int bitset over the batch (bit i = answer set i), so each
+        # sub-condition is one AND / OR / NOT over the whole batch.
+        size = len(answer_sets)
+        if not size:
+            return []
+        full = (1 << size) - 1
+
+        rows_by_symptom: dict[str, list[int]] = {}
+        for row, answers in enumerate(answer_sets):
+            for symptom, value in answers.items():
+                if value:
+                    rows_by_symptom.setdefault(symptom, []).append(row)
+
+        node_bits = []
+        if self.compound_rules:
+            columns = {symptom: _to_bitset(rows, size) for symptom, rows in rows_by_symptom.items()}
+            for kind, argument in self.nodes:
+                if kind == LEAF:
+                    node_bits.append(columns.get(argument, 0))
+                elif kind == NOT:
+                    node_bits.append(full & ~node_bits[argument])
+                elif kind == ALL:
+                    bits = full
+                    for child in argument:
+                        bits &= node_bits[child]
+                    node_bits.append(bits)
+                else:
+                    bits = 0
+                    for child in argument:
+                        bits |= node_bits[child]
+                    node_bits.append(bits)
+
+        # Walking rules in rank order leaves every row's list already ranked.
+        batch_results = [[] for _ in range(size)]
+        for position in self._ranked_positions:
+            rule = self.rules[position]
+            node = self._compound_node.get(position)
+            if node is None:
+                rows = rows_by_symptom.get(rule.condition if rule.condition is not None else rule.symptom, ())
+            else:
+                rows = _bit_positions(node_bits[node])
+            for row in rows:
+                batch_results[row].append(rule)
+
+        return batch_results
+
+    @staticmethod
+    def rank_causes(matched: list) -> list[dict]:
+        # Combine the evidence for each cause across all matched rules
+        # (noisy-OR), so a cause suggested by several rules ranks higher.
+        doubt: dict[str, float] = {}
+        for rule in matched:
+            cause_weights = rule.cause_weights or (1.0,) * len(rule.probable_causes)
+            for cause, cause_weight in zip(rule.probable_causes, cause_weights):
+                doubt[cause] = doubt.get(cause, 1.0) * (1.0 - rule.weight * cause_weight)
+
+        ranked = sorted(doubt.items(), key=lambda item: item[1])
+        return [{"cause": cause, "confidence": round(1.0 - remaining, 4)} for cause, remaining in ranked]
+
+    def rank_stored_causes(self, results: list) -> list[dict] | None:
+        # rank_causes() for results read back from the database, which don't
+        # keep rule weights: the rules are looked up in this rule set. None
+        # if any result came from another rule set version.
+        if any(result.rule_set_version != self.version for result in results):
+            return None
+        return self.rank_causes([self.rule_by_id[result.rule_id] for result in results])
+
+
+def _to_bitset(rows: list[int], size: int) -> int:
+    packed = bytearray((size + 7) // 8)
+    for row in rows:
+        packed[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(packed, "little")
+
+
+def _bit_positions(bits: int):
+    packed = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(packed):
+        while byte:
+            low = byte & -byte
+            yield (byte_index << 3) + low.bit_length() - 1
+            byte ^= low
 
 
 class DiagnosticEngine:
-    def __init__(self):
-        self.results = []
+    # Stateless and immutable: an engine only holds the rule set it was
+    # built with (or none, to follow the rule store), and every call returns
+    # a new tuple of read-only rules. One instance can be shared by any
+    # number of threads and tasks; see DEFAULT_ENGINE.
+    #
+    # Without a rule set, each call uses the rule store's current snapshot,
+    # taken once at the start of the call. Callers that already hold a
+    # snapshot (e.g. the one they asked the questions from) can pass it per
+    # call instead.
+
+    __slots__ = ("_rule_set",)
+
+    def __init__(self, rule_set: CompiledRuleSet | None = None):
+        object.__setattr__(self, "_rule_set", rule_set)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    @property
+    def rule_set(self) -> CompiledRuleSet:
+        if self._rule_set is not None:
+            return self._rule_set
+        from app.rules.store import get_rule_store
+
+        return get_rule_store().snapshot
+
+    def _resolve(self, rule_set: CompiledRuleSet | None) -> CompiledRuleSet:
+        # Not `rule_set or ...`: an empty rule set is falsy.
+        return rule_set if rule_set is not None else self.rule_set
+
+    @timed("engine.run")
+    def run(self, answers: dict, rule_set: CompiledRuleSet | None = None) -> tuple:
+        return tuple(self._resolve(rule_set).match(answers))
 
-    def run(self, answers: dict):
-        self.results.clear()
+    @timed("engine.run_batch")
+    def run_batch(self, answer_sets: list[dict], rule_set: CompiledRuleSet | None = None) -> list[tuple]:
+        # One result tuple per answer set, in the same order.
+        return [tuple(results) for results in self._resolve(rule_set).match_batch(answer_sets)]
 
-        for rule in DIAGNOSTIC_RULES:
-            symptom = rule["symptom"]
-            if answers.get(symptom):
-                self.results.append(rule)
 
-        return self.results
+# Process-wide engine following the rule store; safe to share.
+DEFAULT_ENGINE = DiagnosticEngine()
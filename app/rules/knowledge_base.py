@@ -1,5 +1,11 @@
 # knowledge_base.py
 # This is the hardware knowledge encoded as rules
+#
+# A rule fires when its "symptom" question is answered yes, unless it has a
+# "condition" combining several answers:
+#   "symptom_key" | {"all": [...]} | {"any": [...]} | {"not": condition}
+# Optional "weight" (rule confidence) and "cause_weights" (one per probable
+# cause) are values in (0, 1] used to rank results; both default to 1.
 
 DIAGNOSTIC_RULES = [
     {
@@ -63,5 +69,20 @@ DIAGNOSTIC_RULES = [
             "Verify CPU 8-pin power cable",
             "Test the motherboard outside the case"
         ]
+    },
+    {
+        "symptom": "no_display_with_power_cycling",
+        "condition": {"all": ["powers_on_no_display", "power_cycles"]},
+        "probable_causes": [
+            "RAM not seated or incompatible",
+            "CPU not supported by the current BIOS version",
+            "CPU power cable not connected"
+        ],
+        "cause_weights": [0.9, 0.6, 0.5],
+        "next_tests": [
+            "Boot with one RAM stick in the slot the manual recommends",
+            "Check the motherboard CPU support list and update the BIOS",
+            "Verify CPU 8-pin power cable"
+        ]
     }
 ]
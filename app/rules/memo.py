@@ -0,0 +1,97 @@
+import threading
+from collections import OrderedDict
+
+from app import settings
+from app.rules.engine import DEFAULT_ENGINE, CompiledRuleSet
+from app.rules.store import get_rule_store
+from app.rules.summary import summarize_results
+
+
+class DiagnosisCache:
+    # Memoizes diagnoses of identical answer sets.
+    #
+    # A diagnosis depends only on the rule set and on which symptoms were
+    # answered "yes", so the key is (rule-set version, frozenset of yes
+    # symptoms). There are few distinct combinations compared to the number
+    # of requests. Entries hold the matched rules as a tuple (the rules
+    # themselves are read-only) and the summary text. The least recently used
+    # entry is evicted beyond `max_entries`, and everything is dropped when
+    # the rules are reloaded.
+
+    def __init__(self, max_entries: int = settings.DIAGNOSIS_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, tuple[tuple, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(rule_set: CompiledRuleSet, answers: dict) -> tuple:
+        return rule_set.version, frozenset(symptom for symptom, value in answers.items() if value)
+
+    def diagnose(self, rule_set: CompiledRuleSet, answers: dict) -> tuple[tuple, str]:
+        # (matched rules, summary) for `answers`, computed at most once per
+        # distinct key while it stays cached.
+        key = self.key(rule_set, answers)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        # Matched outside the lock; two threads missing on the same key just
+        # both compute it.
+        results = DEFAULT_ENGINE.run(answers, rule_set)
+        entry = (results, summarize_results(results))
+        if self.max_entries <= 0:
+            return entry
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def on_rule_reload(self, rule_set: CompiledRuleSet) -> None:
+        self.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache: DiagnosisCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_diagnosis_cache() -> DiagnosisCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                # Old entries are unreachable anyway, since the key carries
+                # the rule-set version; dropping them on reload frees memory.
+                cache = DiagnosisCache()
+                get_rule_store().add_reload_listener(cache.on_rule_reload)
+                _cache = cache
+    return _cache
@@ -0,0 +1,104 @@
+import copyreg
+import hashlib
+import logging
+import os
+import pickle
+import uuid
+from pathlib import Path
+from types import MappingProxyType
+
+from app import settings
+from app.rules.engine import COMPILED_FORMAT_VERSION, CompiledRuleSet
+
+logger = logging.getLogger(__name__)
+
+# Older entries beyond this many are removed whenever a new one is written.
+MAX_ENTRIES = 8
+
+
+def _mapping_proxy(mapping: dict) -> MappingProxyType:
+    # MappingProxyType itself can't be looked up by name when unpickling.
+    return MappingProxyType(mapping)
+
+
+def _reduce_mapping_proxy(proxy: MappingProxyType):
+    return _mapping_proxy, (dict(proxy),)
+
+
+# Compiled rules are read-only MappingProxyType views, which pickle can't
+# handle by default. Teach only this cache's pickler to store them as
+# dicts that are wrapped again on load.
+_DISPATCH_TABLE = copyreg.dispatch_table.copy()
+_DISPATCH_TABLE[MappingProxyType] = _reduce_mapping_proxy
+
+
+class CompiledRuleCache:
+    # On-disk cache of compiled rule sets, so a worker starting against an
+    # unchanged rules directory can skip parsing, validating and compiling.
+    #
+    # The key hashes the raw bytes of every source file (and their names)
+    # plus the compiled format version, so an entry is valid for as long as
+    # its key matches. Entries are pickles: the cache directory must only be
+    # writable by the app. Files are written to a temp name and renamed into
+    # place, so a worker never loads a partial file.
+
+    def __init__(self, directory: Path = settings.RULES_CACHE_DIR):
+        self.directory = Path(directory)
+
+    @staticmethod
+    def key(sources: list[tuple[str, bytes]]) -> str:
+        digest = hashlib.sha256(f"compiled-rules-v{COMPILED_FORMAT_VERSION}\0".encode())
+        for name, data in sources:
+            digest.update(f"{name}\0{len(data)}\0".encode())
+            digest.update(data)
+        return digest.hexdigest()
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"rules_{key[:32]}.pickle"
+
+    def get(self, key: str) -> CompiledRuleSet | None:
+        path = self.path_for(key)
+        try:
+            with path.open("rb") as f:
+                rule_set = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as exc:
+            # A corrupt or outdated entry is just a miss; it gets rewritten.
+            logger.warning("Ignoring unreadable compiled rule cache %s: %s", path, exc)
+            return None
+        return rule_set if isinstance(rule_set, CompiledRuleSet) else None
+
+    def put(self, key: str, rule_set: CompiledRuleSet) -> Path | None:
+        # Best effort: failing to write the cache never fails a load.
+        path = self.path_for(key)
+        temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with temp_path.open("wb") as f:
+                pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+                pickler.dispatch_table = _DISPATCH_TABLE
+                pickler.dump(rule_set)
+            os.replace(temp_path, path)
+        except (OSError, pickle.PicklingError) as exc:
+            temp_path.unlink(missing_ok=True)
+            logger.warning("Could not write compiled rule cache %s: %s", path, exc)
+            return None
+
+        self.prune(keep=path)
+        return path
+
+    def prune(self, keep: Path | None = None) -> None:
+        # Keep the MAX_ENTRIES most recently written entries; other workers
+        # may still be starting up against older rules.
+        entries = []
+        for path in self.directory.glob("rules_*.pickle"):
+            try:
+                entries.append((path.stat().st_mtime, path))
+            except FileNotFoundError:
+                continue
+
+        entries.sort(reverse=True)
+        for _, path in entries[MAX_ENTRIES:]:
+            if path != keep:
+                path.unlink(missing_ok=True)
@@ -0,0 +1,164 @@
+import json
+import logging
+import threading
+from pathlib import Path
+
+from app import settings
+from app.rules.engine import CompiledRuleSet
+from app.rules.knowledge_base import DIAGNOSTIC_RULES
+from app.rules.rule_cache import CompiledRuleCache
+from app.rules.validator import validate_rules
+
+logger = logging.getLogger(__name__)
+
+
+def read_rule_sources(directory: Path) -> list[tuple[str, bytes]]:
+    # (file name, raw bytes) of every *.json file, in name order so the
+    # rule order is stable.
+    return [(path.name, path.read_bytes()) for path in sorted(directory.glob("*.json"))]
+
+
+def parse_rule_sources(sources: list[tuple[str, bytes]]) -> list[dict]:
+    # Every file holds one rule or a list of rules.
+    rules = []
+    for _, data in sources:
+        parsed = json.loads(data)
+        rules.extend(parsed if isinstance(parsed, list) else [parsed])
+    return rules
+
+
+class RuleStore:
+    # Holds the current rule snapshot: an immutable, validated
+    # CompiledRuleSet. A reload builds a complete new snapshot and swaps the
+    # reference in one assignment, so a diagnosis that already picked up the
+    # old snapshot finishes with it, and nothing ever waits on a reload.
+    # A rule set that fails to load or validate is logged and ignored.
+
+    def __init__(
+        self,
+        directory: Path | None = settings.RULES_DIR,
+        poll_interval: float = settings.RULES_POLL_INTERVAL,
+        cache: CompiledRuleCache | None = None,
+    ):
+        self.directory = Path(directory) if directory is not None else None
+        self.poll_interval = poll_interval
+        if cache is None and settings.RULES_CACHE:
+            cache = CompiledRuleCache()
+        self.cache = cache
+        self._reload_lock = threading.Lock()
+        self._listeners = []
+        self._watcher: threading.Thread | None = None
+        self._stop = threading.Event()
+
+        self._source_state = self._read_source_state()
+        self._snapshot = self._load()
+
+    @property
+    def snapshot(self) -> CompiledRuleSet:
+        return self._snapshot
+
+    def add_reload_listener(self, callback) -> None:
+        # callback(new_snapshot) runs after every successful reload.
+        self._listeners.append(callback)
+
+    def _read_source_state(self) -> tuple:
+        if self.directory is None:
+            return ()
+        state = []
+        for path in sorted(self.directory.glob("*.json")):
+            stat = path.stat()
+            state.append((path.name, stat.st_mtime_ns, stat.st_size))
+        return tuple(state)
+
+    def _load(self) -> CompiledRuleSet:
+        if self.directory is None:
+            validate_rules(DIAGNOSTIC_RULES)
+            return CompiledRuleSet(DIAGNOSTIC_RULES)
+
+        # Rules are only parsed and validated when the cache has no compiled
+        # rule set for these exact source bytes.
+        sources = read_rule_sources(self.directory)
+        key = self.cache.key(sources) if self.cache is not None else None
+        if key is not None:
+            rule_set = self.cache.get(key)
+            if rule_set is not None:
+                return rule_set
+
+        rules = parse_rule_sources(sources)
+        validate_rules(rules)
+        rule_set = CompiledRuleSet(rules)
+        if key is not None:
+            self.cache.put(key, rule_set)
+        return rule_set
+
+    def reload_if_changed(self) -> bool:
+        if self.directory is None:
+            return False
+
+        with self._reload_lock:
+            try:
+                state = self._read_source_state()
+                if state == self._source_state:
+                    return False
+                # Remember the state even if loading fails, so a broken file
+                # is reported once rather than on every poll.
+                self._source_state = state
+                snapshot = self._load()
+            except (OSError, ValueError) as exc:
+                # json.JSONDecodeError is a ValueError too.
+                logger.error("Keeping rule set %s; reload from %s failed: %s",
+                             self._snapshot.version, self.directory, exc)
+                return False
+
+            if snapshot.version == self._snapshot.version:
+                return False
+
+            self._snapshot = snapshot
+
+        logger.info("Loaded rule set %s (%d rules) from %s", snapshot.version, len(snapshot), self.directory)
+        for callback in self._listeners:
+            callback(snapshot)
+        return True
+
+    def start_watching(self) -> None:
+        # Poll the rules directory's file mtimes in a background thread.
+        if self.directory is None or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="rule-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload_if_changed()
+            except Exception:
+                # Keep watching whatever a reload or listener raised.
+                logger.exception("Rule reload from %s failed", self.directory)
+
+
+_store: RuleStore | None = None
+_store_lock = threading.Lock()
+
+
+def get_rule_store() -> RuleStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RuleStore()
+    return _store
+
+
+def close_rule_store() -> None:
+    global _store
+    with _store_lock:
+        if _store is not None:
+            _store.stop_watching()
+            _store = None
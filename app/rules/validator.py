@@ -1,21 +1,76 @@
 REQUIRED_RULE_KEYS = {
     "symptom",
-    "question",
     "probable_causes",
     "next_tests",
 }
 
+CONDITION_OPERATORS = {"all", "any", "not"}
+
+
+def validate_condition(condition, known_symptoms: set[str], rule_name: str) -> None:
+    # A condition is a symptom key, or a single-key dict:
+    #   {"all": [...]}, {"any": [...]} or {"not": condition}
+    if isinstance(condition, str):
+        if condition not in known_symptoms:
+            raise ValueError(
+                f"Rule '{rule_name}' condition references unknown symptom '{condition}'"
+            )
+        return
+
+    if not isinstance(condition, dict) or len(condition) != 1:
+        raise ValueError(
+            f"Rule '{rule_name}' has a malformed condition: {condition!r}"
+        )
+
+    (operator, operand), = condition.items()
+    if operator not in CONDITION_OPERATORS:
+        raise ValueError(
+            f"Rule '{rule_name}' condition uses unknown operator '{operator}'"
+        )
+
+    if operator == "not":
+        validate_condition(operand, known_symptoms, rule_name)
+        return
+
+    if not isinstance(operand, list) or not operand:
+        raise ValueError(
+            f"Rule '{rule_name}' condition '{operator}' must have a non-empty list"
+        )
+    for child in operand:
+        validate_condition(child, known_symptoms, rule_name)
+
+
+def _is_weight(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and 0 < value <= 1
+
 
 def validate_rules(rules: list[dict]) -> None:
     # Validate diagnostic rules to ensure required structure.
     # Raises ValueError if a rule is malformed.
     for idx, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            raise ValueError(f"Rule at index {idx} must be an object, not {type(rule).__name__}")
+
         missing = REQUIRED_RULE_KEYS - rule.keys()
         if missing:
             raise ValueError(
                 f"Rule at index {idx} is missing required keys: {missing}"
             )
 
+        # Only rules that fire on their own symptom need a question;
+        # compound rules are answered by the questions they refer to.
+        if "condition" not in rule and "question" not in rule:
+            raise ValueError(
+                f"Rule at index {idx} is missing required keys: {{'question'}}"
+            )
+
+        if not isinstance(rule["symptom"], str) or not rule["symptom"]:
+            raise ValueError(f"Rule at index {idx} must have a non-empty symptom string")
+
+        for key in ("id", "question"):
+            if key in rule and not isinstance(rule[key], str):
+                raise ValueError(f"Rule '{rule['symptom']}' {key} must be a string")
+
         if not isinstance(rule["probable_causes"], list) or not rule["probable_causes"]:
             raise ValueError(
                 f"Rule '{rule['symptom']}' must have a non-empty probable_causes list"
@@ -25,3 +80,36 @@ def validate_rules(rules: list[dict]) -> None:
             raise ValueError(
                 f"Rule '{rule['symptom']}' must have a non-empty next_tests list"
             )
+
+        for key in ("probable_causes", "next_tests"):
+            if not all(isinstance(item, str) for item in rule[key]):
+                raise ValueError(f"Rule '{rule['symptom']}' {key} must be a list of strings")
+
+        if "weight" in rule and not _is_weight(rule["weight"]):
+            raise ValueError(
+                f"Rule '{rule['symptom']}' weight must be a number in (0, 1]"
+            )
+
+        if "cause_weights" in rule:
+            cause_weights = rule["cause_weights"]
+            if (
+                not isinstance(cause_weights, list)
+                or len(cause_weights) != len(rule["probable_causes"])
+                or not all(_is_weight(w) for w in cause_weights)
+            ):
+                raise ValueError(
+                    f"Rule '{rule['symptom']}' cause_weights must give one weight in (0, 1] per probable cause"
+                )
+
+    # Saved results refer to rules by id, which defaults to the symptom.
+    seen_ids = set()
+    for rule in rules:
+        rule_id = rule.get("id", rule["symptom"])
+        if rule_id in seen_ids:
+            raise ValueError(f"Duplicate rule id '{rule_id}'")
+        seen_ids.add(rule_id)
+
+    known_symptoms = {rule["symptom"] for rule in rules if "question" in rule}
+    for rule in rules:
+        if "condition" in rule:
+            validate_condition(rule["condition"], known_symptoms, rule["symptom"])
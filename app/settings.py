@@ -0,0 +1,93 @@
+import os
+from pathlib import Path
+
+# Project root = one level up from app/
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+
+# Every setting can be overridden with a PCBT_* environment variable.
+
+# --- Database ---
+DB_PATH = Path(os.environ.get("PCBT_DB_PATH", PROJECT_ROOT / "app_db.sqlite3"))
+
+# Connections kept open and shared between requests.
+DB_POOL_SIZE = int(os.environ.get("PCBT_DB_POOL_SIZE", "8"))
+
+# Seconds a writer waits for a lock before "database is locked".
+DB_BUSY_TIMEOUT = float(os.environ.get("PCBT_DB_BUSY_TIMEOUT", "30"))
+
+# NORMAL is durable across application crashes in WAL mode; FULL also
+# survives power loss at the cost of an fsync per commit.
+DB_SYNCHRONOUS = os.environ.get("PCBT_DB_SYNCHRONOUS", "NORMAL")
+
+# Page cache per connection, in KiB.
+DB_CACHE_SIZE_KIB = int(os.environ.get("PCBT_DB_CACHE_SIZE_KIB", "16384"))
+
+# Bytes of the database file memory-mapped for reads (0 disables).
+DB_MMAP_SIZE = int(os.environ.get("PCBT_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Prepared statements kept per connection.
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("PCBT_DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Group commit: concurrent web requests hand their writes to one writer
+# thread, which commits everything queued within the interval together.
+DB_GROUP_COMMIT = os.environ.get("PCBT_DB_GROUP_COMMIT", "1") == "1"
+DB_GROUP_COMMIT_INTERVAL_MS = float(os.environ.get("PCBT_DB_GROUP_COMMIT_INTERVAL_MS", "5"))
+DB_GROUP_COMMIT_MAX_BATCH = int(os.environ.get("PCBT_DB_GROUP_COMMIT_MAX_BATCH", "256"))
+
+# Note searches rank only this many of the newest matching sessions
+# (0 ranks every match, however many there are).
+SEARCH_RANK_WINDOW = int(os.environ.get("PCBT_SEARCH_RANK_WINDOW", "10000"))
+
+# --- Reports ---
+# Web downloads missing from the on-disk cache below are built in memory,
+# streamed, and then cached; set to 0 to build them into the cache and
+# serve the file instead.
+REPORT_STREAMING = os.environ.get("PCBT_REPORT_STREAMING", "1") == "1"
+
+# Rendered PDFs are cached here (relative paths are against the working
+# directory, like the CLI's reports_out/), least recently used first out
+# once the directory grows past REPORT_CACHE_MAX_BYTES.
+REPORT_CACHE_DIR = Path(os.environ.get("PCBT_REPORT_CACHE_DIR", "reports_out/cache"))
+REPORT_CACHE_MAX_BYTES = int(os.environ.get("PCBT_REPORT_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+# Processes used to build PDF reports (0 renders on a thread in-process).
+REPORT_WORKERS = int(os.environ.get("PCBT_REPORT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Report builds queued or running at once before new requests are refused.
+REPORT_MAX_PENDING = int(os.environ.get("PCBT_REPORT_MAX_PENDING", "32"))
+
+# Largest id range a single bulk report export may cover.
+REPORT_EXPORT_MAX_SESSIONS = int(os.environ.get("PCBT_REPORT_EXPORT_MAX_SESSIONS", "5000"))
+
+# --- Rules ---
+# Directory of *.json rule files (each a rule or a list of rules). When
+# unset, the built-in rules in app/rules/knowledge_base.py are used.
+RULES_DIR = Path(os.environ["PCBT_RULES_DIR"]) if os.environ.get("PCBT_RULES_DIR") else None
+
+# Seconds between checks of RULES_DIR for changed files.
+RULES_POLL_INTERVAL = float(os.environ.get("PCBT_RULES_POLL_INTERVAL", "2"))
+
+# Compiled RULES_DIR rule sets are cached here, keyed on a hash of the rule
+# files, so workers skip parsing and validating unchanged rules at startup.
+RULES_CACHE = os.environ.get("PCBT_RULES_CACHE", "1") == "1"
+RULES_CACHE_DIR = Path(os.environ.get("PCBT_RULES_CACHE_DIR", "rules_cache"))
+
+# Distinct answer sets whose diagnosis is memoized (0 to disable).
+DIAGNOSIS_CACHE_SIZE = int(os.environ.get("PCBT_DIAGNOSIS_CACHE_SIZE", "4096"))
+
+# Answer sets accepted by one POST /api/diagnose/batch.
+DIAGNOSE_BATCH_MAX_SIZE = int(os.environ.get("PCBT_DIAGNOSE_BATCH_MAX_SIZE", "10000"))
+
+# --- Metrics ---
+# Hot-path timers behind /metrics and the Server-Timing header (0 turns
+# the timers into no-ops).
+METRICS = os.environ.get("PCBT_METRICS", "1") == "1"
+SERVER_TIMING = os.environ.get("PCBT_SERVER_TIMING", "1") == "1"
+
+# Requests slower than this many milliseconds are profiled: every thread's
+# stack is sampled each PROFILE_INTERVAL_MS while requests run, and a slow
+# request's samples are written to PROFILE_DIR as folded stacks for flame
+# graphs. 0 disables the profiler.
+PROFILE_SLOW_MS = float(os.environ.get("PCBT_PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.environ.get("PCBT_PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = Path(os.environ.get("PCBT_PROFILE_DIR", "profiles"))
@@ -1,19 +1,31 @@
+import dataclasses
+import html
+from datetime import date, timedelta
 from pathlib import Path
+from urllib.parse import urlencode
 from fastapi import FastAPI, Request, Form
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
-from app.rules.engine import DiagnosticEngine
-from app.rules.knowledge_base import DIAGNOSTIC_RULES
-from app.rules.validator import validate_rules
-from app.data.db import init_db, save_session, save_results
-from app.data.queries import get_session, get_results_for_session
-from app.reports.pdf_report import generate_pdf_report
+from app.rules.engine import DEFAULT_ENGINE, CompiledRuleSet
+from app.rules.memo import get_diagnosis_cache
+from app.rules.store import get_rule_store, close_rule_store
 from app.rules.summary import summarize_results
+from app import metrics, settings
+from app.data import analytics, async_db
+from app.data.db import init_db, close_pool
+from app.data.writer import close_writer
+from app.metrics import MetricsMiddleware, timed
+from app.reports.bulk_export import iter_reports_zip
+from app.reports.render_service import RenderQueueFull, get_render_service, close_render_service
 
 
 app = FastAPI(title="PC Builder Troubleshooter")
+app.add_middleware(MetricsMiddleware)
 
 STATIC_DIR = Path(__file__).resolve().parent / "static"
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -22,11 +34,26 @@ TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
 
 
-
 @app.on_event("startup")
 def startup():
-    validate_rules(DIAGNOSTIC_RULES)
+    # Loading the store validates the rules, so bad rules fail startup.
+    get_rule_store().start_watching()
     init_db()
+    analytics.start_backfill()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    close_rule_store()
+    analytics.stop_backfill()
+    close_render_service()
+    close_writer()
+    async_db.close_executors()
+    close_pool()
+    if settings.PROFILE_SLOW_MS > 0:
+        from app.profiler import close_profiler
+
+        close_profiler()
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -35,7 +62,7 @@ def home(request: Request):
         "index.html",
         {
             "request": request,
-            "rules": DIAGNOSTIC_RULES,
+            "rules": get_rule_store().snapshot.questions,
         },
     )
 
@@ -47,8 +74,8 @@ def diagnose(
 ):
     # Convert form fields into answers dict
     answers = {}
-    for rule in DIAGNOSTIC_RULES:
-        key = rule["symptom"]
+    for rule in get_rule_store().snapshot.questions:
+        key = rule.symptom
         raw = request._form.get(key) if hasattr(request, "_form") else None  # fallback
         # parse below by reading from request.form()
         answers[key] = False
@@ -70,52 +97,404 @@ async def diagnose_async(
 ):
     form = await request.form()
 
+    # Parse and diagnose against one snapshot, even if the rules are
+    # reloaded while this request is running.
+    rule_set = get_rule_store().snapshot
+
     answers = {}
-    for rule in DIAGNOSTIC_RULES:
-        key = rule["symptom"]
+    for rule in rule_set.questions:
+        key = rule.symptom
         # radio values: "y" or "n"
         answers[key] = (form.get(key) == "y")
 
-    engine = DiagnosticEngine()
-    results = engine.run(answers)
-    summary = summarize_results(results)
+    # Identical answer sets are diagnosed once per rule-set version.
+    results, summary = get_diagnosis_cache().diagnose(rule_set, answers)
 
-    session_id = save_session(user_notes=user_notes.strip(), answers=answers)
-    save_results(session_id=session_id, results=results)
+    session_id = await async_db.save_diagnosis(
+        user_notes=user_notes.strip(),
+        answers=answers,
+        results=results,
+        rule_set_version=rule_set.version,
+    )
 
     return RedirectResponse(url=f"/session/{session_id}", status_code=303)
 
 
-@app.get("/session/{session_id}", response_class=HTMLResponse)
-def view_session(request: Request, session_id: int):
-    session = get_session(session_id)
-    if not session:
-        return HTMLResponse(f"<h2>Session {session_id} not found</h2>", status_code=404)
+class DiagnoseRequest(BaseModel):
+    # Symptoms left out are answered "no", as on the form.
+    answers: dict[str, bool]
+    user_notes: str = ""
+
+
+class DiagnoseBatchRequest(BaseModel):
+    diagnoses: list[DiagnoseRequest] = Field(max_length=settings.DIAGNOSE_BATCH_MAX_SIZE)
+
+
+def _answer_set(symptoms: list[str], answers: dict[str, bool]) -> dict[str, bool]:
+    # Every question answered, like a form post. Raises ValueError for a
+    # symptom the rules don't ask about, so a typo isn't quietly a "no".
+    unknown = answers.keys() - set(symptoms)
+    if unknown:
+        raise ValueError(f"Unknown symptoms: {', '.join(sorted(unknown))}")
+    return {symptom: answers.get(symptom, False) for symptom in symptoms}
+
+
+def _rule_json(rule) -> dict:
+    return {
+        "rule_id": rule.rule_id,
+        "symptom": rule.symptom,
+        "probable_causes": rule.probable_causes,
+        "next_tests": rule.next_tests,
+    }
+
+
+@app.post("/api/diagnose")
+async def api_diagnose(body: DiagnoseRequest):
+    # The JSON form of POST /diagnose: the session is saved and the matched
+    # rules come back in the response, ranked, instead of a redirect, along
+    # with the causes they suggest, most likely first.
+    rule_set = get_rule_store().snapshot
+    try:
+        answers = _answer_set([rule.symptom for rule in rule_set.questions], body.answers)
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=400)
+
+    results, summary = get_diagnosis_cache().diagnose(rule_set, answers)
+    session_id = await async_db.save_diagnosis(
+        user_notes=body.user_notes.strip(),
+        answers=answers,
+        results=results,
+        rule_set_version=rule_set.version,
+    )
+    return {
+        "session_id": session_id,
+        "rule_set_version": rule_set.version,
+        "summary": summary,
+        "ranked_causes": rule_set.rank_causes(results),
+        "results": [_rule_json(rule) for rule in results],
+    }
+
+
+def _run_batch(rule_set, diagnoses: list[DiagnoseRequest]) -> tuple[list[dict], list[list]]:
+    # (answer sets, matched rules per set). Raises ValueError naming the
+    # first invalid answer set.
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    answer_sets = []
+    for position, diagnosis in enumerate(diagnoses):
+        try:
+            answer_sets.append(_answer_set(symptoms, diagnosis.answers))
+        except ValueError as exc:
+            raise ValueError(f"diagnoses[{position}]: {exc}") from None
+    return answer_sets, DEFAULT_ENGINE.run_batch(answer_sets, rule_set)
+
+
+def _batch_response(rule_set_version: str, session_ids: list[int], all_results: list[list]) -> JSONResponse:
+    # Few distinct outcomes repeat across a batch; build each one once.
+    outcomes = {}
+    diagnoses = []
+    for session_id, results in zip(session_ids, all_results):
+        key = tuple(rule.rule_id for rule in results)
+        outcome = outcomes.get(key)
+        if outcome is None:
+            outcome = outcomes[key] = (
+                summarize_results(results),
+                CompiledRuleSet.rank_causes(results),
+                [_rule_json(rule) for rule in results],
+            )
+        diagnoses.append({
+            "session_id": session_id, "summary": outcome[0], "ranked_causes": outcome[1], "results": outcome[2],
+        })
+    # Already plain JSON types; skip FastAPI's jsonable_encoder walk, which
+    # takes longer than the diagnosing and saving for a large batch.
+    return JSONResponse({"rule_set_version": rule_set_version, "diagnoses": diagnoses})
+
+
+@app.post("/api/diagnose/batch")
+async def api_diagnose_batch(body: DiagnoseBatchRequest):
+    # Up to DIAGNOSE_BATCH_MAX_SIZE answer sets, matched against one snapshot
+    # in a single engine pass and saved in one transaction. Diagnoses come
+    # back in request order; nothing is saved if any answer set is invalid.
+    # Matching and building the response take a while for a large batch, so
+    # both run on Starlette's thread pool rather than on the event loop.
+    rule_set = get_rule_store().snapshot
+    try:
+        answer_sets, all_results = await run_in_threadpool(_run_batch, rule_set, body.diagnoses)
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=400)
+
+    session_ids = await async_db.save_diagnoses([
+        (diagnosis.user_notes.strip(), answers, results, rule_set.version)
+        for diagnosis, answers, results in zip(body.diagnoses, answer_sets, all_results)
+    ])
+    return await run_in_threadpool(_batch_response, rule_set.version, session_ids, all_results)
+
+
+@app.get("/stats/diagnosis-cache")
+def diagnosis_cache_stats():
+    return get_diagnosis_cache().stats()
+
+
+# (stats key, metric type, help) of the diagnosis cache counters on /metrics.
+DIAGNOSIS_CACHE_METRICS = (
+    ("size", "gauge", "Answer sets currently cached."),
+    ("hits", "counter", "Diagnoses served from the cache."),
+    ("misses", "counter", "Diagnoses computed because they were not cached."),
+    ("evictions", "counter", "Entries evicted to stay within PCBT_DIAGNOSIS_CACHE_SIZE."),
+    ("invalidations", "counter", "Times the cache was cleared by a rule reload."),
+)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Prometheus text format: hot-path and request latency histograms, and
+    # the diagnosis cache counters.
+    stats = get_diagnosis_cache().stats()
+    cache_metrics = "".join(
+        metrics.render_value(
+            f"pcbt_diagnosis_cache_{key}" + ("_total" if kind == "counter" else ""), kind, help, stats[key],
+        )
+        for key, kind, help in DIAGNOSIS_CACHE_METRICS
+    )
+    return Response(metrics.render_histograms() + cache_metrics, media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/api/sessions")
+async def api_sessions(
+    limit: int = 50,
+    cursor: str | None = None,
+    since: str | None = None,
+    until: str | None = None,
+    symptom: str | None = None,
+):
+    # Newest first; pass next_cursor back as `cursor` for the next page.
+    try:
+        sessions, next_cursor = await async_db.list_sessions_page(
+            limit=limit, cursor=cursor, since=since, until=until, symptom=symptom,
+        )
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=400)
+
+    return {
+        "sessions": [dataclasses.asdict(session) for session in sessions],
+        "next_cursor": next_cursor,
+    }
+
 
-    results = get_results_for_session(session_id)
+@app.get("/api/analytics/{rollup}")
+async def api_analytics(rollup: str, since: str | None = None, until: str | None = None, format: str = "json"):
+    # Per-day session counts: `sessions`, `symptoms`, `symptom-pairs` or
+    # `causes`, between `since` (inclusive) and `until` (exclusive) days.
+    try:
+        for day in (since, until):
+            if day is not None:
+                date.fromisoformat(day)
+        columns, rows, backfill = await async_db.daily_counts(rollup, since, until)
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=400)
+
+    if format == "csv":
+        return Response(
+            analytics.to_csv(columns, rows),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="{rollup}.csv"'},
+        )
+    return {
+        "rollup": rollup,
+        "since": since,
+        "until": until,
+        # Until the backfill completes, older days are undercounted.
+        "backfill": backfill,
+        "rows": [dict(zip(columns, row)) for row in rows],
+    }
+
+
+@app.get("/history", response_class=HTMLResponse)
+async def history(
+    request: Request,
+    cursor: str | None = None,
+    from_date: str | None = None,
+    to_date: str | None = None,
+    symptom: str | None = None,
+):
+    # The filter form submits empty strings for unset fields.
+    filters = {"from_date": from_date or None, "to_date": to_date or None, "symptom": symptom or None}
+    try:
+        since = date.fromisoformat(filters["from_date"]).isoformat() if filters["from_date"] else None
+        # The "to" date is inclusive, so the bound is the start of the next day.
+        until = (date.fromisoformat(filters["to_date"]) + timedelta(days=1)).isoformat() if filters["to_date"] else None
+        sessions, next_cursor = await async_db.list_sessions_page(
+            cursor=cursor or None, since=since, until=until, symptom=filters["symptom"],
+        )
+    except ValueError as exc:
+        return HTMLResponse(f"<h2>Invalid history filter</h2><p>{html.escape(str(exc))}</p>", status_code=400)
+
+    active_filters = {key: value for key, value in filters.items() if value}
+    next_url = None
+    if next_cursor is not None:
+        next_url = "/history?" + urlencode({**active_filters, "cursor": next_cursor})
+
+    return templates.TemplateResponse(
+        "history.html",
+        {
+            "request": request,
+            "sessions": sessions,
+            "filters": filters,
+            "symptoms": [rule.symptom for rule in get_rule_store().snapshot.questions],
+            "is_first_page": not cursor,
+            "first_url": "/history?" + urlencode(active_filters),
+            "next_url": next_url,
+        },
+    )
+
+
+SEARCH_PAGE_SIZE = 20
+
+
+@app.get("/api/search")
+async def api_search(q: str, limit: int = SEARCH_PAGE_SIZE, offset: int = 0, order: str = "rank"):
+    # Best match first, or order=newest. Snippets are HTML-escaped, with
+    # matches in <mark>.
+    try:
+        hits = await async_db.search_sessions(q, limit=limit, offset=offset, order=order)
+    except ValueError as exc:
+        return JSONResponse({"detail": str(exc)}, status_code=400)
+
+    return {
+        "query": q,
+        "results": [
+            {"session": dataclasses.asdict(hit.session), "rank": hit.rank, "snippet": hit.snippet_html()}
+            for hit in hits
+        ],
+    }
+
+
+@app.get("/search", response_class=HTMLResponse)
+async def search(request: Request, q: str = "", order: str = "rank", page: int = 1):
+    page = max(1, page)
+    hits = []
+    if q.strip():
+        try:
+            # One extra hit tells whether there is a next page.
+            hits = await async_db.search_sessions(
+                q, limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE, order=order,
+            )
+        except ValueError as exc:
+            return HTMLResponse(f"<h2>Invalid search</h2><p>{html.escape(str(exc))}</p>", status_code=400)
 
     return templates.TemplateResponse(
-        "results.html",
+        "search.html",
         {
             "request": request,
-            "session": session,
-            "results": results,
+            "query": q,
+            "order": order,
+            "hits": hits[:SEARCH_PAGE_SIZE],
+            "prev_url": "/search?" + urlencode({"q": q, "order": order, "page": page - 1}) if page > 1 else None,
+            "next_url": (
+                "/search?" + urlencode({"q": q, "order": order, "page": page + 1})
+                if len(hits) > SEARCH_PAGE_SIZE else None
+            ),
         },
     )
 
 
+@app.get("/session/{session_id}", response_class=HTMLResponse)
+async def view_session(request: Request, session_id: int):
+    session, results = await async_db.get_session_with_results(session_id)
+    if not session:
+        return HTMLResponse(f"<h2>Session {session_id} not found</h2>", status_code=404)
+
+    # Causes can only be ranked while the rule set that diagnosed the
+    # session is loaded, as stored results don't keep rule weights.
+    ranked_causes = get_rule_store().snapshot.rank_stored_causes(results)
+
+    # TemplateResponse renders the template right away.
+    with timed("render.session_page"):
+        return templates.TemplateResponse(
+            "results.html",
+            {
+                "request": request,
+                "session": session,
+                "results": results,
+                "ranked_causes": ranked_causes,
+            },
+        )
+
+
+def _iter_chunks(data: bytes, chunk_size: int = 64 * 1024):
+    view = memoryview(data)
+    for start in range(0, len(view), chunk_size):
+        yield view[start:start + chunk_size]
+
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
 @app.get("/session/{session_id}/report.pdf")
-def download_pdf(session_id: int):
-    session = get_session(session_id)
+async def download_pdf(request: Request, session_id: int):
+    session, results = await async_db.get_session_with_results(session_id)
     if not session:
         return HTMLResponse(f"Session {session_id} not found", status_code=404)
 
-    results = get_results_for_session(session_id)
-    output_dir = Path("reports_out")
-    pdf_path = generate_pdf_report(session, results, output_dir)
+    # ReportLab is only loaded once a report is actually requested.
+    from app.reports.pdf_report import report_filename
+
+    # A saved session never changes, so the cache key doubles as the ETag
+    # and a matching If-None-Match can be answered without rendering.
+    render_service = get_render_service()
+    key = render_service.cache.key(session, results)
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # Reports already in the cache are served from disk. A miss is built in
+    # memory and streamed when REPORT_STREAMING is on, and cached once sent.
+    pdf_path = render_service.cache.get(session, key)
+    try:
+        if pdf_path is None and settings.REPORT_STREAMING:
+            pdf_bytes = await render_service.render_bytes(session, results)
+        elif pdf_path is None:
+            pdf_path = await render_service.render(session, results)
+    except RenderQueueFull:
+        return HTMLResponse("Too many reports are being generated, try again shortly.",
+                            status_code=503, headers={"Retry-After": "5"})
+
+    if pdf_path is not None:
+        return FileResponse(
+            path=str(pdf_path),
+            media_type="application/pdf",
+            filename=report_filename(session_id),
+            headers=headers,
+        )
 
-    return FileResponse(
-        path=str(pdf_path),
+    headers["Content-Length"] = str(len(pdf_bytes))
+    headers["Content-Disposition"] = f'attachment; filename="{report_filename(session_id)}"'
+    return StreamingResponse(
+        _iter_chunks(pdf_bytes),
         media_type="application/pdf",
-        filename=pdf_path.name,
+        headers=headers,
+        background=BackgroundTask(render_service.cache.put, session, key, pdf_bytes),
+    )
+
+
+@app.get("/reports/export.zip")
+def export_reports(start_id: int, end_id: int):
+    if end_id < start_id or end_id - start_id + 1 > settings.REPORT_EXPORT_MAX_SESSIONS:
+        return HTMLResponse(
+            f"Choose a range of at most {settings.REPORT_EXPORT_MAX_SESSIONS} session ids.",
+            status_code=400,
+        )
+
+    # The generator runs on Starlette's threadpool, rendering on the report
+    # service's process pool and sending each PDF as soon as it is zipped.
+    # Each report takes one of the service's REPORT_MAX_PENDING slots,
+    # waiting for one when web downloads and other exports hold them all.
+    executor = get_render_service().export_executor
+    return StreamingResponse(
+        iter_reports_zip(start_id, end_id, executor),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="reports_{start_id}-{end_id}.zip"'},
     )
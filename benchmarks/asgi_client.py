@@ -0,0 +1,113 @@
+# Minimal in-process ASGI client for load tests: drives the FastAPI app
+# directly (lifespan + HTTP scopes), with no sockets or extra dependencies.
+import asyncio
+from urllib.parse import urlencode, urlsplit
+
+
+class Response:
+    def __init__(self, status: int, headers: list[tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = {key.decode().lower(): value.decode() for key, value in headers}
+        self.body = body
+
+
+class ASGIClient:
+    def __init__(self, app):
+        self.app = app
+        self._lifespan_queue = None
+        self._lifespan_task = None
+
+    async def __aenter__(self):
+        self._lifespan_queue = asyncio.Queue()
+        started = asyncio.get_running_loop().create_future()
+        self._stopped = asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message["type"] == "lifespan.startup.complete":
+                started.set_result(None)
+            elif message["type"] == "lifespan.startup.failed":
+                started.set_exception(RuntimeError(message.get("message", "startup failed")))
+            elif message["type"].startswith("lifespan.shutdown"):
+                self._stopped.set_result(None)
+
+        scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+        self._lifespan_task = asyncio.create_task(self.app(scope, self._lifespan_queue.get, send))
+        await self._lifespan_queue.put({"type": "lifespan.startup"})
+        await started
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._lifespan_queue.put({"type": "lifespan.shutdown"})
+        await self._stopped
+        await self._lifespan_task
+
+    async def request(self, method: str, url: str, body: bytes = b"", headers: dict | None = None) -> Response:
+        parts = urlsplit(url)
+        raw_headers = [(b"host", b"testserver"), (b"content-length", str(len(body)).encode())]
+        raw_headers += [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": method.upper(),
+            "scheme": "http",
+            "path": parts.path,
+            "raw_path": parts.path.encode(),
+            "query_string": parts.query.encode(),
+            "root_path": "",
+            "headers": raw_headers,
+            "server": ("testserver", 80),
+            "client": ("127.0.0.1", 12345),
+            "state": {},
+        }
+
+        request_sent = False
+        finished = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        status = None
+        response_headers = []
+        chunks = []
+
+        async def send(message):
+            nonlocal status, response_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                response_headers = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+                if not message.get("more_body", False):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        finished.set()
+        return Response(status, response_headers, b"".join(chunks))
+
+    async def get(self, url: str, headers: dict | None = None) -> Response:
+        return await self.request("GET", url, headers=headers)
+
+    async def post_form(self, url: str, data: dict) -> Response:
+        return await self.request(
+            "POST",
+            url,
+            body=urlencode(data).encode(),
+            headers={"content-type": "application/x-www-form-urlencoded"},
+        )
+
+    async def post_json(self, url: str, body: bytes) -> Response:
+        return await self.request("POST", url, body=body, headers={"content-type": "application/json"})
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
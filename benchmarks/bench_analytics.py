@@ -0,0 +1,165 @@
+# Per-day symptom / pair / cause counts: read from the rollup tables versus
+# recomputed by loading and parsing every answers_json and rule's causes in
+# Python. Also the cost the rollups add to each save, and backfill speed.
+#
+#   python -m benchmarks.bench_analytics [--sessions 200000]
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+DAYS = 90
+WRITES = 4096
+
+
+def populate(sessions: int) -> None:
+    from app.data import db
+    from app.rules.engine import DEFAULT_ENGINE
+    from app.rules.store import get_rule_store
+
+    db.init_db()
+    rule_set = get_rule_store().snapshot
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    rng = random.Random(7)
+    batch_size = 10_000
+    for start in range(0, sessions, batch_size):
+        diagnoses = []
+        for _ in range(min(batch_size, sessions - start)):
+            answers = {symptom: rng.random() < 0.4 for symptom in symptoms}
+            diagnoses.append(("benchmark", answers, DEFAULT_ENGINE.run(answers, rule_set), rule_set.version))
+        db.save_diagnoses(diagnoses)
+
+    # Spread the sessions over DAYS days, as if saved over a quarter.
+    with db.get_connection() as conn:
+        conn.execute(
+            "UPDATE sessions SET created_at = date('2025-01-01', '+' || (id % ?) || ' days') || substr(created_at, 11)",
+            (DAYS,),
+        )
+
+
+def reset_rollups() -> None:
+    # Empty the rollups and rewind the watermark, as if they were new.
+    from app.data.db import get_connection
+
+    with get_connection() as conn:
+        for table in ("daily_sessions", "daily_symptoms", "daily_symptom_pairs", "daily_causes"):
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("UPDATE rollup_backfill SET watermark = 0, end_id = (SELECT MAX(id) FROM sessions)")
+
+
+def recompute() -> dict:
+    # The baseline: what a dashboard had to do without rollups.
+    from app.data.db import get_connection
+
+    counts = {"symptoms": Counter(), "symptom-pairs": Counter(), "causes": Counter()}
+    with get_connection() as conn:
+        for created_at, answers_json in conn.execute("SELECT created_at, answers_json FROM sessions"):
+            day = created_at[:10]
+            yes = sorted(symptom for symptom, value in json.loads(answers_json).items() if value)
+            for position, symptom in enumerate(yes):
+                counts["symptoms"][day, symptom] += 1
+                for other in yes[position + 1:]:
+                    counts["symptom-pairs"][day, symptom, other] += 1
+
+        causes_by_session: dict[int, set] = {}
+        rows = conn.execute(
+            """
+            SELECT s.id, s.created_at, ru.probable_causes_json
+            FROM results r
+            JOIN sessions s ON s.id = r.session_id
+            JOIN rules ru ON ru.rule_set_version = r.rule_set_version AND ru.rule_id = r.rule_id
+            """
+        )
+        for session_id, created_at, causes_json in rows:
+            for cause in json.loads(causes_json):
+                if cause not in causes_by_session.setdefault(session_id, set()):
+                    causes_by_session[session_id].add(cause)
+                    counts["causes"][created_at[:10], cause] += 1
+    return counts
+
+
+def from_rollups() -> dict:
+    from app.data.analytics import daily_counts
+
+    return {rollup: daily_counts(rollup)[1] for rollup in ("symptoms", "symptom-pairs", "causes")}
+
+
+def time_writes(rollups: bool, batch_size: int) -> float:
+    # Diagnoses/sec saved batch_size per transaction: 1 as the web app does
+    # without group commit, more as the group-commit writer batches them.
+    from app.data import db
+    from app.rules.engine import DEFAULT_ENGINE
+    from app.rules.store import get_rule_store
+
+    rule_set = get_rule_store().snapshot
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    rng = random.Random(11)
+    update_rollups = db.update_rollups
+    if not rollups:
+        db.update_rollups = lambda *args, **kwargs: None
+    try:
+        start = time.perf_counter()
+        for _ in range(WRITES // batch_size):
+            diagnoses = []
+            for _ in range(batch_size):
+                answers = {symptom: rng.random() < 0.4 for symptom in symptoms}
+                diagnoses.append(("benchmark", answers, DEFAULT_ENGINE.run(answers, rule_set), rule_set.version))
+            db.save_diagnoses(diagnoses)
+        return WRITES / (time.perf_counter() - start)
+    finally:
+        db.update_rollups = update_rollups
+
+
+def run(sessions: int) -> None:
+    from app.data.analytics import backfill_rollups
+
+    start = time.perf_counter()
+    populate(sessions)
+    print(f"{sessions:,} sessions over {DAYS} days created in {time.perf_counter() - start:.1f}s\n")
+
+    # Dates were rewritten after the rollups counted them; count afresh.
+    reset_rollups()
+    start = time.perf_counter()
+    backfill_rollups()
+    backfill_s = time.perf_counter() - start
+    print(f"backfill           : {backfill_s:8.2f} s   ({sessions / backfill_s:,.0f} sessions/sec)")
+
+    start = time.perf_counter()
+    expected = recompute()
+    recompute_s = time.perf_counter() - start
+    start = time.perf_counter()
+    counted = from_rollups()
+    rollups_s = time.perf_counter() - start
+    for rollup, rows in counted.items():
+        if {tuple(row[:-1]): row[-1] for row in rows} != dict(expected[rollup]):
+            raise SystemExit(f"{rollup}: rollups disagree with the recomputed counts")
+    print(f"dashboard, parse   : {recompute_s * 1000:8.1f} ms  (load + json.loads every session and cause)")
+    print(f"dashboard, rollups : {rollups_s * 1000:8.1f} ms  ({recompute_s / rollups_s:,.0f}x faster)\n")
+
+    print(f"{'saves per commit':>16} | {'no rollups (/sec)':>17} | {'rollups (/sec)':>14} | overhead")
+    for batch_size in (1, 64):
+        without = time_writes(rollups=False, batch_size=batch_size)
+        with_rollups = time_writes(rollups=True, batch_size=batch_size)
+        print(
+            f"{batch_size:>16} | {without:17,.0f} | {with_rollups:14,.0f} "
+            f"| {(without / with_rollups - 1) * 100:7.0f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.settings is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "analytics.sqlite3")
+        run(args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+# Sessions/sec for the diagnose + view request flow (save, get_session,
+# get_results_for_session): with a new sqlite3.connect() per call as before,
+# with the connection pool, and with the pool plus group-commit writer.
+#
+#   python -m benchmarks.bench_db [--threads 8] [--sessions 2000]
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from app.data import db, queries, writer
+from app.rules.engine import DEFAULT_ENGINE, DiagnosticEngine
+
+SYMPTOMS = ("no_power", "powers_on_no_display", "random_shutdowns", "power_cycles")
+
+
+def one_request(engine: DiagnosticEngine, rng: random.Random, group_commit: bool) -> None:
+    answers = {symptom: rng.random() < 0.4 for symptom in SYMPTOMS}
+    results = engine.run(answers)
+    if group_commit:
+        session_id = writer.get_writer().submit("benchmark", answers, results).result()
+    else:
+        session_id = db.save_session(user_notes="benchmark", answers=answers)
+        db.save_results(session_id=session_id, results=results)
+    queries.get_session(session_id)
+    queries.get_results_for_session(session_id)
+
+
+def run(threads: int, sessions: int, group_commit: bool = False) -> tuple[float, int]:
+    engine = DEFAULT_ENGINE
+    errors = 0
+
+    def worker(seed: int) -> int:
+        try:
+            one_request(engine, random.Random(seed), group_commit)
+            return 0
+        except sqlite3.OperationalError:
+            return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        errors = sum(pool.map(worker, range(sessions)))
+    elapsed = time.perf_counter() - start
+    return sessions / elapsed, errors
+
+
+def use_database(path: Path, pooled: bool) -> None:
+    db.close_pool()
+    db.DB_PATH = path
+    if pooled:
+        db.get_connection = POOLED_GET_CONNECTION
+    else:
+        # The pre-pool behaviour: a fresh connection, default journal mode.
+        db.get_connection = lambda: sqlite3.connect(path)
+    queries.get_connection = db.get_connection
+    db.init_db()
+
+
+POOLED_GET_CONNECTION = db.get_connection
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--sessions", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        use_database(Path(tmp) / "unpooled.sqlite3", pooled=False)
+        before, before_errors = run(args.threads, args.sessions)
+
+        use_database(Path(tmp) / "pooled.sqlite3", pooled=True)
+        after, after_errors = run(args.threads, args.sessions)
+
+        use_database(Path(tmp) / "group_commit.sqlite3", pooled=True)
+        grouped, grouped_errors = run(args.threads, args.sessions, group_commit=True)
+        writer.close_writer()
+        db.close_pool()
+
+    print(f"{args.sessions} sessions, {args.threads} threads")
+    print(f"  connect per call : {before:8.1f} sessions/sec ({before_errors} lock errors)")
+    print(f"  connection pool  : {after:8.1f} sessions/sec ({after_errors} lock errors)")
+    print(f"  + group commit   : {grouped:8.1f} sessions/sec ({grouped_errors} lock errors)")
+
+
+if __name__ == "__main__":
+    main()
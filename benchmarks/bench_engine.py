@@ -0,0 +1,112 @@
+# Compares the original linear-scan engine with the compiled, indexed one,
+# and per-session run() with the bitset-based run_batch().
+#
+#   python -m benchmarks.bench_engine
+import random
+import time
+
+from app.rules.engine import CompiledRuleSet, DiagnosticEngine
+
+RULE_COUNTS = (10, 1_000, 100_000)
+YES_ANSWERS = 5
+RUNS = 200
+BATCH_SIZE = 10_000
+
+
+class LinearDiagnosticEngine:
+    # The engine as it was before rule compilation, kept here as the baseline.
+    def __init__(self, rules: list[dict]):
+        self.rules = rules
+        self.results = []
+
+    def run(self, answers: dict):
+        self.results.clear()
+
+        for rule in self.rules:
+            symptom = rule["symptom"]
+            if answers.get(symptom):
+                self.results.append(rule)
+
+        return self.results
+
+
+def make_rules(count: int) -> list[dict]:
+    # Several rules per symptom, like a knowledge base that grows by
+    # adding causes for existing questions.
+    symptom_count = max(1, count // 10)
+    return [
+        {
+            "id": f"rule_{i}",
+            "symptom": f"symptom_{i % symptom_count}",
+            "question": f"Question {i % symptom_count}?",
+            "probable_causes": [f"Cause {i}"],
+            "next_tests": [f"Test {i}"],
+        }
+        for i in range(count)
+    ]
+
+
+def make_answers(rules: list[dict], rng: random.Random) -> dict:
+    symptoms = sorted({rule["symptom"] for rule in rules})
+    yes = set(rng.sample(symptoms, min(YES_ANSWERS, len(symptoms))))
+    return {symptom: symptom in yes for symptom in symptoms}
+
+
+def time_per_run(engine, answer_sets: list[dict]) -> float:
+    start = time.perf_counter()
+    for answers in answer_sets:
+        engine.run(answers)
+    return (time.perf_counter() - start) / len(answer_sets)
+
+
+def bench_batch(rng: random.Random):
+    rules = make_rules(1_000)
+    symptoms = sorted({rule["symptom"] for rule in rules})
+    for i in range(200):
+        a, b, c = rng.sample(symptoms, 3)
+        rules.append({
+            "symptom": f"compound_{i}",
+            "condition": {"all": [a, {"any": [b, {"not": c}]}]},
+            "probable_causes": [f"Compound cause {i}"],
+            "next_tests": [f"Compound test {i}"],
+        })
+
+    engine = DiagnosticEngine(CompiledRuleSet(rules))
+    answer_sets = [make_answers(rules, rng) for _ in range(BATCH_SIZE)]
+
+    start = time.perf_counter()
+    single = [engine.run(answers) for answers in answer_sets]
+    single_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = engine.run_batch(answer_sets)
+    batch_s = time.perf_counter() - start
+
+    assert single == batch
+    print(f"\n{BATCH_SIZE} sessions x {len(rules)} rules: run() {single_s:.2f}s, run_batch() {batch_s:.2f}s "
+          f"({single_s / batch_s:.1f}x)")
+
+
+def main():
+    rng = random.Random(42)
+
+    print(f"{'rules':>8} | {'linear (us)':>12} | {'indexed (us)':>12} | {'speedup':>8}")
+    for count in RULE_COUNTS:
+        rules = make_rules(count)
+        answer_sets = [make_answers(rules, rng) for _ in range(RUNS)]
+
+        linear = LinearDiagnosticEngine(rules)
+        indexed = DiagnosticEngine(CompiledRuleSet(rules))
+
+        for answers in answer_sets[:5]:
+            assert [r["symptom"] for r in linear.run(answers)] == [r.symptom for r in indexed.run(answers)]
+
+        linear_us = time_per_run(linear, answer_sets) * 1e6
+        indexed_us = time_per_run(indexed, answer_sets) * 1e6
+        print(f"{count:>8} | {linear_us:>12.1f} | {indexed_us:>12.1f} | {linear_us / indexed_us:>7.1f}x")
+
+    bench_batch(rng)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# Time per history page at increasing depth: keyset pagination
+# (list_sessions_page) versus the same query with LIMIT/OFFSET, with and
+# without a symptom filter.
+#
+#   python -m benchmarks.bench_history [--sessions 1000000]
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+PAGE_SIZE = 50
+DEPTHS = (0, 1_000, 10_000, 100_000)
+SYMPTOMS = ("no_power", "powers_on_no_display", "random_shutdowns", "power_cycles")
+RUNS = 5
+
+
+def populate(sessions: int) -> None:
+    from app.data.db import init_db, save_diagnoses
+
+    init_db()
+    rng = random.Random(7)
+    batch_size = 10_000
+    for start in range(0, sessions, batch_size):
+        save_diagnoses([
+            ("benchmark", {symptom: rng.random() < 0.3 for symptom in SYMPTOMS}, [], None)
+            for _ in range(min(batch_size, sessions - start))
+        ])
+
+
+def offset_page(depth: int, symptom: str | None) -> list:
+    # The OFFSET equivalent of list_sessions_page, as the baseline.
+    from app.data.db import get_connection
+    from app.data.models import session_row_factory
+
+    with get_connection() as conn:
+        cur = conn.cursor()
+        cur.row_factory = session_row_factory
+        if symptom is None:
+            return cur.execute(
+                """
+                SELECT id, created_at, user_notes, answers_json, rule_set_version FROM sessions
+                ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?
+                """,
+                (PAGE_SIZE, depth),
+            ).fetchall()
+        return cur.execute(
+            """
+            SELECT s.id, s.created_at, s.user_notes, s.answers_json, s.rule_set_version
+            FROM session_symptoms ss JOIN sessions s ON s.id = ss.session_id
+            WHERE ss.symptom = ?
+            ORDER BY ss.created_at DESC, ss.session_id DESC LIMIT ? OFFSET ?
+            """,
+            (symptom, PAGE_SIZE, depth),
+        ).fetchall()
+
+
+def cursor_at(depth: int, symptom: str | None) -> str | None:
+    # The cursor a client would hold after paging down to `depth`, or None
+    # at depth 0. Raises IndexError if there are fewer rows than `depth`.
+    from app.data.queries import encode_cursor
+
+    if depth == 0:
+        return None
+    return encode_cursor(offset_page(depth - 1, symptom)[0])
+
+
+def best_time(fn) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sessions: int) -> None:
+    from app.data.queries import list_sessions_page
+
+    start = time.perf_counter()
+    populate(sessions)
+    print(f"{sessions:,} sessions created in {time.perf_counter() - start:.1f}s\n")
+
+    print(f"{'filter':>14} | {'depth':>8} | {'OFFSET (ms)':>11} | {'keyset (ms)':>11}")
+    for symptom in (None, "power_cycles"):
+        for depth in DEPTHS:
+            try:
+                cursor = cursor_at(depth, symptom)
+            except IndexError:
+                continue
+            offset_s = best_time(lambda: offset_page(depth, symptom))
+            keyset_s = best_time(lambda: list_sessions_page(limit=PAGE_SIZE, cursor=cursor, symptom=symptom))
+            print(f"{symptom or '(none)':>14} | {depth:>8,} | {offset_s * 1000:11.2f} | {keyset_s * 1000:11.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.settings is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "history.sqlite3")
+        run(args.sessions)
+
+
+if __name__ == "__main__":
+    main()
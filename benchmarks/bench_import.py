@@ -0,0 +1,86 @@
+# Import time of the CLI and web entry points, measured with
+# `python -X importtime` in fresh interpreters. Also checks that ReportLab
+# (and Pillow) stay out of the import path: they should only load once a
+# report is generated.
+#
+#   python -m benchmarks.bench_import
+#   python -m benchmarks.bench_import --check   # exit 1 on a regression, for CI
+import argparse
+import statistics
+import subprocess
+import sys
+
+from app import settings
+
+RUNS = 5
+TOP_MODULES = 8
+
+# Median cumulative import time budgets, in milliseconds. Generous, so
+# only a new heavy import (not machine noise) trips them.
+BUDGETS_MS = {
+    "app.cli": 150,
+    "app.web.web_app": 1500,
+}
+
+# Modules that must not be imported just by loading an entry point.
+DEFERRED_MODULES = ("reportlab", "PIL")
+
+
+def import_times(module: str) -> dict[str, tuple[int, int]]:
+    # {module name: (self us, cumulative us)} for one fresh import of `module`.
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=settings.PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+
+    times = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def bench(module: str) -> list[str]:
+    runs = [import_times(module) for _ in range(RUNS)]
+    median_ms = statistics.median(times[module][1] for times in runs) / 1000
+
+    print(f"\n{module}: {median_ms:.1f} ms (median of {RUNS}, budget {BUDGETS_MS[module]} ms)")
+    heaviest = sorted(runs[-1].items(), key=lambda item: -item[1][0])[:TOP_MODULES]
+    for name, (self_us, cumulative_us) in heaviest:
+        print(f"  {name:<40} self {self_us / 1000:7.1f} ms   cumulative {cumulative_us / 1000:7.1f} ms")
+
+    problems = []
+    if median_ms > BUDGETS_MS[module]:
+        problems.append(f"{module} took {median_ms:.1f} ms to import (budget {BUDGETS_MS[module]} ms)")
+    deferred = sorted(
+        name for name in runs[-1]
+        if name.split(".")[0] in DEFERRED_MODULES
+    )
+    if deferred:
+        problems.append(f"{module} imports {', '.join(deferred[:3])}{'...' if len(deferred) > 3 else ''} at load time")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.bench_import")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a budget is exceeded or a deferred module is imported")
+    args = parser.parse_args(argv)
+
+    problems = []
+    for module in BUDGETS_MS:
+        problems.extend(bench(module))
+
+    if problems:
+        print("\nRegressions:")
+        for problem in problems:
+            print(f"  {problem}")
+    return 1 if args.check and problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
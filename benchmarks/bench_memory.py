@@ -0,0 +1,111 @@
+# Memory and load time for holding 1M stored results: rows decoded into
+# fresh dicts (the old queries.py behaviour) versus DiagnosisResult records
+# built by the row factory, which shares one record per stored rule.
+#
+#   python -m benchmarks.bench_memory
+import gc
+import json
+import sqlite3
+import time
+import tracemalloc
+
+from app.data.models import _diagnosis_result, result_row_factory
+from app.rules.engine import CompiledRuleSet
+from app.rules.knowledge_base import DIAGNOSTIC_RULES
+
+RESULT_COUNT = 1_000_000
+RULE_VERSIONS = 20
+
+SELECT_RESULTS = """
+    SELECT ru.rule_set_version, ru.rule_id, ru.symptom, ru.probable_causes_json, ru.next_tests_json
+    FROM results r
+    JOIN rules ru ON ru.rule_set_version = r.rule_set_version AND ru.rule_id = r.rule_id
+    ORDER BY r.id
+"""
+
+
+def dict_from_row(row) -> dict:
+    # The old _result_from_row, kept here as the baseline.
+    version, rule_id, symptom, causes_json, tests_json = row
+    return {
+        "rule_set_version": version,
+        "rule_id": rule_id,
+        "symptom": symptom,
+        "probable_causes": json.loads(causes_json),
+        "next_tests": json.loads(tests_json),
+    }
+
+
+def make_db() -> sqlite3.Connection:
+    # The results/rules tables from db.py, with RESULT_COUNT results spread
+    # over the rules of RULE_VERSIONS rule-set versions.
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE rules (
+            rule_set_version TEXT, rule_id TEXT, symptom TEXT,
+            probable_causes_json TEXT, next_tests_json TEXT,
+            PRIMARY KEY (rule_set_version, rule_id)
+        )
+    """)
+    conn.execute("CREATE TABLE results (id INTEGER PRIMARY KEY, session_id INTEGER, rule_set_version TEXT, rule_id TEXT)")
+
+    rules = CompiledRuleSet(DIAGNOSTIC_RULES).rules
+    keys = []
+    for v in range(RULE_VERSIONS):
+        version = f"version{v:02d}"
+        for rule in rules:
+            conn.execute(
+                "INSERT INTO rules VALUES (?, ?, ?, ?, ?)",
+                (version, rule.rule_id, rule.symptom, json.dumps(rule.probable_causes), json.dumps(rule.next_tests)),
+            )
+            keys.append((version, rule.rule_id))
+
+    conn.executemany(
+        "INSERT INTO results (session_id, rule_set_version, rule_id) VALUES (?, ?, ?)",
+        ((i // 5, *keys[i % len(keys)]) for i in range(RESULT_COUNT)),
+    )
+    conn.commit()
+    return conn
+
+
+def load(conn: sqlite3.Connection, row_factory) -> list:
+    _diagnosis_result.cache_clear()
+    cur = conn.cursor()
+    cur.row_factory = row_factory
+    results = cur.execute(SELECT_RESULTS).fetchall()
+    assert len(results) == RESULT_COUNT
+    return results
+
+
+def measure(conn: sqlite3.Connection, row_factory) -> tuple[float, float]:
+    # (seconds to load, MiB held) for all results loaded with `row_factory`.
+    # Timed and traced in separate runs, since tracemalloc slows allocation.
+    gc.collect()
+    start = time.perf_counter()
+    load(conn, row_factory)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    tracemalloc.start()
+    results = load(conn, row_factory)
+    held, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del results
+    return elapsed, held / 2**20
+
+
+def main():
+    conn = make_db()
+    print(f"{RESULT_COUNT:,} results over {RULE_VERSIONS} rule-set versions:")
+    print(f"{'records':>16} | {'load (s)':>9} | {'held (MiB)':>10} | {'bytes/result':>12}")
+    for label, row_factory in (
+        ("dicts", lambda cursor, row: dict_from_row(row)),
+        ("DiagnosisResult", result_row_factory),
+    ):
+        elapsed, held_mib = measure(conn, row_factory)
+        print(f"{label:>16} | {elapsed:9.2f} | {held_mib:10.1f} | {held_mib * 2**20 / RESULT_COUNT:12.0f}")
+
+
+if __name__ == "__main__":
+    main()
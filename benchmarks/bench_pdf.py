@@ -0,0 +1,68 @@
+# Per-report render time and allocations for sessions with 5 and 500
+# results: building a fresh ReportTemplate for every report (the old
+# behaviour) versus reusing the shared one.
+#
+#   python -m benchmarks.bench_pdf
+import io
+import time
+import tracemalloc
+
+from app.data.models import DiagnosisResult, Session
+from app.reports.pdf_report import ReportTemplate, get_report_template, write_pdf_report
+from app.rules.engine import CompiledRuleSet
+from app.rules.knowledge_base import DIAGNOSTIC_RULES
+
+RESULT_COUNTS = (5, 500)
+
+
+def make_report(result_count: int) -> tuple[Session, list[DiagnosisResult]]:
+    rule_set = CompiledRuleSet(DIAGNOSTIC_RULES)
+    session = Session(
+        id=1,
+        created_at="2025-01-01T00:00:00",
+        user_notes="Ryzen 5600X, B550, RTX 3070. Powers on then shuts off.",
+        answers={rule.symptom: True for rule in rule_set.questions},
+    )
+    stored = [
+        DiagnosisResult(rule.rule_set_version, rule.rule_id, rule.symptom, rule.probable_causes, rule.next_tests)
+        for rule in rule_set.rules
+    ]
+    results = [stored[i % len(stored)] for i in range(result_count)]
+    return session, results
+
+
+def measure(session: Session, results: list[DiagnosisResult], fresh_template: bool, runs: int) -> tuple[float, int, int]:
+    def render():
+        template = ReportTemplate() if fresh_template else get_report_template()
+        write_pdf_report(session, results, io.BytesIO(), template=template)
+
+    render()  # warm up imports and the shared template
+
+    start = time.perf_counter()
+    for _ in range(runs):
+        render()
+    per_report = (time.perf_counter() - start) / runs
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    render()
+    after = tracemalloc.take_snapshot()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    blocks = sum(stat.count_diff for stat in after.compare_to(before, "filename") if stat.count_diff > 0)
+
+    return per_report, peak, blocks
+
+
+def main():
+    print(f"{'results':>8} | {'template':>8} | {'ms/report':>10} | {'peak KiB':>9} | {'new blocks':>10}")
+    for count in RESULT_COUNTS:
+        session, results = make_report(count)
+        runs = 50 if count < 100 else 5
+        for label, fresh in (("fresh", True), ("shared", False)):
+            per_report, peak, blocks = measure(session, results, fresh, runs)
+            print(f"{count:>8} | {label:>8} | {per_report * 1000:>10.2f} | {peak / 1024:>9.0f} | {blocks:>10}")
+
+
+if __name__ == "__main__":
+    main()
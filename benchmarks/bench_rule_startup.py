@@ -0,0 +1,75 @@
+# Worker startup time with a rules directory of 1k / 10k / 50k rules:
+# parsing, validating and compiling the JSON on every start (the old
+# behaviour) versus loading the compiled rule cache. Each start is a fresh
+# interpreter, like a newly scaled-out worker.
+#
+#   python -m benchmarks.bench_rule_startup
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app import settings
+from benchmarks.bench_engine import make_rules
+
+RULE_COUNTS = (1_000, 10_000, 50_000)
+STARTS = 5
+
+# Time only what a worker does for rules at startup, not interpreter boot.
+WORKER = """
+import time
+start = time.perf_counter()
+from app.rules.store import get_rule_store
+get_rule_store()
+print(time.perf_counter() - start)
+"""
+
+
+def time_start(rules_dir: Path, cache_dir: Path, use_cache: bool) -> tuple[float, float]:
+    env = dict(
+        os.environ,
+        PCBT_RULES_DIR=str(rules_dir),
+        PCBT_RULES_CACHE="1" if use_cache else "0",
+        PCBT_RULES_CACHE_DIR=str(cache_dir),
+    )
+    start = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", WORKER],
+        env=env,
+        cwd=settings.PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return time.perf_counter() - start, float(output)
+
+
+def bench(rule_count: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp:
+        rules_dir = Path(tmp) / "rules"
+        cache_dir = Path(tmp) / "cache"
+        rules_dir.mkdir()
+        (rules_dir / "rules.json").write_text(json.dumps(make_rules(rule_count)))
+
+        # First start with the cache enabled compiles and writes the entry.
+        time_start(rules_dir, cache_dir, use_cache=True)
+
+        print(f"\n{rule_count:,} rules ({STARTS} starts each, median):")
+        for label, use_cache in (("parse + validate + compile", False), ("compiled cache", True)):
+            runs = [time_start(rules_dir, cache_dir, use_cache) for _ in range(STARTS)]
+            process = statistics.median(total for total, _ in runs)
+            rules = statistics.median(load for _, load in runs)
+            print(f"  {label:<28} rules {rules * 1000:8.1f} ms   process {process * 1000:8.1f} ms")
+
+
+def main():
+    for rule_count in RULE_COUNTS:
+        bench(rule_count)
+
+
+if __name__ == "__main__":
+    main()
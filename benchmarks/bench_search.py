@@ -0,0 +1,146 @@
+# Time to find 20 sessions whose notes mention a part: a newest-first
+# scan with LIKE '%...%' versus search_sessions (FTS5) newest first,
+# ranked by bm25 within the default rank window, and with every match
+# ranked, for rare and common parts, words and phrases.
+#
+#   python -m benchmarks.bench_search [--sessions 2000000]
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+LIMIT = 20
+RUNS = 5
+
+# ~400 part names, mentioned with a Zipf-like skew: a few parts show up in
+# many notes and most are rare, as in real builds.
+PARTS = (
+    [f"RTX {n}" for n in (2060, 2070, 2080, 3050, 3060, 3070, 3080, 3090, 4060, 4070, 4080, 4090)]
+    + [f"GTX {n}" for n in (960, 970, 980, 1050, 1060, 1070, 1080, 1650, 1660)]
+    + [f"RX {n}" for n in (470, 480, 570, 580, 5600, 5700, 6600, 6700, 6800, 6900, 7600, 7800, 7900)]
+    + [f"Ryzen {n}" for n in range(1200, 8000, 100)]
+    + [f"i{tier}-{gen}{sku}K" for tier in (5, 7, 9) for gen in range(8, 15) for sku in (400, 600, 700, 900)]
+    + [f"{watts}W" for watts in range(450, 1650, 50)]
+    + [f"{chipset} {model}" for chipset in ("B450", "B550", "B650", "X570", "X670", "Z690", "Z790")
+       for model in ("Tomahawk", "Aorus", "Hero", "Strix", "Steel Legend")]
+)
+PART_WEIGHTS = [1 / (rank + 1) for rank in range(len(PARTS))]
+# One session in RARE_EVERY mentions a part nobody else has.
+RARE_PART = "RTX 5090"
+RARE_EVERY = 100_000
+FILLER = (
+    "new build", "no post", "fans spin", "black screen", "after bios update", "reseated ram",
+    "tried another psu", "smell of burning", "shuts off under load", "works in safe mode",
+)
+# (label, FTS query, LIKE patterns that must all match)
+SEARCHES = (
+    ("rare part", f'"{RARE_PART}"', (f"%{RARE_PART}%",)),
+    ("uncommon part", '"Z790 Hero"', ("%Z790 Hero%",)),
+    ("common part", '"RTX 3060"', ("%RTX 3060%",)),
+    ("common word", "build", ("%build%",)),
+    ("two words", "RTX 850W", ("%RTX%", "%850W%")),
+    ("no match", "Threadripper", ("%Threadripper%",)),
+)
+
+
+def random_note(rng: random.Random, n: int) -> str:
+    words = rng.choices(PARTS, PART_WEIGHTS, k=rng.randint(0, 3)) + rng.sample(FILLER, rng.randint(1, 3))
+    if n % RARE_EVERY == 0:
+        words.append(RARE_PART)
+    rng.shuffle(words)
+    return ", ".join(words)
+
+
+def populate(sessions: int) -> None:
+    from app.data.db import get_connection, init_db
+
+    # Straight into sessions; the FTS triggers index each row as it lands.
+    init_db()
+    rng = random.Random(7)
+    batch_size = 50_000
+    for start in range(0, sessions, batch_size):
+        with get_connection() as conn:
+            conn.executemany(
+                "INSERT INTO sessions (created_at, user_notes, answers_json) VALUES (?, ?, '{}')",
+                [
+                    (f"2025-01-01T00:00:{n:09d}", random_note(rng, n))
+                    for n in range(start, min(start + batch_size, sessions))
+                ],
+            )
+
+
+def like_search(patterns: tuple[str, ...]) -> list:
+    # The baseline: newest first, the table scanned until LIMIT rows match.
+    from app.data.db import get_connection
+
+    with get_connection() as conn:
+        return conn.execute(
+            f"""
+            SELECT id, created_at, user_notes FROM sessions
+            WHERE {" AND ".join(["user_notes LIKE ?"] * len(patterns))}
+            ORDER BY id DESC LIMIT ?
+            """,
+            (*patterns, LIMIT),
+        ).fetchall()
+
+
+def count_matches(query: str) -> int:
+    from app.data.db import get_connection
+    from app.data.queries import fts_query
+
+    with get_connection() as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM sessions_fts WHERE sessions_fts MATCH ?", (fts_query(query),),
+        ).fetchone()[0]
+
+
+def best_time(fn) -> float:
+    times = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run(sessions: int) -> None:
+    from app import settings
+    from app.data.queries import search_sessions
+
+    start = time.perf_counter()
+    populate(sessions)
+    print(f"{sessions:,} sessions created and indexed in {time.perf_counter() - start:.1f}s\n")
+
+    window = settings.SEARCH_RANK_WINDOW
+    print(
+        f"{'search':>13} | {'matches':>9} | {'LIKE (ms)':>9} | {'newest (ms)':>11} "
+        f"| {'ranked (ms)':>11} | {'rank all (ms)':>13}"
+    )
+    for label, query, patterns in SEARCHES:
+        like_s = best_time(lambda: like_search(patterns))
+        newest_s = best_time(lambda: search_sessions(query, limit=LIMIT, order="newest"))
+        ranked_s = best_time(lambda: search_sessions(query, limit=LIMIT))
+        settings.SEARCH_RANK_WINDOW = 0
+        rank_all_s = best_time(lambda: search_sessions(query, limit=LIMIT))
+        settings.SEARCH_RANK_WINDOW = window
+        print(
+            f"{label:>13} | {count_matches(query):>9,} | {like_s * 1000:9.2f} | {newest_s * 1000:11.2f} "
+            f"| {ranked_s * 1000:11.2f} | {rank_all_s * 1000:13.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.settings is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "search.sqlite3")
+        run(args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+# Bulk export / import of sessions: export speed, file size and peak Python
+# memory per format at two table sizes (memory should stay flat as the table
+# grows), and import speed with indexes deferred versus kept up to date.
+#
+#   python -m benchmarks.bench_transfer [--sessions 200000]
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+NOTES = ("RTX 3060, no post", "850W PSU, shuts off under load", "new build, black screen", None, "")
+SUFFIXES = {"jsonl": ".jsonl.gz", "columnar": ".pcbtcol"}
+
+
+def use_database(path: Path) -> None:
+    # Point the pool at another file; settings are only read at import.
+    from app.data import db
+
+    db.close_pool()
+    db.DB_PATH = path
+    db.init_db()
+
+
+def populate(sessions: int) -> None:
+    from app.data import db
+    from app.rules.engine import DEFAULT_ENGINE
+    from app.rules.store import get_rule_store
+
+    rule_set = get_rule_store().snapshot
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    rng = random.Random(7)
+    batch_size = 10_000
+    for start in range(0, sessions, batch_size):
+        diagnoses = []
+        for _ in range(min(batch_size, sessions - start)):
+            answers = {symptom: rng.random() < 0.4 for symptom in symptoms}
+            diagnoses.append((rng.choice(NOTES), answers, DEFAULT_ENGINE.run(answers, rule_set), rule_set.version))
+        db.save_diagnoses(diagnoses)
+
+
+def time_export(path: Path, format: str) -> tuple[float, int]:
+    # (seconds, peak bytes allocated by Python while exporting). Memory is
+    # measured on a second run, as tracing slows the export down.
+    from app.data.transfer import export_sessions
+
+    start = time.perf_counter()
+    export_sessions(path, format)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    export_sessions(path, format)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def time_import(tmp: Path, export: Path, name: str, defer_indexes: bool) -> float:
+    from app.data.transfer import import_sessions
+
+    use_database(tmp / f"{name}.sqlite3")
+    start = time.perf_counter()
+    import_sessions(export, defer_indexes=defer_indexes)
+    return time.perf_counter() - start
+
+
+def run(tmp: Path, sessions: int) -> None:
+    sizes = (sessions // 4, sessions)
+    exports = {}
+    print(f"{'sessions':>9} | {'format':>8} | {'export (s)':>10} | {'sessions/sec':>12} | {'file (MB)':>9} | peak memory")
+    for count in sizes:
+        use_database(tmp / f"source_{count}.sqlite3")
+        populate(count)
+        for format, suffix in SUFFIXES.items():
+            path = tmp / f"sessions_{count}{suffix}"
+            elapsed, peak = time_export(path, format)
+            exports[format] = path
+            print(
+                f"{count:>9,} | {format:>8} | {elapsed:10.2f} | {count / elapsed:12,.0f} "
+                f"| {path.stat().st_size / 1e6:9.1f} | {peak / 1e6:8.1f} MB"
+            )
+
+    print(f"\nimport of {sessions:,} sessions, including the rollup backfill")
+    print(f"{'format':>8} | {'deferred indexes (s)':>20} | {'indexes kept (s)':>16}")
+    for format, path in exports.items():
+        deferred = time_import(tmp, path, f"deferred_{format}", defer_indexes=True)
+        kept = time_import(tmp, path, f"kept_{format}", defer_indexes=False)
+        print(f"{format:>8} | {deferred:20.2f} | {kept:16.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=200_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.settings is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "transfer.sqlite3")
+        run(Path(tmp), args.sessions)
+
+
+if __name__ == "__main__":
+    main()
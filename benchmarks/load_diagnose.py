@@ -0,0 +1,74 @@
+# Load test for concurrent diagnosis submissions. While `--concurrency`
+# clients POST /diagnose-async, a probe keeps requesting the home page; its
+# latency shows whether the event loop is ever blocked by database work.
+#
+#   python -m benchmarks.load_diagnose [--concurrency 50] [--submissions 2000]
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+
+async def run(concurrency: int, submissions: int) -> None:
+    from app.web.web_app import app
+    from benchmarks.asgi_client import ASGIClient, percentile
+
+    symptoms = ("no_power", "powers_on_no_display", "random_shutdowns", "power_cycles")
+    submit_latencies = []
+    probe_latencies = []
+    remaining = submissions
+
+    async with ASGIClient(app) as client:
+        async def submitter(seed: int):
+            nonlocal remaining
+            rng = random.Random(seed)
+            while remaining > 0:
+                remaining -= 1
+                form = {symptom: "y" if rng.random() < 0.4 else "n" for symptom in symptoms}
+                form["user_notes"] = "load test"
+                start = time.perf_counter()
+                response = await client.post_form("/diagnose-async", form)
+                submit_latencies.append(time.perf_counter() - start)
+                assert response.status == 303, response.status
+
+        async def probe(done: asyncio.Event):
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.005)
+
+        done = asyncio.Event()
+        probe_task = asyncio.create_task(probe(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(submitter(seed) for seed in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"{submissions} submissions, {concurrency} concurrent clients: {submissions / elapsed:.0f} req/s")
+    for name, samples in (("POST /diagnose-async", submit_latencies), ("GET / (probe)", probe_latencies)):
+        print(
+            f"  {name:<22} p50 {percentile(samples, 50) * 1000:7.2f} ms"
+            f"  p95 {percentile(samples, 95) * 1000:7.2f} ms"
+            f"  p99 {percentile(samples, 99) * 1000:7.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--submissions", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before the app (and app.settings) is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "load.sqlite3")
+        asyncio.run(run(args.concurrency, args.submissions))
+
+
+if __name__ == "__main__":
+    main()
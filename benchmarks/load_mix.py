@@ -0,0 +1,166 @@
+# Mixed-traffic load generator: `--concurrency` clients drive the web app
+# in-process (benchmarks.asgi_client, no sockets) with a weighted mix of form
+# diagnoses, session page views and PDF downloads, against a database seeded
+# with `--sessions` sessions. Each client draws its requests from its own
+# seeded RNG, so runs with the same arguments send the same requests.
+# Prints throughput and per-kind latency; --output also writes them as JSON.
+#
+#   python -m benchmarks.load_mix [--concurrency 32] [--requests 3000] [--mix diagnose=30,view=60,pdf=10]
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+DEFAULT_MIX = {"diagnose": 30, "view": 60, "pdf": 10}
+EXPECTED_STATUS = {"diagnose": 303, "view": 200, "pdf": 200}
+
+
+def parse_mix(text: str) -> dict[str, int]:
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in EXPECTED_STATUS or not weight.isdigit():
+            raise argparse.ArgumentTypeError(f"expected kind=weight with kind in {', '.join(EXPECTED_STATUS)}: {part!r}")
+        mix[kind] = int(weight)
+    return mix
+
+
+def populate(sessions: int) -> int:
+    # Returns the highest session id.
+    from app.data import db
+    from app.rules.engine import DEFAULT_ENGINE
+    from app.rules.store import get_rule_store
+
+    db.init_db()
+    rule_set = get_rule_store().snapshot
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    rng = random.Random(7)
+    session_ids = [0]
+    batch_size = 10_000
+    for start in range(0, sessions, batch_size):
+        diagnoses = []
+        for _ in range(min(batch_size, sessions - start)):
+            answers = {symptom: rng.random() < 0.4 for symptom in symptoms}
+            diagnoses.append(("load test", answers, DEFAULT_ENGINE.run(answers, rule_set), rule_set.version))
+        session_ids = db.save_diagnoses(diagnoses)
+    return session_ids[-1]
+
+
+async def drive(concurrency: int, requests: int, mix: dict[str, int], seed: int, max_id: int) -> dict:
+    from app.web.web_app import app
+    from benchmarks.asgi_client import ASGIClient, percentile
+
+    symptoms = ("no_power", "powers_on_no_display", "random_shutdowns", "power_cycles")
+    kinds, weights = list(mix), list(mix.values())
+    latencies = {kind: [] for kind in kinds}
+    errors = Counter()
+    remaining = requests
+
+    async with ASGIClient(app) as client:
+        async def send(kind: str, rng: random.Random):
+            nonlocal max_id
+            if kind == "diagnose":
+                form = {symptom: "y" if rng.random() < 0.4 else "n" for symptom in symptoms}
+                form["user_notes"] = "load test"
+                response = await client.post_form("/diagnose-async", form)
+                if response.status == 303:
+                    max_id = max(max_id, int(response.headers["location"].rsplit("/", 1)[1]))
+            elif kind == "view":
+                response = await client.get(f"/session/{rng.randint(1, max_id)}")
+            else:
+                response = await client.get(f"/session/{rng.randint(1, max_id)}/report.pdf")
+            return response.status
+
+        # Warm up: first PDF spawns the render workers, first page compiles
+        # the template.
+        warmup = random.Random(seed - 1)
+        for kind in kinds:
+            await send(kind, warmup)
+
+        async def worker(client_seed: int):
+            nonlocal remaining
+            rng = random.Random(client_seed)
+            while remaining > 0:
+                remaining -= 1
+                kind = rng.choices(kinds, weights)[0]
+                start = time.perf_counter()
+                status = await send(kind, rng)
+                latencies[kind].append(time.perf_counter() - start)
+                if status != EXPECTED_STATUS[kind]:
+                    errors[f"{kind} {status}"] += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(seed + n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "mix": mix,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "errors": dict(errors),
+        "latency_ms": {
+            kind: {
+                "count": len(samples),
+                **{f"p{pct}": round(percentile(samples, pct) * 1000, 3) for pct in (50, 95, 99)},
+            }
+            for kind, samples in latencies.items()
+        },
+    }
+
+
+def run_load(concurrency: int, requests: int, mix: dict[str, int], seed: int = 1, max_id: int | None = None) -> dict:
+    # Against the database the app is configured with; pass max_id when it
+    # is already known, else it is looked up.
+    if max_id is None:
+        from app.data.db import get_connection, init_db
+
+        init_db()
+        with get_connection() as conn:
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM sessions").fetchone()[0]
+    if not max_id:
+        raise SystemExit("The database has no sessions to view; seed it first")
+    return asyncio.run(drive(concurrency, requests, mix, seed, max_id))
+
+
+def print_report(report: dict) -> None:
+    print(
+        f"{report['requests']} requests, {report['concurrency']} concurrent clients: "
+        f"{report['throughput_rps']:.0f} req/s, errors: {report['errors'] or 'none'}"
+    )
+    for kind, latency in report["latency_ms"].items():
+        print(
+            f"  {kind:<9} {latency['count']:>6}  p50 {latency['p50']:8.2f} ms"
+            f"  p95 {latency['p95']:8.2f} ms  p99 {latency['p99']:8.2f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--sessions", type=int, default=10_000, help="sessions seeded before the run")
+    parser.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX, help="e.g. diagnose=30,view=60,pdf=10")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", type=Path, default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before the app (and app.settings) is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "load.sqlite3")
+        max_id = populate(args.sessions)
+        report = run_load(args.concurrency, args.requests, args.mix, args.seed, max_id)
+
+    print_report(report)
+    if args.output is not None:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# Concurrency stress check for the shared, stateless DiagnosticEngine.
+#
+# Many threads (and asyncio tasks) run DEFAULT_ENGINE at once while another
+# thread keeps reloading the rule store between two rule sets. Every result
+# must equal what a single-threaded match against the same rule-set version
+# gives, and must come from exactly one version. Exits 1 on any mismatch.
+#
+#   python -m benchmarks.stress_engine
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+THREADS = 16
+CALLS_PER_THREAD = 5_000
+TASKS = 200
+CALLS_PER_TASK = 200
+BATCH_SIZE = 64
+
+
+def make_rule_sets() -> list[list[dict]]:
+    from app.rules.knowledge_base import DIAGNOSTIC_RULES
+
+    # Second rule set: same rules with different weights, so the result
+    # order (and the version) differs between the two.
+    reweighted = [dict(rule, weight=round(0.2 + 0.15 * i, 2)) for i, rule in enumerate(DIAGNOSTIC_RULES)]
+    return [DIAGNOSTIC_RULES, reweighted]
+
+
+def random_answers(symptoms: list[str], rng: random.Random) -> dict:
+    return {symptom: rng.random() < 0.5 for symptom in symptoms}
+
+
+def main() -> int:
+    rules_dir = Path(tempfile.mkdtemp())
+    rules_file = rules_dir / "rules.json"
+    rule_sets = make_rule_sets()
+    rules_file.write_text(json.dumps(rule_sets[0]))
+
+    os.environ["PCBT_RULES_DIR"] = str(rules_dir)
+    os.environ["PCBT_RULES_CACHE"] = "0"
+
+    from app.rules.engine import DEFAULT_ENGINE, CompiledRuleSet
+    from app.rules.store import get_rule_store
+
+    store = get_rule_store()
+    expected_sets = {rule_set.version: rule_set for rule_set in map(CompiledRuleSet, rule_sets)}
+    symptoms = sorted({rule["symptom"] for rule in rule_sets[0] if "question" in rule})
+    expected_cache = {}
+    expected_lock = threading.Lock()
+
+    def expected(version: str, answers: dict) -> tuple:
+        # Single-threaded reference, computed once per (version, answers).
+        key = (version, frozenset(s for s, v in answers.items() if v))
+        with expected_lock:
+            if key not in expected_cache:
+                expected_cache[key] = tuple(
+                    (r.rule_id, r.rule_set_version) for r in expected_sets[version].match(answers)
+                )
+            return expected_cache[key]
+
+    failures = []
+
+    def check(answers: dict, results: tuple) -> None:
+        got = tuple((r.rule_id, r.rule_set_version) for r in results)
+        versions = {version for _, version in got}
+        if len(versions) > 1:
+            failures.append(f"mixed rule-set versions in one result: {sorted(versions)}")
+            return
+        # A result with no matches can come from either version.
+        candidates = versions or set(expected_sets)
+        if not any(got == expected(version, answers) for version in candidates):
+            failures.append(f"wrong result for {answers}: {got}")
+
+    stop = threading.Event()
+    reloads = 0
+
+    def reloader() -> None:
+        nonlocal reloads
+        index = 0
+        while not stop.is_set():
+            index = 1 - index
+            rules_file.write_text(json.dumps(rule_sets[index]))
+            now = time.time_ns() + reloads * 1000
+            os.utime(rules_file, ns=(now, now))
+            if store.reload_if_changed():
+                reloads += 1
+            time.sleep(0.001)
+
+    def worker(seed: int) -> int:
+        rng = random.Random(seed)
+        for call in range(CALLS_PER_THREAD):
+            if call % 10 == 0:
+                answer_sets = [random_answers(symptoms, rng) for _ in range(BATCH_SIZE)]
+                for answers, results in zip(answer_sets, DEFAULT_ENGINE.run_batch(answer_sets)):
+                    check(answers, results)
+            else:
+                answers = random_answers(symptoms, rng)
+                check(answers, DEFAULT_ENGINE.run(answers))
+        return CALLS_PER_THREAD
+
+    async def task(seed: int) -> None:
+        rng = random.Random(seed)
+        for _ in range(CALLS_PER_TASK):
+            answers = random_answers(symptoms, rng)
+            check(answers, DEFAULT_ENGINE.run(answers))
+            await asyncio.sleep(0)
+
+    async def run_tasks() -> None:
+        await asyncio.gather(*(task(THREADS + seed) for seed in range(TASKS)))
+
+    reload_thread = threading.Thread(target=reloader, daemon=True)
+    reload_thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        calls = sum(pool.map(worker, range(THREADS)))
+    asyncio.run(run_tasks())
+    elapsed = time.perf_counter() - start
+    stop.set()
+    reload_thread.join()
+
+    calls += TASKS * CALLS_PER_TASK
+    print(f"{calls:,} calls on {THREADS} threads + {TASKS} tasks in {elapsed:.2f}s, {reloads} rule reloads")
+    if failures:
+        print(f"{len(failures)} failures, e.g.:")
+        for failure in failures[:5]:
+            print(f"  {failure}")
+        return 1
+    print("All results matched the single-threaded reference.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
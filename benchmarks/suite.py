@@ -0,0 +1,294 @@
+# Benchmark suite for catching performance regressions between commits.
+# `run` measures a fixed set of hot paths against a synthetic database and
+# writes the results as JSON; `compare` diffs two such files and exits 1 if
+# any metric got worse by more than --threshold. Each metric is the median
+# of --repeat runs; the load test runs once per repeat as well.
+#
+#   python -m benchmarks.suite run [--sessions 200000] [--repeat 5] [--only engine,db,pdf,load] [--output results.json]
+#   python -m benchmarks.suite run --baseline results.json   # run, then compare against an earlier run
+#   python -m benchmarks.suite compare baseline.json results.json [--threshold 0.10]
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+FORMAT_VERSION = 1
+GROUPS = ("engine", "db", "pdf", "load")
+DEFAULT_THRESHOLD = 0.10
+
+ENGINE_RULE_COUNTS = (10, 1_000, 100_000)
+ENGINE_RUNS = 2_000
+WRITES = 2_000
+WRITE_BATCH_SIZE = 64
+READS = 2_000
+PDF_RESULT_COUNTS = (5, 500)
+# Reports are rendered at least this many times and for this long.
+PDF_MIN_RUNS = 3
+PDF_MIN_SECONDS = 1.0
+LOAD_REQUESTS = 1_500
+LOAD_CONCURRENCY = 32
+
+
+def _metric(value: float, unit: str, better: str) -> dict:
+    return {"value": value, "unit": unit, "better": better}
+
+
+_engines: dict[int, tuple] = {}
+
+
+def bench_engine() -> dict:
+    from app.rules.engine import CompiledRuleSet, DiagnosticEngine
+    from benchmarks.bench_engine import make_answers, make_rules
+
+    metrics = {}
+    for count in ENGINE_RULE_COUNTS:
+        # Compiled once for all repeats; 100k rules take a while.
+        if count not in _engines:
+            rules = make_rules(count)
+            rng = random.Random(7)
+            answer_sets = [make_answers(rules, rng) for _ in range(ENGINE_RUNS)]
+            _engines[count] = DiagnosticEngine(CompiledRuleSet(rules)), answer_sets
+        engine, answer_sets = _engines[count]
+        start = time.perf_counter()
+        for answers in answer_sets:
+            engine.run(answers)
+        per_run = (time.perf_counter() - start) / ENGINE_RUNS
+        metrics[f"engine.run.rules_{count}"] = _metric(per_run * 1e6, "us", "lower")
+    return metrics
+
+
+def _diagnoses(count: int, rng: random.Random) -> list[tuple]:
+    from app.rules.engine import DEFAULT_ENGINE
+    from app.rules.store import get_rule_store
+
+    rule_set = get_rule_store().snapshot
+    symptoms = [rule.symptom for rule in rule_set.questions]
+    diagnoses = []
+    for _ in range(count):
+        answers = {symptom: rng.random() < 0.4 for symptom in symptoms}
+        diagnoses.append(("benchmark", answers, DEFAULT_ENGINE.run(answers, rule_set), rule_set.version))
+    return diagnoses
+
+
+def populate(sessions: int) -> None:
+    from app.data import db
+
+    db.init_db()
+    rng = random.Random(7)
+    batch_size = 10_000
+    for start in range(0, sessions, batch_size):
+        db.save_diagnoses(_diagnoses(min(batch_size, sessions - start), rng))
+
+
+def _latency_metrics(name: str, samples: list[float]) -> dict:
+    from benchmarks.asgi_client import percentile
+
+    return {
+        f"{name}.p50": _metric(percentile(samples, 50) * 1e6, "us", "lower"),
+        f"{name}.p95": _metric(percentile(samples, 95) * 1e6, "us", "lower"),
+    }
+
+
+def bench_db(sessions: int) -> dict:
+    from app.data import db, queries
+
+    rng = random.Random(11)
+    metrics = {}
+
+    # Reads of random sessions spread over the whole (large) table.
+    session_ids = [rng.randint(1, sessions) for _ in range(READS)]
+    for name, read in (
+        ("db.get_session", queries.get_session),
+        ("db.get_results_for_session", queries.get_results_for_session),
+    ):
+        samples = []
+        for session_id in session_ids:
+            start = time.perf_counter()
+            read(session_id)
+            samples.append(time.perf_counter() - start)
+        metrics.update(_latency_metrics(name, samples))
+
+    # One session per transaction, as the CLI saves them, and batched, as
+    # the group-commit writer does.
+    diagnoses = _diagnoses(WRITES, rng)
+    start = time.perf_counter()
+    for user_notes, answers, results, version in diagnoses:
+        session_id = db.save_session(user_notes, answers, version)
+        db.save_results(session_id, results)
+    metrics["db.save_session+save_results"] = _metric(WRITES / (time.perf_counter() - start), "sessions/s", "higher")
+
+    start = time.perf_counter()
+    for batch in range(0, WRITES, WRITE_BATCH_SIZE):
+        db.save_diagnoses(diagnoses[batch:batch + WRITE_BATCH_SIZE])
+    metrics[f"db.save_diagnoses.batch_{WRITE_BATCH_SIZE}"] = _metric(
+        WRITES / (time.perf_counter() - start), "sessions/s", "higher",
+    )
+    return metrics
+
+
+def bench_pdf() -> dict:
+    from app.reports.pdf_report import generate_pdf_report
+    from benchmarks.bench_pdf import make_report
+
+    metrics = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for count in PDF_RESULT_COUNTS:
+            session, results = make_report(count)
+            generate_pdf_report(session, results, Path(tmp))  # warm up imports and the shared template
+            runs = 0
+            start = time.perf_counter()
+            while runs < PDF_MIN_RUNS or time.perf_counter() - start < PDF_MIN_SECONDS:
+                generate_pdf_report(session, results, Path(tmp))
+                runs += 1
+            per_report = (time.perf_counter() - start) / runs
+            metrics[f"pdf.generate.results_{count}"] = _metric(per_report * 1000, "ms", "lower")
+    return metrics
+
+
+def bench_load() -> dict:
+    from benchmarks.load_mix import DEFAULT_MIX, run_load
+
+    report = run_load(LOAD_CONCURRENCY, LOAD_REQUESTS, DEFAULT_MIX)
+    if report["errors"]:
+        raise SystemExit(f"Load test errors: {report['errors']}")
+    metrics = {"load.throughput": _metric(report["throughput_rps"], "req/s", "higher")}
+    for kind, latency in report["latency_ms"].items():
+        metrics[f"load.{kind}.p95"] = _metric(latency["p95"], "ms", "lower")
+    return metrics
+
+
+def _git(*args: str) -> str | None:
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(groups: tuple[str, ...], sessions: int, repeat: int) -> dict:
+    populate(sessions)
+    runs: dict[str, list[dict]] = {}
+    for _ in range(repeat):
+        for group in groups:
+            if group == "engine":
+                measured = bench_engine()
+            elif group == "db":
+                measured = bench_db(sessions)
+            elif group == "pdf":
+                measured = bench_pdf()
+            else:
+                measured = bench_load()
+            for name, metric in measured.items():
+                runs.setdefault(name, []).append(metric)
+
+    results = {}
+    for name, metrics in runs.items():
+        values = [metric["value"] for metric in metrics]
+        results[name] = {**metrics[0], "value": round(statistics.median(values), 3), "runs": [round(v, 3) for v in values]}
+    return results
+
+
+def compare(baseline: dict, current: dict, threshold: float) -> list[str]:
+    # Prints one line per metric; returns the names of regressed metrics.
+    if baseline.get("meta", {}).get("args") != current.get("meta", {}).get("args"):
+        print("warning: the runs used different arguments, so not every difference is the code's\n")
+
+    regressions = []
+    print(f"{'metric':<36} {'baseline':>22} {'current':>22} {'change':>8}")
+    for name in sorted(baseline["results"].keys() | current["results"].keys()):
+        before, after = baseline["results"].get(name), current["results"].get(name)
+        if before is None or after is None:
+            print(f"{name:<36} {'(new)' if before is None else '(missing)':>22}")
+            continue
+
+        unit = after["unit"]
+        change = (after["value"] - before["value"]) / before["value"] if before["value"] else 0.0
+        # Positive when the metric moved in its bad direction.
+        worse = change if after["better"] == "lower" else -change
+        verdict = "REGRESSED" if worse > threshold else "improved" if worse < -threshold else ""
+        if verdict == "REGRESSED":
+            regressions.append(name)
+        print(
+            f"{name:<36} {before['value']:>11.3f} {unit:<10} {after['value']:>11.3f} {unit:<10} "
+            f"{change * 100:+7.1f}%  {verdict}"
+        )
+    return regressions
+
+
+def load_results(path: Path) -> dict:
+    results = json.loads(path.read_text())
+    if results.get("version") != FORMAT_VERSION:
+        raise SystemExit(f"{path} is not a version {FORMAT_VERSION} benchmark result")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run = subparsers.add_parser("run", help="run the benchmarks and write the results as JSON")
+    run.add_argument("--sessions", type=int, default=200_000, help="sessions in the synthetic database")
+    run.add_argument("--repeat", type=int, default=5, help="runs per metric; the median is kept")
+    run.add_argument("--only", default=",".join(GROUPS), help=f"comma-separated groups of {', '.join(GROUPS)}")
+    run.add_argument("--output", type=Path, default=Path("benchmark-results.json"))
+    run.add_argument("--baseline", type=Path, default=None, help="compare against this earlier result")
+    run.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    diff = subparsers.add_parser("compare", help="compare two result files")
+    diff.add_argument("baseline", type=Path)
+    diff.add_argument("current", type=Path)
+    diff.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed slowdown (default: 0.10)")
+
+    args = parser.parse_args()
+
+    if args.command == "compare":
+        regressions = compare(load_results(args.baseline), load_results(args.current), args.threshold)
+        sys.exit(1 if regressions else 0)
+
+    groups = tuple(group.strip() for group in args.only.split(",") if group.strip())
+    unknown = set(groups) - set(GROUPS)
+    if unknown:
+        parser.error(f"unknown groups: {', '.join(sorted(unknown))}")
+    baseline = load_results(args.baseline) if args.baseline is not None else None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Must be set before app.settings is imported.
+        os.environ["PCBT_DB_PATH"] = str(Path(tmp) / "suite.sqlite3")
+        results = run_suite(groups, args.sessions, args.repeat)
+
+    report = {
+        "version": FORMAT_VERSION,
+        "meta": {
+            "commit": _git("rev-parse", "HEAD"),
+            "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": {"sessions": args.sessions, "repeat": args.repeat, "groups": list(groups)},
+        },
+        "results": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"Results written to {args.output}\n")
+
+    if baseline is None:
+        for name, metric in results.items():
+            print(f"{name:<36} {metric['value']:>11.3f} {metric['unit']}")
+        return
+    regressions = compare(baseline, report, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
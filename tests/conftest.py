@@ -0,0 +1,33 @@
+import os
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Settings are read once, when app.settings is first imported, so point
+# the database and report cache at a scratch directory before any test
+# imports the app.
+_scratch = tempfile.TemporaryDirectory()
+os.environ["PCBT_DB_PATH"] = str(Path(_scratch.name) / "app_db.sqlite3")
+os.environ["PCBT_REPORT_CACHE_DIR"] = str(Path(_scratch.name) / "reports")
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    # Where the app's database lives for one test; not created or migrated
+    # yet. Settings are only read at import, so the pool is pointed at it.
+    from app.data import db
+
+    db.close_pool()
+    db.DB_PATH = tmp_path / "app_db.sqlite3"
+    yield db.DB_PATH
+    db.close_pool()
+
+
+@pytest.fixture
+def database(database_path):
+    # A fresh, fully migrated database for one test.
+    from app.data import db
+
+    db.init_db()
+    return database_path
@@ -0,0 +1,119 @@
+import asyncio
+import io
+import json
+import threading
+import zipfile
+
+from app.data import queries
+from app.reports.cache import ReportCache
+from app.reports.pdf_report import report_filename
+from app.reports.render_service import ReportRenderService
+from app.web import web_app
+from benchmarks.asgi_client import ASGIClient
+
+
+def post_json(url: str, body: dict):
+    async def send():
+        async with ASGIClient(web_app.app) as client:
+            return await client.post_json(url, json.dumps(body).encode())
+
+    return asyncio.run(send())
+
+
+def get(url: str):
+    async def send():
+        async with ASGIClient(web_app.app) as client:
+            return await client.get(url)
+
+    return asyncio.run(send())
+
+
+def test_diagnose_ranks_causes(database):
+    response = post_json("/api/diagnose", {"answers": {"powers_on_no_display": True, "power_cycles": True}})
+
+    assert response.status == 200
+    body = json.loads(response.body)
+    ranked = body["ranked_causes"]
+    # Only the compound rule suggests the BIOS cause, with weight 0.6; its
+    # other causes are also suggested by unweighted rules, so they are certain.
+    assert ranked[-1] == {"cause": "CPU not supported by the current BIOS version", "confidence": 0.6}
+    assert {"cause": "CPU power cable not connected", "confidence": 1.0} in ranked
+    assert {rank["cause"] for rank in ranked} == {cause for rule in body["results"] for cause in rule["probable_causes"]}
+
+    page = get(f"/session/{body['session_id']}").body.decode()
+    assert "Most Likely Causes" in page
+    assert "60%" in page
+
+
+def test_diagnose_batch(database, monkeypatch):
+    # Matching and serializing a batch must not block the event loop.
+    threads = []
+    for name in ("_run_batch", "_batch_response"):
+        def record(*args, _fn=getattr(web_app, name)):
+            threads.append(threading.current_thread())
+            return _fn(*args)
+
+        monkeypatch.setattr(web_app, name, record)
+
+    response = post_json("/api/diagnose/batch", {"diagnoses": [
+        {"answers": {"no_power": True}, "user_notes": " first "},
+        {"answers": {}},
+    ]})
+
+    assert response.status == 200
+    body = json.loads(response.body)
+    first, second = body["diagnoses"]
+    assert [rule["symptom"] for rule in first["results"]] == ["no_power"]
+    assert second["results"] == [] and second["ranked_causes"] == []
+    assert first["ranked_causes"][0]["confidence"] == 1.0
+    assert queries.get_session(first["session_id"]).user_notes == "first"
+    assert queries.get_session(second["session_id"]).answers["no_power"] is False
+    assert len(threads) == 2 and threading.main_thread() not in threads
+
+
+def test_diagnose_batch_rejects_unknown_symptoms(database):
+    response = post_json("/api/diagnose/batch", {"diagnoses": [
+        {"answers": {"no_power": True}},
+        {"answers": {"no_powr": True}},
+    ]})
+
+    assert response.status == 400
+    assert json.loads(response.body) == {"detail": "diagnoses[1]: Unknown symptoms: no_powr"}
+    assert queries.list_sessions_page()[0] == []
+
+
+def test_pdf_downloads_are_served_from_the_cache(database, tmp_path, monkeypatch):
+    render_service = ReportRenderService(workers=0, cache=ReportCache(tmp_path / "reports"))
+    monkeypatch.setattr(web_app, "get_render_service", lambda: render_service)
+    session_id = json.loads(post_json("/api/diagnose", {"answers": {"no_power": True}}).body)["session_id"]
+
+    # A miss is streamed from memory, then cached.
+    first = get(f"/session/{session_id}/report.pdf")
+    assert first.status == 200 and first.body.startswith(b"%PDF")
+    cached = list((tmp_path / "reports").glob("*.pdf"))
+    assert [path.read_bytes() for path in cached] == [first.body]
+
+    async def no_render(*args):
+        raise AssertionError("rendered a cached report")
+
+    monkeypatch.setattr(render_service, "render_bytes", no_render)
+    second = get(f"/session/{session_id}/report.pdf")
+    assert second.status == 200 and second.body == first.body
+    assert second.headers["etag"] == first.headers["etag"]
+
+
+def test_report_export_zip(database, tmp_path, monkeypatch):
+    render_service = ReportRenderService(workers=0, max_pending=2, cache=ReportCache(tmp_path / "reports"))
+    monkeypatch.setattr(web_app, "get_render_service", lambda: render_service)
+    session_ids = [
+        json.loads(post_json("/api/diagnose", {"answers": {"no_power": n % 2 == 0}}).body)["session_id"]
+        for n in range(5)
+    ]
+
+    response = get(f"/reports/export.zip?start_id={session_ids[0]}&end_id={session_ids[-1]}")
+
+    assert response.status == 200
+    with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+        assert archive.namelist() == [report_filename(session_id) for session_id in session_ids]
+    # Every slot was given back.
+    assert all(render_service._slots.acquire(blocking=False) for _ in range(2))
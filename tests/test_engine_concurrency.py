@@ -0,0 +1,85 @@
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import settings
+from app.rules import store as store_module
+from app.rules.engine import DEFAULT_ENGINE, CompiledRuleSet
+from app.rules.knowledge_base import DIAGNOSTIC_RULES
+
+# A scaled-down benchmarks/stress_engine.py: reader threads share
+# DEFAULT_ENGINE while the rule store keeps reloading between two rule sets.
+THREADS = 8
+CALLS_PER_THREAD = 500
+BATCH_SIZE = 16
+
+
+def test_engine_under_rule_reloads(tmp_path, monkeypatch):
+    # Same rules with different weights, so the two versions order their
+    # results differently.
+    rule_sets = [DIAGNOSTIC_RULES, [dict(rule, weight=round(0.2 + 0.15 * i, 2)) for i, rule in enumerate(DIAGNOSTIC_RULES)]]
+    rules_file = tmp_path / "rules.json"
+    rules_file.write_text(json.dumps(rule_sets[0]))
+    monkeypatch.setattr(settings, "RULES_CACHE", False)
+    store = store_module.RuleStore(directory=tmp_path)
+    monkeypatch.setattr(store_module, "_store", store)
+
+    compiled = {rule_set.version: rule_set for rule_set in map(CompiledRuleSet, rule_sets)}
+    symptoms = sorted({rule["symptom"] for rule in DIAGNOSTIC_RULES if "question" in rule})
+
+    def reference(version: str, answers: dict) -> tuple:
+        return tuple((rule.rule_id, rule.rule_set_version) for rule in compiled[version].match(answers))
+
+    def consistent(answers: dict, results) -> bool:
+        # From one version only, and equal to a single-threaded run of it.
+        got = tuple((rule.rule_id, rule.rule_set_version) for rule in results)
+        versions = {version for _, version in got}
+        if len(versions) > 1:
+            return False
+        # A result with no matches can come from either version.
+        return any(got == reference(version, answers) for version in versions or compiled)
+
+    stop = threading.Event()
+    reloads = 0
+
+    def reloader() -> None:
+        nonlocal reloads
+        index = 0
+        while not stop.is_set():
+            index = 1 - index
+            rules_file.write_text(json.dumps(rule_sets[index]))
+            now = time.time_ns() + reloads * 1000
+            os.utime(rules_file, ns=(now, now))
+            if store.reload_if_changed():
+                reloads += 1
+            time.sleep(0.001)
+
+    def reader(seed: int) -> list[str]:
+        rng = random.Random(seed)
+        failures = []
+        for call in range(CALLS_PER_THREAD):
+            answer_sets = [{s: rng.random() < 0.5 for s in symptoms} for _ in range(BATCH_SIZE if call % 10 == 0 else 1)]
+            snapshot = store.snapshot
+            pinned = DEFAULT_ENGINE.run_batch(answer_sets, snapshot)
+            following = DEFAULT_ENGINE.run_batch(answer_sets) if len(answer_sets) > 1 else [DEFAULT_ENGINE.run(answer_sets[0])]
+            for answers, results, latest in zip(answer_sets, pinned, following):
+                if tuple((r.rule_id, r.rule_set_version) for r in results) != reference(snapshot.version, answers):
+                    failures.append(f"snapshot {snapshot.version}: wrong result for {answers}")
+                if not consistent(answers, latest):
+                    failures.append(f"wrong result for {answers}: {latest}")
+        return failures
+
+    reload_thread = threading.Thread(target=reloader)
+    reload_thread.start()
+    try:
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            failures = [failure for found in pool.map(reader, range(THREADS)) for failure in found]
+    finally:
+        stop.set()
+        reload_thread.join()
+
+    assert reloads > 1
+    assert failures == []
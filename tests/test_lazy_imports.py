@@ -0,0 +1,24 @@
+import subprocess
+import sys
+
+import pytest
+
+from app import settings
+
+# ReportLab and Pillow are only loaded once a report is generated, not by
+# loading an entry point (see benchmarks/bench_import.py for timings).
+DEFERRED_MODULES = ("reportlab", "PIL")
+
+
+@pytest.mark.parametrize("module", ["app.cli", "app.web.web_app"])
+def test_entry_points_defer_report_imports(module):
+    # A fresh interpreter, as this one may already have imported them.
+    loaded = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        cwd=settings.PROJECT_ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+
+    assert [name for name in loaded if name.split(".")[0] in DEFERRED_MODULES] == []
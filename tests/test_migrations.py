@@ -0,0 +1,131 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+
+from app import settings
+from app.data import db, queries
+
+# The schema as it was before versioned migrations: user_version 0, and
+# results carrying their own copy of the causes and tests.
+BASELINE_SCHEMA = """
+CREATE TABLE sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created_at TEXT NOT NULL,
+    user_notes TEXT,
+    answers_json TEXT NOT NULL
+);
+CREATE TABLE results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL,
+    symptom TEXT NOT NULL,
+    probable_causes_json TEXT NOT NULL,
+    next_tests_json TEXT NOT NULL,
+    FOREIGN KEY (session_id) REFERENCES sessions (id)
+);
+"""
+
+LEGACY_RESULTS = {
+    1: [("no_power", ["PSU switch off", "24-pin loose"], ["Check the PSU switch"])],
+    2: [
+        ("no_power", ["PSU switch off", "24-pin loose"], ["Check the PSU switch"]),
+        ("random_shutdowns", ["Overheating CPU"], ["Watch CPU temperatures", "Reseat the cooler"]),
+    ],
+    3: [],
+    4: [("random_shutdowns", ["Overheating CPU", "Weak PSU"], ["Watch CPU temperatures"])],
+}
+
+
+def create_baseline_database(path, legacy_results: dict) -> None:
+    conn = sqlite3.connect(path)
+    conn.executescript(BASELINE_SCHEMA)
+    for session_id, results in legacy_results.items():
+        answers = {symptom: True for symptom, _, _ in results}
+        conn.execute(
+            "INSERT INTO sessions (id, created_at, user_notes, answers_json) VALUES (?, ?, ?, ?)",
+            (session_id, f"2024-05-{session_id % 28 + 1:02}T12:00:00", "old notes", json.dumps(answers)),
+        )
+        conn.executemany(
+            "INSERT INTO results (session_id, symptom, probable_causes_json, next_tests_json) VALUES (?, ?, ?, ?)",
+            [(session_id, symptom, json.dumps(causes), json.dumps(tests)) for symptom, causes, tests in results],
+        )
+    conn.commit()
+    conn.close()
+
+
+def test_baseline_database_is_migrated(database_path, monkeypatch):
+    create_baseline_database(database_path, LEGACY_RESULTS)
+
+    # Small chunks, so the rule-reference backfill takes several.
+    monkeypatch.setattr(db, "MIGRATION_CHUNK_SIZE", 2)
+    db.init_db()
+
+    for session_id, results in LEGACY_RESULTS.items():
+        migrated = queries.get_results_for_session(session_id)
+        assert [(r.symptom, list(r.probable_causes), list(r.next_tests)) for r in migrated] == results
+        assert {r.rule_set_version for r in migrated} <= {db.LEGACY_RULE_SET_VERSION}
+
+    with db.get_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+        # One legacy rule per distinct (symptom, causes, tests).
+        assert conn.execute("SELECT COUNT(*) FROM rules").fetchone()[0] == 3
+        assert not db._table_columns(conn, "results_legacy")
+
+
+def test_concurrent_workers_migrate_once(database_path):
+    # Several workers starting at once against a baseline database, with
+    # chunks small enough that the chunked migrations take many commits.
+    legacy_results = {
+        session_id: [
+            ("no_power", [f"Cause {session_id % 7}"], ["Check the PSU switch"]),
+            ("random_shutdowns", ["Overheating CPU"], [f"Test {session_id % 5}"]),
+            ("power_cycles", ["Weak PSU"], ["Swap the PSU"]),
+        ]
+        for session_id in range(1, 1001)
+    }
+    create_baseline_database(database_path, legacy_results)
+
+    script = "from app.data import db; db.MIGRATION_CHUNK_SIZE = 20; db.init_db()"
+    workers = [
+        subprocess.Popen(
+            [sys.executable, "-c", script],
+            cwd=settings.PROJECT_ROOT,
+            env={**os.environ, "PCBT_DB_PATH": str(database_path)},
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        for _ in range(4)
+    ]
+    errors = [worker.communicate()[1] for worker in workers if worker.wait() != 0]
+    assert errors == []
+
+    with db.get_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
+        assert not db._table_columns(conn, "results_legacy")
+        assert conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] == 3000
+        assert conn.execute("SELECT COUNT(*) FROM session_symptoms").fetchone()[0] == 3000
+        conn.execute("INSERT INTO sessions_fts (sessions_fts) VALUES ('integrity-check')")
+    assert queries.get_results_for_session(500)[0].probable_causes == ("Cause 3",)
+
+
+def test_late_worker_does_not_move_version_back(database, monkeypatch):
+    # Another worker finishes migration 5 and everything after it while this
+    # one is between backfill chunks; this worker must not re-run them.
+    migration_5 = db.MIGRATIONS[4]
+    rerun = []
+
+    def finished_elsewhere(conn):
+        migration_5(conn)
+        with sqlite3.connect(database) as other:
+            other.execute(f"PRAGMA user_version = {len(db.MIGRATIONS)}")
+
+    monkeypatch.setattr(db, "MIGRATIONS", [*db.MIGRATIONS[:4], finished_elsewhere, *[rerun.append] * 2])
+    with db.get_connection() as conn:
+        conn.execute("PRAGMA user_version = 4")
+
+    db.init_db()
+
+    assert rerun == []
+    with db.get_connection() as conn:
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == len(db.MIGRATIONS)
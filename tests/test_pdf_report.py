@@ -0,0 +1,12 @@
+from app.data.models import DiagnosisResult, Session
+from app.reports.pdf_report import render_pdf_bytes
+
+
+def test_reports_render_repeatedly_on_one_thread():
+    # Long notes make ReportLab split flowables across pages; a flowable
+    # reused from an earlier build would fail to lay out the second time.
+    session = Session(1, "2025-01-01 00:00:00", " ".join(["word"] * 3000), {"no_power": True, "random_shutdowns": False})
+    results = [DiagnosisResult("1", "no_power", "no_power", ("PSU switch off",), ("Check the PSU switch",))]
+
+    for _ in range(3):
+        assert render_pdf_bytes(session, results).startswith(b"%PDF")
@@ -0,0 +1,48 @@
+import pytest
+
+from app.data import db, queries
+
+
+def _save_sessions(count: int, answers: dict) -> list[int]:
+    return db.save_diagnoses([(f"session {n}", answers, [], None) for n in range(count)])
+
+
+def _pages(**filters) -> list[list[int]]:
+    pages, cursor = [], None
+    while True:
+        sessions, cursor = queries.list_sessions_page(cursor=cursor, **filters)
+        pages.append([session.id for session in sessions])
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("symptom", [None, "no_power"])
+def test_pages_through_tied_timestamps(database, symptom):
+    session_ids = _save_sessions(7, {"no_power": True})
+    # Every session saved in the same instant, so only ids order them.
+    with db.get_connection() as conn:
+        conn.execute("UPDATE sessions SET created_at = '2025-03-01T10:00:00'")
+        conn.execute("UPDATE session_symptoms SET created_at = '2025-03-01T10:00:00'")
+
+    pages = _pages(limit=3, symptom=symptom)
+
+    assert pages == [session_ids[6:3:-1], session_ids[3:0:-1], session_ids[:1]]
+
+
+def test_cursor_continues_after_the_tie_it_stopped_in(database):
+    older, tied, newer = _save_sessions(2, {}), _save_sessions(4, {}), _save_sessions(2, {})
+    with db.get_connection() as conn:
+        conn.execute("UPDATE sessions SET created_at = '2025-03-01T09:00:00' WHERE id <= ?", (older[-1],))
+        conn.execute("UPDATE sessions SET created_at = '2025-03-01T10:00:00' WHERE id BETWEEN ? AND ?", (tied[0], tied[-1]))
+        conn.execute("UPDATE sessions SET created_at = '2025-03-01T11:00:00' WHERE id >= ?", (newer[0],))
+
+    # The first page ends halfway through the tied sessions.
+    pages = _pages(limit=4)
+
+    assert [session_id for page in pages for session_id in page] == [*reversed(newer), *reversed(tied), *reversed(older)]
+    assert [len(page) for page in pages] == [4, 4]
+
+
+def test_rejects_a_foreign_cursor(database):
+    with pytest.raises(ValueError):
+        queries.list_sessions_page(cursor="not a cursor")
@@ -0,0 +1,40 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.data.models import Session
+from app.reports.cache import ReportCache
+from app.reports.render_service import RenderQueueFull, ReportRenderService
+
+SESSION = Session(1, "2025-01-01 00:00:00", "", {"no_power": False})
+
+
+def test_exports_and_downloads_share_the_pending_limit(tmp_path):
+    service = ReportRenderService(workers=0, max_pending=1, cache=ReportCache(tmp_path))
+    started, release = threading.Event(), threading.Event()
+
+    def slow_build():
+        started.set()
+        release.wait(5)
+        return b"%PDF"
+
+    # An export's build holds the only slot while it runs.
+    export = threading.Thread(target=service.export_executor.submit, args=(slow_build,))
+    export.start()
+    assert started.wait(5)
+    with pytest.raises(RenderQueueFull):
+        asyncio.run(service.render_bytes(SESSION, []))
+
+    release.set()
+    export.join()
+    assert asyncio.run(service.render_bytes(SESSION, [])).startswith(b"%PDF")
+
+
+def test_finished_export_builds_free_their_slot(tmp_path):
+    service = ReportRenderService(workers=0, max_pending=1, cache=ReportCache(tmp_path))
+    held = service.export_executor.submit(lambda: None)
+    assert held.done()
+
+    # The finished build gave its slot back, so the next one can run.
+    assert service.export_executor.submit(lambda: "next").result(timeout=5) == "next"
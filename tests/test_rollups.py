@@ -0,0 +1,46 @@
+import threading
+
+from app.data import analytics, db
+from app.data.models import Rule
+
+OLD = Rule("test", "old", "no_power", ("a",), ("Check a",))
+NEW = Rule("test", "new", "no_power", ("NEW CAUSE",), ("Check the new cause",))
+
+
+def _cause_counts() -> list[tuple]:
+    with db.get_connection() as conn:
+        return conn.execute(
+            "SELECT cause, SUM(sessions) FROM daily_causes GROUP BY cause HAVING SUM(sessions) ORDER BY cause"
+        ).fetchall()
+
+
+def test_replace_results_during_backfill(database, monkeypatch):
+    session_ids = db.save_diagnoses(
+        [("", {"no_power": True}, [OLD], "test")] * 10 + [("", {"no_power": True}, [NEW], "test")]
+    )
+    # Turn them into sessions saved before the rollups existed, which only
+    # the backfill counts.
+    with db.get_connection() as conn:
+        conn.execute("UPDATE rollup_backfill SET watermark = 0, end_id = ?", (session_ids[-1],))
+        for table in ("daily_sessions", "daily_symptoms", "daily_symptom_pairs", "daily_causes"):
+            conn.execute(f"DELETE FROM {table}")
+
+    # A backfill chunk tries to commit right after the watermark was read.
+    backfills = []
+    counted_session_ids = db._counted_session_ids
+
+    def counted_then_backfill(cur, ids):
+        counted = counted_session_ids(cur, ids)
+        backfill = threading.Thread(target=analytics.backfill_rollups)
+        backfill.start()
+        backfill.join(0.5)
+        backfills.append(backfill)
+        return counted
+
+    monkeypatch.setattr(db, "_counted_session_ids", counted_then_backfill)
+    db.replace_results([(session_ids[0], [NEW])])
+    for backfill in backfills:
+        backfill.join()
+
+    assert analytics.backfill_status()["complete"]
+    assert _cause_counts() == [("NEW CAUSE", 2), ("a", 9)]
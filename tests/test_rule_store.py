@@ -0,0 +1,45 @@
+import json
+import os
+import time
+
+from app import settings
+from app.rules.engine import CompiledRuleSet
+from app.rules.knowledge_base import DIAGNOSTIC_RULES
+from app.rules.store import RuleStore
+
+
+def write_rules(path, text: str, tick: int) -> None:
+    # Bump the mtime explicitly; writes can land within one mtime tick.
+    path.write_text(text)
+    now = time.time_ns() + tick * 1000
+    os.utime(path, ns=(now, now))
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_watcher_survives_malformed_rule_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "RULES_CACHE", False)
+    rules_file = tmp_path / "rules.json"
+    write_rules(rules_file, json.dumps(DIAGNOSTIC_RULES[:2]), 0)
+    store = RuleStore(directory=tmp_path, poll_interval=0.01)
+    original = store.snapshot.version
+    store.start_watching()
+    try:
+        for tick, text in enumerate(['[1]', '[null]', '{"id": "x"}', '[{"symptom": 1}]'], start=1):
+            write_rules(rules_file, text, tick)
+            assert wait_for(lambda: store._source_state == store._read_source_state())
+            assert store.snapshot.version == original
+            assert store._watcher.is_alive()
+
+        write_rules(rules_file, json.dumps(DIAGNOSTIC_RULES), 10)
+        expected = CompiledRuleSet(DIAGNOSTIC_RULES).version
+        assert wait_for(lambda: store.snapshot.version == expected)
+    finally:
+        store.stop_watching()
@@ -0,0 +1,50 @@
+import pytest
+
+from app.data import db, queries
+
+NOTES = [
+    "Fans spin NEAR the PSU but no POST",
+    'Screen says "no signal" after the -10% undervolt',
+    "RTX 4070 black screen, RTX 4080 fine",
+    "Random shutdowns under load",
+]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("no post", '"no" "post"'),
+    ('say "no signal"', '"say" "no signal"'),
+    ('5" fan', '"5""" "fan"'),
+    ("RTX 40*", '"RTX" "40"*'),
+    ("fans NEAR psu", '"fans" "NEAR" "psu"'),
+    ("-10% undervolt", '"-10%" "undervolt"'),
+    ("a AND b OR NOT c", '"a" "AND" "b" "OR" "NOT" "c"'),
+    ("col:value ^start", '"col:value" "^start"'),
+])
+def test_fts_query_quotes_every_term(text, expected):
+    assert queries.fts_query(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "   ", "* - \"\" ( )"])
+def test_fts_query_rejects_input_without_words(text):
+    with pytest.raises(ValueError):
+        queries.fts_query(text)
+
+
+@pytest.mark.parametrize("text, matched", [
+    ("NEAR psu", [0]),
+    ('"no signal"', [1]),
+    ("-10% undervolt", [1]),
+    ("RTX 40*", [2]),
+    ('no "signal', [1]),
+    # Operators are searched for as words rather than parsed by FTS5, so
+    # these match nothing.
+    ("NOT shutdowns", []),
+    ("fans OR shutdowns", []),
+    ("NEAR(fans psu)", []),
+])
+def test_search_treats_fts_syntax_as_text(database, text, matched):
+    session_ids = db.save_diagnoses([(notes, {}, [], None) for notes in NOTES])
+
+    for order in queries.SEARCH_ORDERS:
+        hits = queries.search_sessions(text, order=order)
+        assert sorted(hit.session.id for hit in hits) == [session_ids[i] for i in matched]
@@ -0,0 +1,48 @@
+import pytest
+
+from app.data import db, queries
+from app.data.models import Rule
+from app.data.transfer import FORMATS, export_sessions, import_sessions
+
+RULES = [
+    Rule("v1", "no_power", "no_power", ("PSU switch off", "24-pin loose"), ("Check the PSU switch",)),
+    Rule("v1", "random_shutdowns", "random_shutdowns", ("Overheating CPU",), ("Watch CPU temperatures",)),
+    Rule("v2", "no_power", "no_power", ("PSU switch off",), ("Check the PSU switch", "Try another outlet")),
+]
+
+
+def _snapshot(session_ids: list[int]) -> list[tuple]:
+    return [(queries.get_session(session_id), queries.get_results_for_session(session_id)) for session_id in session_ids]
+
+
+@pytest.mark.parametrize("format", FORMATS)
+def test_export_import_round_trip(database, tmp_path, monkeypatch, format):
+    diagnoses = []
+    for n in range(25):
+        answers = {"no_power": n % 2 == 0, "random_shutdowns": n % 3 == 0}
+        results = [rule for rule in RULES[n % 2 * 2:] if answers[rule.symptom]]
+        notes = ("", "PSU \"clicks\"; fan spins — then nothing\n", "RTX 3060 ✓")[n % 3]
+        diagnoses.append((notes, answers, results, "v1" if n % 2 else None))
+    session_ids = db.save_diagnoses(diagnoses)
+    expected = _snapshot(session_ids)
+
+    export = tmp_path / f"sessions.{format}"
+    # Small chunks and batches, so both span several.
+    assert export_sessions(export, format, chunk_size=7) == len(session_ids)
+
+    db.close_pool()
+    monkeypatch.setattr(db, "DB_PATH", tmp_path / "imported.sqlite3")
+    db.init_db()
+    assert import_sessions(export, batch_size=10) == len(session_ids)
+
+    assert _snapshot(session_ids) == expected
+    assert queries.list_sessions_page(limit=100)[0] == [session for session, _ in reversed(expected)]
+
+
+def test_import_refuses_a_database_with_sessions(database, tmp_path):
+    db.save_diagnoses([("", {"no_power": True}, RULES[:1], "v1")])
+    export = tmp_path / "sessions.jsonl.gz"
+    export_sessions(export)
+
+    with pytest.raises(ValueError):
+        import_sessions(export)